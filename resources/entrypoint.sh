@@ -11,4 +11,128 @@ if [ "$#" -eq 0 ]; then
     set -- pulsar standalone
 fi
 
-exec "$@"
\ No newline at end of file
+# GC flags baked into the image (ApachePulsar.Runtime.PulsarGc), unless the operator sets PULSAR_GC. Applied whether or
+# not the JVM sizing below runs.
+pulsar_gc_explicit="${PULSAR_GC:+true}"
+if [ -n "${PULSAR_GC_DEFAULT:-}" ]; then
+    export PULSAR_GC="${PULSAR_GC:-$PULSAR_GC_DEFAULT}"
+fi
+
+# JVM sizing from the container's cgroup limits.
+#
+# PULSAR_MEM and PULSAR_GC set by the operator are used as they are. Otherwise the heap and direct memory are derived
+# from the cgroup memory limit as a share per role, and the GC thread counts from the CPU quota are added to the image's
+# GC flags. PULSAR_HEAP_PERCENT / PULSAR_DIRECT_PERCENT override the role's shares, PULSAR_AUTOTUNE=false disables the
+# tuning.
+
+# Memory limit in bytes, empty when unlimited
+cgroup_memory_limit() {
+    local limit=""
+    if [ -r /sys/fs/cgroup/memory.max ]; then
+        limit="$(cat /sys/fs/cgroup/memory.max)"
+    elif [ -r /sys/fs/cgroup/memory/memory.limit_in_bytes ]; then
+        limit="$(cat /sys/fs/cgroup/memory/memory.limit_in_bytes)"
+        # cgroup v1 reports "unlimited" as a huge page-aligned number
+        if [ "${#limit}" -ge 19 ]; then
+            limit=""
+        fi
+    fi
+
+    if [ "$limit" = "max" ]; then
+        limit=""
+    fi
+    echo "$limit"
+}
+
+# Available CPUs, rounded up, from the CPU quota or the online CPUs
+cgroup_cpus() {
+    local quota="" period=""
+    if [ -r /sys/fs/cgroup/cpu.max ]; then
+        read -r quota period < /sys/fs/cgroup/cpu.max
+    elif [ -r /sys/fs/cgroup/cpu/cpu.cfs_quota_us ]; then
+        quota="$(cat /sys/fs/cgroup/cpu/cpu.cfs_quota_us)"
+        period="$(cat /sys/fs/cgroup/cpu/cpu.cfs_period_us)"
+    fi
+
+    local cpus
+    cpus="$(nproc)"
+    if [ -n "$quota" ] && [ "$quota" != "max" ] && [ "$quota" -gt 0 ] && [ "$period" -gt 0 ]; then
+        local quota_cpus=$(( (quota + period - 1) / period ))
+        if [ "$quota_cpus" -lt "$cpus" ]; then
+            cpus="$quota_cpus"
+        fi
+    fi
+    echo "$cpus"
+}
+
+autotune() {
+    local role="${PULSAR_ROLE:-}"
+    if [ -z "$role" ] && [ "$(basename "$1")" = "pulsar" ]; then
+        role="$2"
+    fi
+
+    # Heap and direct memory shares of the memory limit, in percent
+    local heap direct
+    case "$role" in
+        standalone)
+            heap=40; direct=35 ;;
+        broker)
+            heap=35; direct=50 ;;
+        bookie)
+            # The rest of the limit is left to the page cache for the journal and ledgers
+            heap=20; direct=40 ;;
+        zookeeper|configuration-store)
+            heap=60; direct=10 ;;
+        *)
+            return 0 ;;
+    esac
+    heap="${PULSAR_HEAP_PERCENT:-$heap}"
+    direct="${PULSAR_DIRECT_PERCENT:-$direct}"
+
+    if [ -z "${PULSAR_MEM:-}" ]; then
+        local limit
+        limit="$(cgroup_memory_limit)"
+        if [ -n "$limit" ]; then
+            local limit_mb=$(( limit / 1024 / 1024 ))
+            local heap_mb=$(( limit_mb * heap / 100 ))
+            local direct_mb=$(( limit_mb * direct / 100 ))
+            if [ "$heap_mb" -lt 256 ]; then
+                heap_mb=256
+            fi
+            if [ "$direct_mb" -lt 256 ]; then
+                direct_mb=256
+            fi
+
+            export PULSAR_MEM="-Xms${heap_mb}m -Xmx${heap_mb}m -XX:MaxDirectMemorySize=${direct_mb}m"
+            echo "entrypoint: ${role} memory limit ${limit_mb}m, PULSAR_MEM=\"${PULSAR_MEM}\"" >&2
+        fi
+    fi
+
+    if [ -z "$pulsar_gc_explicit" ]; then
+        local cpus parallel concurrent
+        cpus="$(cgroup_cpus)"
+        # HotSpot's own formula for ParallelGCThreads, applied to the quota rather than the host CPUs
+        if [ "$cpus" -le 8 ]; then
+            parallel="$cpus"
+        else
+            parallel=$(( 8 + (cpus - 8) * 5 / 8 ))
+        fi
+        concurrent=$(( (parallel + 3) / 4 ))
+
+        export PULSAR_GC="${PULSAR_GC:-} -XX:ParallelGCThreads=${parallel} -XX:ConcGCThreads=${concurrent}"
+        PULSAR_GC="${PULSAR_GC# }"
+        echo "entrypoint: ${role} ${cpus} CPUs, PULSAR_GC=\"${PULSAR_GC}\"" >&2
+    fi
+}
+
+if [ "${PULSAR_AUTOTUNE:-true}" != "false" ]; then
+    autotune "$@"
+fi
+
+# AppCDS archive created at build time (see ApachePulsar.Runtime.Java.Cds). PULSAR_EXTRA_OPTS keeps the defaults of
+# conf/pulsar_env.sh when not set. PULSAR_CDS=false disables the archive, e.g. with a changed classpath.
+if [ -n "${PULSAR_CDS_ARCHIVE:-}" ] && [ -r "$PULSAR_CDS_ARCHIVE" ] && [ "${PULSAR_CDS:-true}" != "false" ]; then
+    export PULSAR_EXTRA_OPTS="${PULSAR_EXTRA_OPTS:- -Dpulsar.allocator.exit_on_oom=true -Dio.netty.recycler.maxCapacityPerThread=4096} -XX:SharedArchiveFile=${PULSAR_CDS_ARCHIVE} -Xshare:auto"
+fi
+
+exec "$@"
@@ -0,0 +1,126 @@
+#!/bin/bash
+# Health probe of the runtime and sink images, without starting a JVM: bash and /dev/tcp only.
+#
+#   healthcheck.sh [live|ready]
+#
+# live: the main process answers on its port. ready: it serves requests (broker health check round trip, bookie
+# ready, zookeeper serving, connector connected to the broker). The role comes from PULSAR_ROLE or the main class of
+# the container's process; the port from the role's configuration file, PULSAR_HEALTH_PORT overrides it.
+# PULSAR_HEALTH_TOKEN is sent as bearer token to the broker admin API, PULSAR_HEALTH_BROKER_URL is the broker a
+# connector must reach to be ready.
+set -u
+
+mode="${1:-live}"
+timeout="${PULSAR_HEALTH_TIMEOUT:-3}"
+conf_dir="${PULSAR_HOME:-/usr/local/pulsar}/conf"
+
+role="${PULSAR_ROLE:-}"
+# PID 1 unless an init process (podman --init) runs the main process
+for cmdline in /proc/1/cmdline /proc/[0-9]*/cmdline; do
+    [ -z "$role" ] || break
+    mapfile -d '' args < "$cmdline" 2>/dev/null || continue
+    for arg in "${args[@]}"; do
+        case "$arg" in
+            org.apache.pulsar.PulsarStandaloneStarter) role=standalone ;;
+            org.apache.pulsar.PulsarBrokerStarter) role=broker ;;
+            org.apache.bookkeeper.server.Main) role=bookie ;;
+            org.apache.pulsar.zookeeper.ZooKeeperStarter|org.apache.pulsar.zookeeper.ConfigurationStoreStarter)
+                role=zookeeper ;;
+            localrun) role=connector ;;
+            *) continue ;;
+        esac
+        break
+    done
+done
+
+# Value of key in a .conf file, default when unset
+conf_value() {
+    local file="$1" key="$2" default="$3" line value=""
+    if [ -r "$file" ]; then
+        while IFS= read -r line; do
+            if [ "${line%%=*}" = "$key" ]; then
+                value="${line#*=}"
+            fi
+        done < "$file"
+    fi
+    value="${value//[[:space:]]/}"
+    echo "${value:-$default}"
+}
+
+tcp_open() {
+    { exec 3<>"/dev/tcp/$1/$2"; } 2>/dev/null || return 1
+    exec 3>&-
+}
+
+# Succeeds on a 200 response
+http_get() {
+    local port="$1" path="$2" header="" status=""
+    if [ -n "${PULSAR_HEALTH_TOKEN:-}" ]; then
+        header="Authorization: Bearer ${PULSAR_HEALTH_TOKEN}"$'\r\n'
+    fi
+
+    { exec 3<>"/dev/tcp/localhost/$port"; } 2>/dev/null || return 1
+    printf 'GET %s HTTP/1.0\r\nHost: localhost\r\n%s\r\n' "$path" "$header" >&3
+    read -r -t "$timeout" status <&3
+    exec 3>&-
+
+    case "$status" in
+        "HTTP/1."?" 200"*) return 0 ;;
+        *) echo "GET $path on port $port: ${status:-no response}" >&2; return 1 ;;
+    esac
+}
+
+# Reply of a zookeeper four letter word command
+four_letter() {
+    local port="$1" command="$2" line=""
+    { exec 3<>"/dev/tcp/localhost/$port"; } 2>/dev/null || return 1
+    printf '%s' "$command" >&3
+    while IFS= read -r -t "$timeout" line <&3 || [ -n "$line" ]; do
+        echo "$line"
+        line=""
+    done
+    exec 3>&-
+}
+
+case "$role" in
+    standalone|broker)
+        port="${PULSAR_HEALTH_PORT:-$(conf_value "$conf_dir/$role.conf" webServicePort 8080)}"
+        if [ "$mode" = "ready" ]; then
+            # Produces and consumes a message on the broker's health check topic
+            http_get "$port" /admin/v2/brokers/health
+        else
+            http_get "$port" /admin/v2/brokers/ready
+        fi
+        ;;
+    bookie)
+        conf="$conf_dir/bookkeeper.conf"
+        if [ "$mode" = "ready" ] && [ "$(conf_value "$conf" httpServerEnabled false)" = "true" ]; then
+            http_get "${PULSAR_HEALTH_PORT:-$(conf_value "$conf" httpServerPort 8000)}" /api/v1/bookie/is_ready
+        else
+            tcp_open localhost "$(conf_value "$conf" bookiePort 3181)"
+        fi
+        ;;
+    zookeeper)
+        port="${PULSAR_HEALTH_PORT:-$(conf_value "$conf_dir/zookeeper.conf" clientPort 2181)}"
+        if [ "$mode" = "ready" ]; then
+            # Mode is only reported while the server serves requests
+            [[ "$(four_letter "$port" srvr)" == *"Mode: "* ]]
+        else
+            [ "$(four_letter "$port" ruok)" = "imok" ]
+        fi
+        ;;
+    connector)
+        # Metrics server of the instance (localrun --metrics-port-start)
+        http_get "${PULSAR_HEALTH_PORT:-${POSTGRES_CONNECTOR_METRICS_PORT:-9094}}" /metrics || exit 1
+        if [ "$mode" = "ready" ]; then
+            broker="${PULSAR_HEALTH_BROKER_URL:-${POSTGRES_CONNECTOR_BROKER_URL:-}}"
+            broker="${broker#*://}"
+            broker="${broker%%/*}"
+            tcp_open "${broker%:*}" "${broker##*:}"
+        fi
+        ;;
+    *)
+        echo "Unknown role '${role}', set PULSAR_ROLE" >&2
+        exit 1
+        ;;
+esac
@@ -1,6 +1,23 @@
 #!/bin/bash
 set -e
 
+# Credentials are never part of the image; they are appended to a private copy of the sink configuration.
+if [ -n "$POSTGRES_SINK_USER" ] || [ -n "$POSTGRES_SINK_PASSWORD" ]; then
+    if [ "$(awk '/^[^ #]/ { key = $1 } END { print key }' "$POSTGRES_CONNECTOR_CONFIG_PATH")" = "configs:" ]; then
+        config_file="$(mktemp /tmp/postgres-sink.XXXXXX.yaml)"
+        chmod 600 "$config_file"
+        cat "$POSTGRES_CONNECTOR_CONFIG_PATH" > "$config_file"
+        if [ -n "$POSTGRES_SINK_USER" ]; then
+            printf "  userName: '%s'\n" "${POSTGRES_SINK_USER//\'/\'\'}" >> "$config_file"
+        fi
+        if [ -n "$POSTGRES_SINK_PASSWORD" ]; then
+            printf "  password: '%s'\n" "${POSTGRES_SINK_PASSWORD//\'/\'\'}" >> "$config_file"
+        fi
+        POSTGRES_CONNECTOR_CONFIG_PATH="$config_file"
+    else
+        echo "WARNING: configs is not the last mapping of $POSTGRES_CONNECTOR_CONFIG_PATH, credentials not added" >&2
+    fi
+fi
 
 if [ "${1#-}" != "$1" ]; then
     set -- pulsar-admin sinks localrun "$@"
@@ -10,6 +27,13 @@ if [ "$#" -eq 0 ]; then
     set -- pulsar-admin sinks localrun \
         --sink-config-file "$POSTGRES_CONNECTOR_CONFIG_PATH" \
         --broker-service-url "$POSTGRES_CONNECTOR_BROKER_URL"
+    # Metrics server of the instance, probed by healthcheck.sh
+    if [ -n "$POSTGRES_CONNECTOR_METRICS_PORT" ]; then
+        set -- "$@" --metrics-port-start "$POSTGRES_CONNECTOR_METRICS_PORT"
+    fi
+    if [ -n "$POSTGRES_CONNECTOR_PARALLELISM" ]; then
+        set -- "$@" --parallelism "$POSTGRES_CONNECTOR_PARALLELISM"
+    fi
 fi
 
-exec "$@"
\ No newline at end of file
+exec "$@"
@@ -0,0 +1 @@
+from .all import app
\ No newline at end of file
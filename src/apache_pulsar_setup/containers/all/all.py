@@ -0,0 +1,123 @@
+from pathlib import Path
+from typing import Optional
+
+import typer
+
+from apache_pulsar_setup.core import BuildSpec, BuildGraph, load_spec, plan_build, print_plans, parse_platforms
+from ..connectors.catalog.builder import catalog_builders, prefetch_connectors
+from ..connectors.postgres_sink.builder import PostgresSinkBuilder
+from ..core.builder import CoreBuilder
+from ..runtime.builder import RuntimeBuilder
+from ..runtime.jlink import JlinkBuilder
+
+app = typer.Typer(help="The complete apache pulsar stack (core, runtime and connectors).")
+
+
+@app.command("build", help="Build core, runtime and connector images, running independent builders in parallel.")
+def build(
+        spec_file: Optional[Path] = typer.Option("configs/build.yaml", "--spec", "--s",
+                                                 help="Path to build specification file."),
+        runtime_image_name: Optional[str] = typer.Option("apache-pulsar", "--runtime-image-name",
+                                                         help="Name of new apache pulsar runtime image."),
+        postgres_sink_image_name: Optional[str] = typer.Option("apache-pulsar-postgres-sink",
+                                                               "--postgres-sink-image-name",
+                                                               help="Name of new postgres sink image."),
+        image_tag: Optional[str] = typer.Option("", "--image-tag", "--t",
+                                                help="Optional. Tag of new runtime and connector images."),
+        jobs: int = typer.Option(2, "--jobs", "--j", min=1,
+                                 help="Maximum number of builders running at the same time."),
+        dry_run: bool = typer.Option(False, "--dry-run", help="Only print the build plan."),
+        squash: bool = typer.Option(False, "--squash",
+                                    help="Commit the final image as a single layer, so slimmed files free space."),
+        platforms: Optional[str] = typer.Option("", "--platforms", "--p",
+                                                help="Optional. Comma separated os/arch list, e.g. "
+                                                     "linux/amd64,linux/arm64. Platforms are built in parallel and "
+                                                     "assembled into a manifest list.")
+):
+    """
+    Build the complete apache pulsar stack.
+
+    Core is built first (followed by the jlink Java runtime when enabled); runtime and postgres sink only depend on
+    those and are built concurrently. The connectors of the catalog are layered on the runtime image once it is
+    built; their archives are downloaded in the background from the start.
+
+    :param spec_file: Path to build spec file.
+    :param runtime_image_name: Name of the runtime image.
+    :param postgres_sink_image_name: Name of the postgres sink image.
+    :param image_tag: Tag of the runtime and connector images.
+    :param jobs: Concurrency limit.
+    :param dry_run: Print the plan instead of building.
+    :param squash: Squash the final images.
+    :param platforms: Target platforms; every platform gets its own chain of builders.
+    :return:
+    """
+    config = load_spec(spec_file, BuildSpec)
+
+    core = CoreBuilder(config, squash=squash)
+    runtime = RuntimeBuilder(config, image_name=runtime_image_name, image_tag=image_tag, squash=squash)
+    postgres_sink = PostgresSinkBuilder(config, image_name=postgres_sink_image_name, image_tag=image_tag,
+                                        squash=squash)
+    jlink = JlinkBuilder(config) if config.ApachePulsar.Runtime.Java.Jlink.Enabled else None
+    connectors = catalog_builders(config, [], runtime.final_image, image_tag, squash)
+
+    if dry_run:
+        plans = [plan_build("core", core)]
+        if jlink:
+            plans.append(plan_build("jlink", jlink))
+        print_plans(plans + [plan_build("runtime", runtime), plan_build("postgres-sink", postgres_sink)] +
+                    [plan_build(f"connector-{c.name}", c) for c in connectors])
+        return
+
+    targets = parse_platforms(platforms)
+
+    graph = BuildGraph(max_workers=jobs)
+    graph.add("core", core, platforms=targets)
+    java_runtime = ["core"]
+    if jlink:
+        graph.add("jlink", jlink, depends_on=["core"], platforms=targets, manifest=False)
+        java_runtime = ["jlink"]
+    graph.add("runtime", runtime, depends_on=java_runtime, platforms=targets)
+    graph.add("postgres-sink", postgres_sink, depends_on=java_runtime, platforms=targets)
+    for connector in connectors:
+        graph.add(f"connector-{connector.name}", connector, depends_on=["runtime"], platforms=targets)
+
+    prefetch_connectors(connectors)
+
+    try:
+        graph.run()
+    except RuntimeError:
+        raise typer.Exit(code=1)
+
+
+@app.command("plan", help="Show which cached steps of every builder would hit the layer cache.")
+def plan(
+        spec_file: Optional[Path] = typer.Option("configs/build.yaml", "--spec", "--s",
+                                                 help="Path to build specification file."),
+        runtime_image_name: Optional[str] = typer.Option("apache-pulsar", "--runtime-image-name",
+                                                         help="Name of the apache pulsar runtime image."),
+        as_json: bool = typer.Option(False, "--json", help="Print the plan as JSON.")
+):
+    """
+    Show the build plan of the complete stack without running anything.
+
+    Runtime and connector plans are evaluated against the core image currently present; if core is rebuilt with
+    different content their steps will execute.
+
+    :param spec_file: Path to build spec file.
+    :param runtime_image_name: Name of the runtime image the connectors are layered on.
+    :param as_json: Print JSON instead of a table.
+    :return:
+    """
+    config = load_spec(spec_file, BuildSpec)
+
+    runtime = RuntimeBuilder(config, image_name=runtime_image_name)
+
+    plans = [plan_build("core", CoreBuilder(config))]
+    if config.ApachePulsar.Runtime.Java.Jlink.Enabled:
+        plans.append(plan_build("jlink", JlinkBuilder(config)))
+
+    print_plans(plans + [
+        plan_build("runtime", runtime),
+        plan_build("postgres-sink", PostgresSinkBuilder(config)),
+        *[plan_build(f"connector-{c.name}", c) for c in catalog_builders(config, [], runtime.final_image)],
+    ], as_json)
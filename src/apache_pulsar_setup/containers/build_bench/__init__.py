@@ -0,0 +1 @@
+from .build_bench import app
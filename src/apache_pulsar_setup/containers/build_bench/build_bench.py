@@ -0,0 +1,74 @@
+from pathlib import Path
+from typing import Optional
+
+import typer
+from rich.console import Console
+
+from .harness import BuildBenchmark, compare_build_results, load_json, print_build_results, write_json
+from apache_pulsar_setup.core import BuildSpec, load_spec
+
+console = Console()
+
+app = typer.Typer(help="Benchmark of the build orchestration against a fake buildah, without network or containers.")
+
+
+@app.command("run", help="Build core, runtime and postgres sink against the fake buildah, cold and warm, and compare "
+                         "with the baseline.")
+def run(
+        spec_file: Optional[Path] = typer.Option("configs/build.yaml", "--spec", "--s",
+                                                 help="Path to build specification file."),
+        workspace: Optional[Path] = typer.Option(".tmp/build-bench/workspace", "--workspace", "--w",
+                                                 help="Scratch directory for fake image storage, artifacts and "
+                                                      "state. Wiped on every run."),
+        latency_scale: float = typer.Option(1.0, "--latency-scale",
+                                            help="Factor applied to the emulated buildah latencies, 0 to disable "
+                                                 "them."),
+        artifact_mb: int = typer.Option(20, "--artifact-mb",
+                                        help="Size of each generated artifact in MB."),
+        results_dir: Optional[Path] = typer.Option(".tmp/build-bench", "--results", "--r",
+                                                   help="Directory for the results and the baseline."),
+        save_baseline: bool = typer.Option(False, "--save-baseline",
+                                           help="Store the results as the new baseline."),
+        threshold: float = typer.Option(0.2, "--threshold",
+                                        help="Allowed relative increase of the build times."),
+        verbose: bool = typer.Option(False, "--verbose", "--v", help="Show the builders' output.")
+):
+    """
+    Benchmark the builders against the fake buildah.
+
+    :param spec_file: Path to build spec file.
+    :param workspace: Scratch directory.
+    :param latency_scale: Factor for the emulated latencies.
+    :param artifact_mb: Size of generated artifacts.
+    :param results_dir: Where latest.json and baseline.json are written.
+    :param save_baseline: Store the results as baseline instead of failing on regressions.
+    :param threshold: Allowed relative increase of the build times.
+    :param verbose: Show build output.
+    :return:
+    """
+    config = load_spec(spec_file, BuildSpec)
+
+    harness = BuildBenchmark(config, workspace, artifact_mb, latency_scale, console, verbose)
+    results = harness.run()
+
+    write_json(results_dir / "latest.json", results)
+    baseline_path = results_dir / "baseline.json"
+    baseline = load_json(baseline_path)
+    print_build_results(results, baseline, console)
+
+    if save_baseline:
+        write_json(baseline_path, results)
+        console.print(f"Baseline saved to [green]{baseline_path}[/green]")
+        return
+
+    if baseline is None:
+        console.print(f"[dim]No baseline at {baseline_path}, run with --save-baseline to store one.[/dim]")
+        return
+
+    regressions = compare_build_results(results, baseline, threshold)
+    if regressions:
+        for regression in regressions:
+            console.print(f"[bold red]Regression:[/bold red] {regression}")
+        raise typer.Exit(code=1)
+
+    console.print("[bold green]No regressions against the baseline.[/bold green]")
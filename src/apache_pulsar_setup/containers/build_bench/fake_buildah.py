@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the buildah executable, for benchmarking the build orchestration without buildah, containers or network.
+
+Emulates the subcommands the builders use (from, run, copy, config, commit, rm, images, inspect, rmi, tag, manifest,
+info) on a JSON state file instead of real storage. Nothing is executed inside containers: `run` succeeds and only
+prints output the builders parse (the jdeps module list). Every call sleeps for a configurable latency and is appended
+to a call log.
+
+Configured through the environment:
+
+- FAKE_BUILDAH_STATE: state directory, default .tmp/fake-buildah
+- FAKE_BUILDAH_LATENCY: JSON object of per-subcommand latencies in seconds overriding LATENCIES, e.g. {"run": 0.5}
+- FAKE_BUILDAH_LATENCY_SCALE: factor applied to all latencies, default 1
+
+Select it with `Buildah.Path` in the build spec. Only uses the standard library, so it runs with any python3.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+# Seconds per subcommand; "pull" is added to `from` for images not in the state yet
+LATENCIES = {
+    "from": 0.05,
+    "pull": 1.0,
+    "run": 0.1,
+    "copy": 0.05,
+    "config": 0.01,
+    "commit": 0.2,
+    "rm": 0.02,
+    "rmi": 0.02,
+    "tag": 0.01,
+    "images": 0.02,
+    "inspect": 0.01,
+    "manifest": 0.02,
+    "info": 0.01,
+}
+# Added per MB of copied host files
+COPY_SECONDS_PER_MB = 0.002
+
+_PULLED_IMAGE_SIZE = 80 * 1000 * 1000
+_RUN_SIZE = 100 * 1000
+_COPY_FROM_SIZE = 5 * 1000 * 1000
+_MODULES = "java.base,java.logging,java.management,java.naming,java.net.http,java.security.jgss,java.sql,jdk.unsupported"
+
+
+class FakeBuildahError(Exception):
+    def __init__(self, message: str, exit_code: int = 125):
+        super().__init__(message)
+        self.exit_code = exit_code
+
+
+def normalize_image_name(name: str) -> str:
+    first, _, rest = name.partition("/")
+    if not rest or ("." not in first and ":" not in first and first != "localhost"):
+        name = f"localhost/{name}"
+
+    if "@" not in name and ":" not in name.rsplit("/", 1)[-1]:
+        name = f"{name}:latest"
+
+    return name
+
+
+def state_directory() -> Path:
+    return Path(os.environ.get("FAKE_BUILDAH_STATE", ".tmp/fake-buildah"))
+
+
+def latency(command: str) -> float:
+    latencies = dict(LATENCIES)
+    latencies.update(json.loads(os.environ.get("FAKE_BUILDAH_LATENCY") or "{}"))
+    return float(latencies.get(command, 0.0)) * float(os.environ.get("FAKE_BUILDAH_LATENCY_SCALE") or 1)
+
+
+@contextmanager
+def locked_state():
+    """
+    Load the state under an exclusive lock and save it afterwards; concurrent builders call buildah in parallel.
+    """
+    directory = state_directory()
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / "state.json"
+
+    with open(directory / "state.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            with open(path, "r") as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            state = {}
+        for key in ("images", "containers", "manifests"):
+            state.setdefault(key, {})
+
+        yield state
+
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+
+
+def log_call(args: List[str], seconds: float, exit_code: int):
+    with open(state_directory() / "calls.jsonl", "a") as f:
+        f.write(json.dumps({"args": args, "seconds": round(seconds, 4), "exit_code": exit_code}) + "\n")
+
+
+def _find_image(state: dict, ref: str) -> Optional[str]:
+    if ref in state["images"]:
+        return ref
+    name = normalize_image_name(ref)
+    for image_id, image in state["images"].items():
+        if name in image["names"] or image_id.startswith(ref):
+            return image_id
+    return None
+
+
+def _untag(state: dict, name: str):
+    for image in state["images"].values():
+        if name in image["names"]:
+            image["names"].remove(name)
+
+
+def _disk_usage(path: Path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    return sum(p.lstat().st_size for p in path.rglob("*") if not p.is_dir() or p.is_symlink())
+
+
+def _options(args: List[str], flags_with_value: set,
+             switches: set = frozenset()) -> Tuple[Dict[str, List[str]], List[str]]:
+    """
+    Split args into options (flag -> values) and positional arguments. Everything after `--` is positional.
+    """
+    options: Dict[str, List[str]] = {}
+    positional: List[str] = []
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg == "--":
+            positional.extend(args[i + 1:])
+            break
+        if arg.startswith("-") and "=" in arg:
+            flag, value = arg.split("=", 1)
+            options.setdefault(flag, []).append(value)
+        elif arg in switches:
+            options.setdefault(arg, []).append("")
+        elif arg in flags_with_value or (arg.startswith("-") and not positional and arg not in switches):
+            options.setdefault(arg, []).append(args[i + 1] if i + 1 < len(args) else "")
+            i += 1
+        else:
+            positional.append(arg)
+        i += 1
+    return options, positional
+
+
+def cmd_from(args: List[str]) -> str:
+    options, positional = _options(args, {"--name", "--platform", "--pull"})
+    if not positional:
+        raise FakeBuildahError("Error: an image name must be specified")
+    ref = positional[0]
+    name = (options.get("--name") or [f"{ref.rsplit('/', 1)[-1].split(':')[0]}-working-container"])[0]
+
+    with locked_state() as state:
+        if name in state["containers"]:
+            raise FakeBuildahError(f'Error: the container name "{name}" is already in use by '
+                                   f'{state["containers"][name]["id"]}. You have to remove that container to be able '
+                                   f'to reuse that name: that name is already in use')
+
+        image_id = _find_image(state, ref)
+        pulled = False
+        if image_id is None:
+            normalized = normalize_image_name(ref)
+            if normalized.startswith("localhost/"):
+                raise FakeBuildahError(f"Error: {ref}: image not known")
+            image_id = hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+            state["images"][image_id] = {"names": [normalized], "size": _PULLED_IMAGE_SIZE, "created": time.time(),
+                                         "labels": {}, "env": {}}
+            pulled = True
+
+        state["containers"][name] = {"id": uuid.uuid4().hex, "image": image_id, "labels": {}, "env": {},
+                                     "size_delta": 0}
+
+    if pulled:
+        time.sleep(latency("pull"))
+    return name
+
+
+def _container(state: dict, name: str) -> dict:
+    container = state["containers"].get(name)
+    if container is None:
+        raise FakeBuildahError(f"Error: container {name!r} not known", 1)
+    return container
+
+
+def cmd_run(args: List[str]) -> str:
+    options, positional = _options(args, {"-e", "--env", "-v", "--volume", "--workingdir", "--user"})
+    if not positional:
+        raise FakeBuildahError("Error: container name must be specified")
+    name, command = positional[0], positional[1:]
+
+    with locked_state() as state:
+        _container(state, name)["size_delta"] += _RUN_SIZE
+
+    if "--print-module-deps" in " ".join(command):
+        return _MODULES
+    return ""
+
+
+def cmd_copy(args: List[str]) -> str:
+    options, positional = _options(args, {"--from", "--chown", "--chmod"})
+    if len(positional) < 3:
+        raise FakeBuildahError("Error: container, source and destination must be specified")
+    name, sources = positional[0], positional[1:-1]
+
+    added = 0
+    if "--from" in options:
+        added = _COPY_FROM_SIZE
+    else:
+        for source in sources:
+            path = Path(source)
+            if not path.exists():
+                raise FakeBuildahError(f"Error: checking on sources under {source}: no such file or directory", 1)
+            added += _disk_usage(path)
+        time.sleep(added / 1e6 * COPY_SECONDS_PER_MB)
+
+    with locked_state() as state:
+        _container(state, name)["size_delta"] += added
+    return ""
+
+
+def cmd_config(args: List[str]) -> str:
+    options, positional = _options(args, set())
+    if not positional:
+        raise FakeBuildahError("Error: container name must be specified")
+
+    with locked_state() as state:
+        container = _container(state, positional[-1])
+        for flag, target in (("--label", "labels"), ("-l", "labels"), ("--env", "env"), ("-e", "env")):
+            for value in options.get(flag, []):
+                key, _, val = value.partition("=")
+                container[target][key] = val
+    return ""
+
+
+def cmd_commit(args: List[str]) -> str:
+    options, positional = _options(args, {"--cmd", "--change", "--format", "-f"}, {"--squash", "--rm", "-q"})
+    if len(positional) < 2:
+        raise FakeBuildahError("Error: container and image name must be specified")
+    name, tag = positional[0], normalize_image_name(positional[1])
+
+    with locked_state() as state:
+        container = _container(state, name)
+        parent = state["images"][container["image"]]
+
+        image_id = hashlib.sha256(uuid.uuid4().bytes).hexdigest()
+        _untag(state, tag)
+        state["images"][image_id] = {
+            "names": [tag],
+            "size": parent["size"] + container["size_delta"],
+            "created": time.time(),
+            "labels": {**parent["labels"], **container["labels"]},
+            "env": {**parent["env"], **container["env"]},
+        }
+    return image_id
+
+
+def cmd_rm(args: List[str]) -> str:
+    with locked_state() as state:
+        for name in args:
+            if state["containers"].pop(name, None) is None:
+                raise FakeBuildahError(f"Error: container {name!r} not known", 1)
+    return ""
+
+
+def cmd_rmi(args: List[str]) -> str:
+    refs = [a for a in args if not a.startswith("-")]
+    missing = []
+    with locked_state() as state:
+        for ref in refs:
+            image_id = _find_image(state, ref)
+            if image_id is None:
+                missing.append(ref)
+                continue
+            image = state["images"][image_id]
+            name = normalize_image_name(ref)
+            if name in image["names"] and len(image["names"]) > 1:
+                image["names"].remove(name)
+            else:
+                del state["images"][image_id]
+
+    if missing:
+        raise FakeBuildahError(f"Error: {', '.join(missing)}: image not known", 1)
+    return "\n".join(refs)
+
+
+def cmd_tag(args: List[str]) -> str:
+    if len(args) < 2:
+        raise FakeBuildahError("Error: an image and at least one name must be specified")
+
+    with locked_state() as state:
+        image_id = _find_image(state, args[0])
+        if image_id is None:
+            raise FakeBuildahError(f"Error: {args[0]}: image not known", 1)
+        for name in args[1:]:
+            name = normalize_image_name(name)
+            _untag(state, name)
+            state["images"][image_id]["names"].append(name)
+    return ""
+
+
+def _image_json(image_id: str, image: dict) -> dict:
+    return {"id": image_id, "names": image["names"], "digest": f"sha256:{image_id}", "size": image["size"],
+            "created": int(image["created"])}
+
+
+def cmd_images(args: List[str]) -> str:
+    refs = [a for a in args if not a.startswith("-")]
+    with locked_state() as state:
+        if refs:
+            ids = [i for i in (_find_image(state, ref) for ref in refs) if i]
+        else:
+            ids = list(state["images"])
+        images = [_image_json(i, state["images"][i]) for i in ids]
+
+    if "--json" in args:
+        return json.dumps(images, indent=2)
+    return "\n".join(f"{','.join(i['names']) or '<none>'} {i['id'][:12]} {i['size']}" for i in images)
+
+
+def cmd_inspect(args: List[str]) -> str:
+    options, positional = _options(args, {"--type", "-t", "--format", "-f"})
+    if not positional:
+        raise FakeBuildahError("Error: an image or container name must be specified")
+
+    with locked_state() as state:
+        image_id = _find_image(state, positional[0])
+        if image_id is None:
+            raise FakeBuildahError(f"Error: {positional[0]}: image not known", 1)
+        image = state["images"][image_id]
+
+    fmt = (options.get("--format") or options.get("-f") or [""])[0]
+    if "Labels" in fmt:
+        return json.dumps(image["labels"] or None)
+    env = [f"{k}={v}" for k, v in image["env"].items()]
+    return json.dumps({"FromImageID": image_id, "OCIv1": {"config": {"Labels": image["labels"], "Env": env}}},
+                      indent=2)
+
+
+def cmd_manifest(args: List[str]) -> str:
+    if not args:
+        raise FakeBuildahError("Error: missing manifest subcommand")
+    action, rest = args[0], [a for a in args[1:] if not a.startswith("-")]
+
+    with locked_state() as state:
+        if action == "create":
+            state["manifests"][normalize_image_name(rest[0])] = []
+        elif action == "rm":
+            if state["manifests"].pop(normalize_image_name(rest[0]), None) is None:
+                raise FakeBuildahError(f"Error: {rest[0]}: image not known", 1)
+        elif action == "add":
+            manifest = state["manifests"].get(normalize_image_name(rest[0]))
+            if manifest is None:
+                raise FakeBuildahError(f"Error: {rest[0]}: image not known", 1)
+            manifest.append(rest[1].split(":", 1)[-1])
+        else:
+            raise FakeBuildahError(f"Error: unknown manifest subcommand {action!r}")
+    return ""
+
+
+def cmd_info(args: List[str]) -> str:
+    return json.dumps({"host": {"os": "linux"}, "store": {"GraphRoot": str(state_directory().resolve())}}, indent=2)
+
+
+COMMANDS = {
+    "from": cmd_from,
+    "run": cmd_run,
+    "copy": cmd_copy,
+    "config": cmd_config,
+    "commit": cmd_commit,
+    "rm": cmd_rm,
+    "rmi": cmd_rmi,
+    "tag": cmd_tag,
+    "images": cmd_images,
+    "inspect": cmd_inspect,
+    "manifest": cmd_manifest,
+    "info": cmd_info,
+}
+
+
+def main(argv: List[str]) -> int:
+    if not argv or argv[0] in ("-v", "--version", "version"):
+        print("buildah version 0.0.0 (fake)")
+        return 0
+
+    command, args = argv[0], argv[1:]
+    start = time.monotonic()
+    exit_code = 0
+    try:
+        handler = COMMANDS.get(command)
+        if handler is None:
+            raise FakeBuildahError(f'Error: unknown command "{command}" for "buildah"')
+        output = handler(args)
+        time.sleep(latency(command))
+        if output:
+            print(output)
+    except FakeBuildahError as e:
+        print(str(e), file=sys.stderr)
+        exit_code = e.exit_code
+
+    state_directory().mkdir(parents=True, exist_ok=True)
+    log_call(argv, time.monotonic() - start, exit_code)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,229 @@
+import io
+import json
+import os
+import shutil
+import tarfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from rich.console import Console
+from rich.table import Table
+
+from apache_pulsar_setup.core import BaseBuilder, BuildSpec, ImageIndex, plan_build
+from apache_pulsar_setup.core.artifacts import ArtifactCache
+from ..connectors.postgres_sink.builder import PostgresSinkBuilder
+from ..core.builder import CoreBuilder
+from ..runtime.builder import RuntimeBuilder
+from ..runtime.jlink import JlinkBuilder
+
+FAKE_BUILDAH = Path(__file__).with_name("fake_buildah.py").resolve()
+
+
+class BuildBenchmark:
+    """
+    Runs the real builders against the fake buildah (fake_buildah.py) in a scratch workspace.
+
+    The workspace holds the fake image storage, the artifact store and the build state. Artifacts the builders would
+    download are generated up front, so no network is needed. The builders run one after the other (core, runtime
+    including the jlink stage, postgres sink), first on empty storage (cold), then again on the resulting storage
+    (warm). Per builder, the wall time, the number of buildah calls and the cache hit rate of the plan are recorded.
+    """
+
+    SCENARIOS = ("cold", "warm")
+
+    def __init__(self, config: BuildSpec, workspace: Path, artifact_mb: int = 20, latency_scale: float = 1.0,
+                 output: Optional[Console] = None, verbose: bool = False):
+        self.workspace = workspace.resolve()
+        self.artifact_mb = artifact_mb
+        self.latency_scale = latency_scale
+        self.console = output if output is not None else Console()
+        self.build_console = self.console if verbose else Console(file=io.StringIO())
+
+        self.config = config.model_copy(deep=True)
+        self.config.Buildah.Path = str(FAKE_BUILDAH)
+        self.config.Artifacts.Directory = str(self.workspace / "artifacts")
+        self.config.Cache.StateDirectory = str(self.workspace / "state")
+
+    @property
+    def calls_log(self) -> Path:
+        return self.workspace / "buildah" / "calls.jsonl"
+
+    def builders(self) -> Dict[str, Callable[[], BaseBuilder]]:
+        return {
+            "core": lambda: CoreBuilder(self.config),
+            "runtime": lambda: RuntimeBuilder(self.config),
+            "postgres-sink": lambda: PostgresSinkBuilder(self.config),
+        }
+
+    def _prepare(self):
+        shutil.rmtree(self.workspace, ignore_errors=True)
+        (self.workspace / "buildah").mkdir(parents=True)
+
+        os.environ["FAKE_BUILDAH_STATE"] = str(self.workspace / "buildah")
+        os.environ["FAKE_BUILDAH_LATENCY_SCALE"] = str(self.latency_scale)
+
+        self._seed_artifacts()
+
+    def _seed_artifacts(self):
+        """
+        Put generated artifacts into the artifact store under the keys of every URL the cached steps fetch.
+        :return:
+        """
+        builders = [create() for create in self.builders().values()]
+        if self.config.ApachePulsar.Runtime.Java.Jlink.Enabled:
+            builders.append(JlinkBuilder(self.config))
+
+        store = ArtifactCache.for_spec(self.config)
+        for builder in builders:
+            for step in builder.cached_steps().values():
+                keys = step.hash_inputs[2] if len(step.hash_inputs) > 2 else None
+                if not isinstance(keys, dict) or "url" not in keys:
+                    continue
+
+                url, sha512 = keys["url"], keys.get("sha512", "")
+                target = store.directory / store.key(url, sha512) / url.rstrip("/").rsplit("/", 1)[-1]
+                if not target.exists():
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    self._generate_artifact(target)
+
+    def _generate_artifact(self, target: Path):
+        size = self.artifact_mb * 1000 * 1000
+        if not target.name.endswith((".tar.gz", ".tgz")):
+            target.write_bytes(os.urandom(size))
+            return
+
+        # A distribution-like tree below one top-level directory (stripped on extraction)
+        root = target.name.split(".tar")[0]
+        files = {"bin/pulsar": 2000, "bin/java": 2000, "conf/broker.conf": 50000}
+        files.update({f"lib/library-{i}.jar": size // 20 for i in range(16)})
+        files.update({f"examples/example-{i}.jar": size // 20 for i in range(2)})
+        files.update({f"instances/deps/dependency-{i}.jar": size // 20 for i in range(2)})
+
+        with tarfile.open(target, "w:gz", compresslevel=1) as tar:
+            for name, length in files.items():
+                info = tarfile.TarInfo(f"{root}/{name}")
+                info.size = length
+                info.mode = 0o755 if name.startswith("bin/") else 0o644
+                tar.addfile(info, io.BytesIO(os.urandom(length)))
+
+    def _calls(self) -> int:
+        try:
+            with open(self.calls_log, "r") as f:
+                return sum(1 for _ in f)
+        except FileNotFoundError:
+            return 0
+
+    def _run_scenario(self, scenario: str) -> List[dict]:
+        # The fake storage changed behind the index's back between scenarios
+        ImageIndex.shared(self.config.Buildah.Path).refresh()
+
+        results = []
+        for name, create in self.builders().items():
+            builder = create()
+            builder.console = self.build_console
+
+            plan = plan_build(name, builder)
+            hits = sum(1 for step in plan.steps if step.cached)
+
+            calls_before = self._calls()
+            start = time.monotonic()
+            builder.build()
+            seconds = time.monotonic() - start
+
+            result = {
+                "builder": name,
+                "seconds": round(seconds, 3),
+                "buildah_calls": self._calls() - calls_before,
+                "steps": len(plan.steps),
+                "cache_hits": hits,
+                "hit_rate": round(hits / len(plan.steps), 3) if plan.steps else 1.0,
+            }
+            self.console.print(f"[dim]{scenario} {name}: {result['seconds']:.2f}s, {result['buildah_calls']} buildah "
+                               f"calls, {hits}/{len(plan.steps)} cached steps[/dim]")
+            results.append(result)
+
+        return results
+
+    def run(self) -> dict:
+        """
+        Run all scenarios.
+        :return: Results per scenario and builder.
+        """
+        self._prepare()
+
+        results = {"at": time.time(), "latency_scale": self.latency_scale, "artifact_mb": self.artifact_mb,
+                   "scenarios": {}}
+        for scenario in self.SCENARIOS:
+            results["scenarios"][scenario] = self._run_scenario(scenario)
+
+        return results
+
+
+def compare_build_results(results: dict, baseline: dict, threshold: float) -> List[str]:
+    """
+    Regressions against baseline: more buildah calls or fewer cache hits (both deterministic), or wall time above
+    the baseline by more than threshold.
+    :param results:
+    :param baseline:
+    :param threshold: Allowed relative increase of the wall time, e.g. 0.1
+    :return: One message per regression.
+    """
+    regressions = []
+    for scenario, entries in results["scenarios"].items():
+        previous = {e["builder"]: e for e in baseline.get("scenarios", {}).get(scenario, [])}
+        for entry in entries:
+            base = previous.get(entry["builder"])
+            if base is None:
+                continue
+
+            name = f"{scenario} {entry['builder']}"
+            if entry["buildah_calls"] > base["buildah_calls"]:
+                regressions.append(f"{name}: {entry['buildah_calls']} buildah calls, baseline {base['buildah_calls']}")
+            if entry["cache_hits"] < base["cache_hits"]:
+                regressions.append(f"{name}: {entry['cache_hits']} cached steps, baseline {base['cache_hits']}")
+            if entry["seconds"] > base["seconds"] * (1 + threshold):
+                regressions.append(f"{name}: {entry['seconds']:.2f}s, baseline {base['seconds']:.2f}s")
+
+    return regressions
+
+
+def print_build_results(results: dict, baseline: Optional[dict] = None, output: Optional[Console] = None):
+    output = output if output is not None else Console()
+
+    table = Table(title="Build orchestration against fake buildah")
+    table.add_column("Scenario")
+    table.add_column("Builder")
+    table.add_column("Time", justify="right")
+    table.add_column("Buildah calls", justify="right")
+    table.add_column("Cache hits", justify="right")
+
+    for scenario, entries in results["scenarios"].items():
+        previous = {e["builder"]: e for e in (baseline or {}).get("scenarios", {}).get(scenario, [])}
+        for entry in entries:
+            base = previous.get(entry["builder"], {})
+            seconds = f"{entry['seconds']:.2f}s"
+            calls = str(entry["buildah_calls"])
+            if base:
+                seconds += f" ({(entry['seconds'] - base['seconds']) / max(base['seconds'], 1e-6):+.0%})"
+                calls += f" ({entry['buildah_calls'] - base['buildah_calls']:+d})"
+            table.add_row(scenario, entry["builder"], seconds, calls,
+                          f"{entry['cache_hits']}/{entry['steps']} ({entry['hit_rate']:.0%})")
+
+    output.print(table)
+
+
+def load_json(path: Path) -> Optional[dict]:
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def write_json(path: Path, data: dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
@@ -0,0 +1 @@
+from .cache import app
\ No newline at end of file
@@ -0,0 +1,67 @@
+from pathlib import Path
+from typing import List, Optional
+
+import typer
+
+from apache_pulsar_setup.core import BuildSpec, load_spec, prune_cache_images, collect_cache_garbage
+from ..connectors.catalog.builder import catalog_builders
+from ..connectors.postgres_sink.builder import PostgresSinkBuilder
+from ..core.builder import CoreBuilder
+from ..runtime.builder import RuntimeBuilder
+from ..runtime.jlink import JlinkBuilder
+
+app = typer.Typer(help="Layer cache shared by all builders.")
+
+
+def _cache_prefixes(config: BuildSpec) -> List[str]:
+    core = CoreBuilder(config)
+    return [
+        core.shared_cache_prefix,
+        core.cache_prefix,
+        RuntimeBuilder(config).cache_prefix,
+        JlinkBuilder(config).cache_prefix,
+        PostgresSinkBuilder(config).cache_prefix,
+        *[connector.cache_prefix for connector in catalog_builders(config, [])]
+    ]
+
+
+@app.command("prune", help="Delete the cache images of all builders and shared steps in one pass.")
+def prune(
+        spec_file: Optional[Path] = typer.Option("configs/build.yaml", "--spec", "--s",
+                                                 help="Path to build specification file.")
+):
+    """
+    Delete the cache images of every builder.
+
+    :param spec_file: Path to build spec file.
+    :return:
+    """
+    config = load_spec(spec_file, BuildSpec)
+
+    prune_cache_images(config.Buildah.Path, *_cache_prefixes(config))
+
+
+@app.command("gc", help="Evict least-recently-used cache layers until the cache fits its size budget.")
+def gc(
+        spec_file: Optional[Path] = typer.Option("configs/build.yaml", "--spec", "--s",
+                                                 help="Path to build specification file."),
+        budget_mb: Optional[int] = typer.Option(None, "--budget-mb", "--b", min=0,
+                                                help="Optional. Cache size budget, defaults to Cache.BudgetMb."),
+        dry_run: bool = typer.Option(False, "--dry-run", help="Only print the layers that would be evicted.")
+):
+    """
+    Evict least-recently-used cache layers, keeping chains used by final images.
+
+    :param spec_file: Path to build spec file.
+    :param budget_mb: Cache size budget in MB.
+    :param dry_run: Do not delete anything.
+    :return:
+    """
+    config = load_spec(spec_file, BuildSpec)
+
+    collect_cache_garbage(
+        config,
+        _cache_prefixes(config),
+        budget_mb if budget_mb is not None else config.Cache.BudgetMb,
+        dry_run
+    )
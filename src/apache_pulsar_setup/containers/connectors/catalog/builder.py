@@ -0,0 +1,207 @@
+import json
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Any, Dict, List
+
+from apache_pulsar_setup.core import BaseBuilder, BuildSpec, prune_cache_images, BuildahContainer, CachedStep, \
+    ImageIndex, plan_build
+from apache_pulsar_setup.core.artifacts import ArtifactCache
+from ...runtime.builder import RuntimeBuilder
+
+
+class ConnectorBuilder(BaseBuilder):
+    """
+    Image of one connector of the Connectors catalog: the runtime image plus the connector archive.
+
+    Dependencies, Java runtime, user and permissions come with the runtime image, so the connector image only adds
+    the archive layer and its configuration; nodes holding the runtime image pull a few MB per connector.
+    """
+
+    # The runtime's health probe, pointed at the metrics server of the connector instance
+    healthcheck = True
+
+    def __init__(self, config: BuildSpec, name: str, cache_prefix: str = "", image_name: str = "",
+                 image_tag: str = "", conn_version: str = "latest", runtime_image: str = "", squash: bool = False):
+        if name not in config.Connectors:
+            raise RuntimeError(f"No connector {name} in Connectors, available: {', '.join(config.Connectors)}")
+        self.name = name
+        self.connector = config.Connectors[name]
+
+        super().__init__(config, cache_prefix, squash)
+        self._init_version(conn_version)
+
+        self.runtime_image = runtime_image if len(runtime_image) > 0 else RuntimeBuilder(config).final_image
+        self.base_image = self.runtime_image
+
+        if len(image_name) > 0:
+            self.image_name = image_name
+        else:
+            self.image_name = f"{self.config.ProjectName}-connector-{name}"
+
+        if len(image_tag) > 0:
+            self.image_tag = image_tag
+        else:
+            self.image_tag = self.conn_version
+
+    def _init_version(self, conn_version: str):
+        if not len(conn_version) > 0 or conn_version == "latest":
+            conn_version = self.connector.Current
+
+        if conn_version not in self.connector.Versions:
+            raise RuntimeError(f"No config found for connector {self.name} version {conn_version}")
+
+        self.conn_version = conn_version
+        self.version_config = self.connector.Versions[conn_version]
+
+    def _init_cache_prefix(self, cache_prefix: str):
+        if len(cache_prefix) > 0:
+            self.cache_prefix = cache_prefix
+        else:
+            self.cache_prefix = f"{self.config.ProjectName}/cache/connectors/{self.name}"
+
+    def for_platform(self, platform: str) -> "ConnectorBuilder":
+        clone = super().for_platform(platform)
+        clone.base_image = clone.platform_image(self.runtime_image)
+        return clone
+
+    @property
+    def archive(self) -> str:
+        """
+        Path of the connector archive inside the image.
+        :return:
+        """
+        filename = self.version_config.SourceUrl.rstrip("/").rsplit("/", 1)[-1]
+        return f"{self.config.ApachePulsar.Prefix}/connectors/{filename}"
+
+    def fetch(self) -> Path:
+        """
+        Download the connector archive into the artifact store, if it is not there yet.
+        :return:
+        """
+        return ArtifactCache.for_spec(self.config).fetch(self.version_config.SourceUrl, self.version_config.Sha512,
+                                                         output=self.console)
+
+    def runtime_id(self) -> str:
+        """
+        ID of the runtime image, empty if it does not exist. Its cache label only covers the cached steps, while the
+        runtime's uncommitted commands (user, entrypoint) also end up in the connector image.
+        :return:
+        """
+        record = ImageIndex.shared(self.config.Buildah.Path).get(self.base_image)
+        return record.id if record is not None else ""
+
+    def command(self) -> List[str]:
+        kind = self.connector.Kind
+        command = ["pulsar-admin", f"{kind}s", "localrun", "--archive", self.archive]
+        if self.connector.ConfigPath:
+            command.extend([f"--{kind}-config-file", self.connector.ConfigPath])
+        command.extend(["--broker-service-url", self.connector.BrokerUrl,
+                        "--metrics-port-start", str(self.connector.MetricsPort)])
+        return command
+
+    def cached_steps(self) -> Dict[str, CachedStep]:
+        return {
+            "archive": CachedStep.copy_host(
+                "archive",
+                lambda container: container.artifacts.fetch(self.version_config.SourceUrl,
+                                                            self.version_config.Sha512, output=self.console),
+                self.archive,
+                # A rebuilt runtime image keeps its name, its ID keeps the chains apart
+                extra_cache_keys={"step": "archive", "url": self.version_config.SourceUrl,
+                                  "sha512": self.version_config.Sha512, "version": self.conn_version,
+                                  "runtime": self.runtime_id()}
+            )
+        }
+
+    def memo_inputs(self) -> Dict[str, Any]:
+        return {"connector": self.connector.model_dump(mode="json", exclude={"Versions"}),
+                "version": self.conn_version, "command": self.command()}
+
+    def build(self):
+        self.log(f"Starting build of connector {self.name} {self.conn_version} on {self.base_image}",
+                 style="bold blue")
+
+        if not self.runtime_id():
+            raise RuntimeError(f"Runtime image {self.base_image} not found, build the runtime first")
+
+        digest = self.build_digest()
+        if self.reuse_build(digest):
+            return
+
+        steps = self.cached_steps()
+        image_name_tag = self.final_image
+        previous_size = self.image_size(image_name_tag)
+
+        with BuildahContainer(
+                base_image=self.base_image,
+                image_name=self.image_name,
+                config=self.config,
+                cache_prefix=self.cache_prefix,
+                output=self.console,
+                steps=list(steps.values()),
+                platform=self.platform
+        ) as container:
+            self.log(f"[bold blue]Step 1/2[/bold blue]: Adding connector archive {self.archive}")
+
+            container.run_step(steps["archive"])
+
+            self.log("[bold blue]Step 2/2[/bold blue]: Tagging image and adding metadata.")
+
+            container.configure([
+                ("--env", f"PULSAR_CONNECTOR_ARCHIVE={self.archive}"),
+                ("--env", f"PULSAR_HEALTH_PORT={self.connector.MetricsPort}"),
+                ("--env", f"PULSAR_HEALTH_BROKER_URL={self.connector.BrokerUrl}"),
+                ("--cmd", json.dumps(self.command())),
+                ("--label", f"org.apache.pulsar.connector.name={self.name}"),
+                ("--label", f"org.apache.pulsar.connector.kind={self.connector.Kind}"),
+                ("--label", f"org.apache.pulsar.connector.version={self.conn_version}"),
+            ])
+            self.commit_final(container, digest)
+
+            self.log(f"Image tagged as: [green]{image_name_tag}[/green]")
+            self.report_size(image_name_tag, previous_size)
+            self.log(f"Spawned {container.subprocess_count} buildah subprocesses", style="dim")
+
+    def prune_cache_images(self):
+        prune_cache_images(self.config.Buildah.Path, self.cache_prefix)
+
+
+def catalog_builders(config: BuildSpec, names: List[str], runtime_image: str = "", image_tag: str = "",
+                     squash: bool = False) -> List[ConnectorBuilder]:
+    """
+    Builders of the connectors names, all of Connectors when empty.
+    :param config:
+    :param names:
+    :param runtime_image: Optional. Runtime image the connectors are layered on.
+    :param image_tag: Optional. Tag of the connector images, the connector version by default.
+    :param squash:
+    :return:
+    """
+    return [ConnectorBuilder(config, name, image_tag=image_tag, runtime_image=runtime_image, squash=squash)
+            for name in (names or list(config.Connectors))]
+
+
+def prefetch_connectors(builders: List[ConnectorBuilder]):
+    """
+    Start downloading the archives of all builders whose archive layer is not cached, concurrently, in the background.
+
+    Builders fetching an archive while it is downloaded wait for that download (the artifact store locks per
+    artifact). A failed download is logged; the builder fetches again and reports its own error if that fails too.
+    :param builders:
+    :return:
+    """
+    pending = [b for b in builders if not all(step.cached for step in plan_build(b.name, b).steps)]
+    if not pending:
+        return
+
+    def report(builder: ConnectorBuilder, future: Future):
+        error = future.exception()
+        if error is not None:
+            builder.log(f"Prefetching connector {builder.name} failed, retrying during its build: {error}",
+                        style="yellow")
+
+    executor = ThreadPoolExecutor(max_workers=len(pending), thread_name_prefix="connector-fetch")
+    for builder in pending:
+        executor.submit(builder.fetch).add_done_callback(partial(report, builder))
+    executor.shutdown(wait=False)
@@ -0,0 +1,136 @@
+from pathlib import Path
+from typing import List, Optional
+
+import typer
+from rich.console import Console
+from rich.table import Table
+
+from .builder import catalog_builders, prefetch_connectors
+from ...runtime.builder import RuntimeBuilder
+from apache_pulsar_setup.core import BuildSpec, BuildGraph, ImageIndex, load_spec, plan_build, print_plans, \
+    parse_platforms, prune_cache_images
+
+console = Console()
+
+app = typer.Typer(help="Pulsar IO connectors of the Connectors catalog, layered on the runtime image.")
+
+
+@app.command("list", help="List the connectors of the catalog and their images.")
+def list_connectors(
+        spec_file: Optional[Path] = typer.Option("configs/build.yaml", "--spec", "--s",
+                                                 help="Path to build specification file.")
+):
+    """
+    List the connectors of the catalog.
+
+    :param spec_file: Path to build spec file.
+    :return:
+    """
+    config = load_spec(spec_file, BuildSpec)
+    images = ImageIndex.shared(config.Buildah.Path)
+
+    table = Table(title="Connectors")
+    table.add_column("Name")
+    table.add_column("Kind")
+    table.add_column("Version")
+    table.add_column("Image")
+    table.add_column("Built")
+
+    for builder in catalog_builders(config, []):
+        table.add_row(builder.name, builder.connector.Kind, builder.conn_version, builder.final_image,
+                      "yes" if images.exists(builder.final_image) else "no")
+
+    console.print(table)
+
+
+@app.command("build", help="Build connector images on top of the runtime image, downloading archives in parallel.")
+def build(
+        spec_file: Optional[Path] = typer.Option("configs/build.yaml", "--spec", "--s",
+                                                 help="Path to build specification file."),
+        names: Optional[List[str]] = typer.Option(None, "--name", "--n",
+                                                  help="Optional. Connector to build, repeatable. All by default."),
+        runtime_image_name: Optional[str] = typer.Option("apache-pulsar", "--runtime-image-name",
+                                                         help="Name of the apache pulsar runtime image."),
+        runtime_image_tag: Optional[str] = typer.Option("", "--runtime-image-tag",
+                                                        help="Optional. Tag of the apache pulsar runtime image."),
+        image_tag: Optional[str] = typer.Option("", "--image-tag", "--t",
+                                                help="Optional. Tag of the connector images, the connector version "
+                                                     "by default."),
+        jobs: int = typer.Option(4, "--jobs", "--j", min=1,
+                                 help="Maximum number of connector images built at the same time."),
+        squash: bool = typer.Option(False, "--squash", help="Commit the final images as a single layer."),
+        platforms: Optional[str] = typer.Option("", "--platforms", "--p",
+                                                help="Optional. Comma separated os/arch list, e.g. "
+                                                     "linux/amd64,linux/arm64. The runtime image must exist for "
+                                                     "every platform.")
+):
+    """
+    Build connector images.
+
+    :param spec_file: Path to build spec file.
+    :param names: Connectors to build.
+    :param runtime_image_name: Name of the runtime image.
+    :param runtime_image_tag: Tag of the runtime image.
+    :param image_tag: Tag of the connector images.
+    :param jobs: Concurrency limit.
+    :param squash: Squash the final images.
+    :param platforms: Target platforms.
+    :return:
+    """
+    config = load_spec(spec_file, BuildSpec)
+
+    runtime_image = RuntimeBuilder(config, image_name=runtime_image_name, image_tag=runtime_image_tag).final_image
+    builders = catalog_builders(config, names or [], runtime_image, image_tag, squash)
+
+    prefetch_connectors(builders)
+
+    graph = BuildGraph(max_workers=jobs)
+    for builder in builders:
+        graph.add(f"connector-{builder.name}", builder, platforms=parse_platforms(platforms))
+
+    try:
+        graph.run()
+    except RuntimeError:
+        raise typer.Exit(code=1)
+
+
+@app.command("plan", help="Show which cached steps of the connector builds would hit the layer cache.")
+def plan(
+        spec_file: Optional[Path] = typer.Option("configs/build.yaml", "--spec", "--s",
+                                                 help="Path to build specification file."),
+        names: Optional[List[str]] = typer.Option(None, "--name", "--n",
+                                                  help="Optional. Connector to plan, repeatable. All by default."),
+        runtime_image_name: Optional[str] = typer.Option("apache-pulsar", "--runtime-image-name",
+                                                         help="Name of the apache pulsar runtime image."),
+        as_json: bool = typer.Option(False, "--json", help="Print the plan as JSON.")
+):
+    """
+    Show the connector build plans without running anything.
+
+    :param spec_file: Path to build spec file.
+    :param names: Connectors to plan.
+    :param runtime_image_name: Name of the runtime image.
+    :param as_json: Print JSON instead of a table.
+    :return:
+    """
+    config = load_spec(spec_file, BuildSpec)
+
+    runtime_image = RuntimeBuilder(config, image_name=runtime_image_name).final_image
+    print_plans([plan_build(f"connector-{b.name}", b) for b in catalog_builders(config, names or [], runtime_image)],
+                as_json)
+
+
+@app.command("delete-cache", help="Delete cache images used to build the connector images.")
+def delete_cache(
+        spec_file: Optional[Path] = typer.Option("configs/build.yaml", "--spec", "--s",
+                                                 help="Path to build specification file.")
+):
+    """
+    Delete cache images of every connector in one pass.
+
+    :param spec_file: Path to build spec file.
+    :return:
+    """
+    config = load_spec(spec_file, BuildSpec)
+
+    prune_cache_images(config.Buildah.Path, *[b.cache_prefix for b in catalog_builders(config, [])])
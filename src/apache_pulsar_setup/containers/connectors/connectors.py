@@ -1,7 +1,18 @@
 import typer
 
-from .postgres_sink import app as postgres_sink_app
+from apache_pulsar_setup.lazy_group import lazy_group
 
-app = typer.Typer(help="Connectors for the pulsar stack.")
+app = typer.Typer(help="Connectors for the pulsar stack.", cls=lazy_group({
+    "postgres-sink": ("apache_pulsar_setup.containers.connectors.postgres_sink", "Postgres JDBC sink"),
+    "catalog": ("apache_pulsar_setup.containers.connectors.catalog",
+                "Pulsar IO connectors of the Connectors catalog, layered on the runtime image."),
+}))
 
-app.add_typer(postgres_sink_app, name="postgres-sink")
+
+@app.callback()
+def connectors():
+    """
+    Connectors for the pulsar stack.
+
+    :return:
+    """
@@ -1,12 +1,17 @@
 from pathlib import Path
+from typing import Any, Dict
 
-from apache_pulsar_setup.core import BaseBuilder, BuildSpec, prune_cache_images, BuildahContainer
+from apache_pulsar_setup.core import BaseBuilder, BuildSpec, prune_cache_images, BuildahContainer, CachedStep, \
+    zypper_install_step, slim_step, jdbc_sink_config_step, render_jdbc_sink, HEALTHCHECK_PATH
+from ...runtime.jlink import JlinkBuilder, java_runtime_step
 
 
 class PostgresSinkBuilder(BaseBuilder):
+    healthcheck = True
+
     def __init__(self, config: BuildSpec, cache_prefix: str = "", image_name: str = "", image_tag: str = "",
-                 conn_version: str = "latest"):
-        super().__init__(config, cache_prefix)
+                 conn_version: str = "latest", squash: bool = False):
+        super().__init__(config, cache_prefix, squash)
         self._init_version(config, conn_version)
 
         if len(image_name) > 0:
@@ -37,49 +42,115 @@ class PostgresSinkBuilder(BaseBuilder):
         else:
             self.cache_prefix = f"{self.config.ProjectName}/cache/postgres-sink/{self.config.ApachePulsar.Version}"
 
+    @property
+    def archive(self) -> str:
+        return f"{self.config.ApachePulsar.Prefix}/connectors/pulsar-io-jdbc-postgres.nar"
+
+    def sink_config(self) -> Dict[str, Any]:
+        """
+        Sink configuration written to ConfigPath, without credentials (added by the entrypoint).
+        :return:
+        """
+        sink = self.config.PostgresSink.Sink
+        return render_jdbc_sink(sink.Preset, sink.function(self.archive), sink.configs())
+
+    def cached_steps(self) -> Dict[str, CachedStep]:
+        core_image = self.platform_image(f"{self.config.ProjectName}-core:{self.config.ApachePulsar.Version}")
+
+        steps = {
+            "core": CachedStep.copy_image(
+                "core",
+                core_image,
+                self.image_identity(core_image),
+                self.config.ApachePulsar.Prefix,
+                self.config.ApachePulsar.Prefix,
+                chown=f"{self.config.ApachePulsar.Runtime.Uid}:{self.config.ApachePulsar.Runtime.Gid}",
+                shared=True
+            ),
+            "deps": zypper_install_step(self.config.ApachePulsar.Runtime.Dependencies, shared=True),
+            "jre": java_runtime_step(self)
+        }
+
+        if self.config.PostgresSink.Slim.Drop:
+            slim = self.config.PostgresSink.Slim
+            steps["slim"] = slim_step(self.config.ApachePulsar.Prefix, slim.Drop, slim.Keep, shared=True)
+
+        steps["source"] = CachedStep.copy_host(
+            "source",
+            lambda container: container.artifacts.fetch(self.version_config.SourceUrl, self.version_config.Sha512,
+                                                        output=self.console),
+            self.archive,
+            extra_cache_keys={"step": "source", "url": self.version_config.SourceUrl,
+                              "sha512": self.version_config.Sha512, "version": self.conn_version}
+        )
+        steps["sink_config"] = jdbc_sink_config_step(
+            self.config.PostgresSink.ConfigPath,
+            self.sink_config(),
+            chown=f"{self.config.ApachePulsar.Runtime.Uid}:{self.config.ApachePulsar.Runtime.Gid}"
+        )
+
+        return steps
+
+    def memo_inputs(self) -> Dict[str, Any]:
+        return {
+            "version": self.config.ApachePulsar.Version,
+            "prefix": self.config.ApachePulsar.Prefix,
+            "runtime": self.config.ApachePulsar.Runtime.model_dump(mode="json"),
+            "entrypoint": self.resource_digest("sinks_entrypoint.sh"),
+            "healthcheck": self.resource_digest("healthcheck.sh"),
+            "sink": {"version": self.conn_version, "config_path": self.config.PostgresSink.ConfigPath,
+                     "broker_url": self.config.PostgresSink.BrokerUrl,
+                     "metrics_port": self.config.PostgresSink.MetricsPort},
+        }
+
     def build(self):
         self.log(f"Starting build for postgres sink for Apache Pulsar {self.config.ApachePulsar.Version} postgres-sink",
                  style="bold blue")
 
+        if self.config.ApachePulsar.Runtime.Java.Jlink.Enabled:
+            jlink = JlinkBuilder(self.config)
+            if self.platform:
+                jlink = jlink.for_platform(self.platform)
+            jlink.console = self.console
+            jlink.build()
+
+        # After the jlink stage, whose image is an input of the jre step
+        digest = self.build_digest()
+        if self.reuse_build(digest):
+            return
+
+        steps = self.cached_steps()
+
         current_step = 1
 
         with BuildahContainer(
-                base_image=self.config.BaseImage,
+                base_image=self.base_image,
                 image_name=self.image_name,
                 config=self.config,
-                cache_prefix=self.cache_prefix
+                cache_prefix=self.cache_prefix,
+                output=self.console,
+                steps=list(steps.values()),
+                shared_cache_prefix=self.shared_cache_prefix,
+                platform=self.platform
         ) as container:
             self.log(f"[bold blue]Step {current_step}[/bold blue]: Retrieving apache pulsar artifacts")
 
-            self.image_tag = self.config.ApachePulsar.Version
+            image_name_tag = self.final_image
+            previous_size = self.image_size(image_name_tag)
 
-            container.copy_container_current(
-                f"{self.config.ProjectName}-core:{self.config.ApachePulsar.Version}",
-                self.config.ApachePulsar.Prefix,
-                self.config.ApachePulsar.Prefix
-            )
+            container.run_step(steps["core"])
 
             current_step += 1
             self.log(
                 f"[bold blue]Step {current_step}[/bold blue]: Installing apache pulsar postgres-sink dependencies")
 
-            container.run_cached(
-                command=[
-                    "sh", "-c",
-                    f"""
-                        zypper --non-interactive refresh &&
-                        zypper --non-interactive install """ + " ".join(self.config.ApachePulsar.Runtime.Dependencies)],
-                extra_cache_keys={"step": "deps", "packages": sorted(self.config.ApachePulsar.Runtime.Dependencies)}
-            )
+            container.run_step(steps["deps"])
 
-            container.run(command=["zypper", "clean", "--all"])
+            container.run_step(steps["jre"])
+            container.configure([("--env", "JAVA_HOME=/opt/java")])
 
-            container.install_jdk_jre(
-                self.config.ApachePulsar.Runtime.Java.Jre.Major,
-                self.config.ApachePulsar.Runtime.Java.Jre.Minor,
-                self.config.ApachePulsar.Runtime.Java.Jre.Build,
-                component="jre"
-            )
+            if "slim" in steps:
+                container.run_step(steps["slim"])
 
             current_step += 1
             self.log(f"[bold blue]Step {current_step}[/bold blue]: Downloading postgres sink connector")
@@ -89,13 +160,12 @@ class PostgresSinkBuilder(BaseBuilder):
                 command=["mkdir", "-p", connectors_dir]
             )
 
-            container.run_cached(
-                command=[
-                    "sh", "-c",
-                    f"curl -L {self.version_config.SourceUrl} -o {connectors_dir}/pulsar-io-jdbc-postgres.nar"
-                ],
-                extra_cache_keys={"step": "source", "url": self.version_config.SourceUrl, "version": self.conn_version}
-            )
+            container.run_step(steps["source"])
+
+            current_step += 1
+            self.log(f"[bold blue]Step {current_step}[/bold blue]: Rendering sink configuration")
+
+            container.run_step(steps["sink_config"])
 
             current_step += 1
             self.log(
@@ -131,26 +201,24 @@ class PostgresSinkBuilder(BaseBuilder):
                 ("--env", "LANG=C.UTF-8"),
                 ("--env", "LC_ALL=C.UTF-8"),
                 ("--env", f"POSTGRES_CONNECTOR_CONFIG_PATH={self.config.PostgresSink.ConfigPath}"),
-                ("--env", f"POSTGRES_CONNECTOR_BROKER_URL={self.config.PostgresSink.BrokerUrl}")
+                ("--env", f"POSTGRES_CONNECTOR_BROKER_URL={self.config.PostgresSink.BrokerUrl}"),
+                ("--env", f"POSTGRES_CONNECTOR_METRICS_PORT={self.config.PostgresSink.MetricsPort}")
             ])
 
-            for d in ["data", "logs"]:
-                full_d_dir = f"{self.config.ApachePulsar.Prefix}/{d}"
-                container.run(["mkdir", "-p", full_d_dir])
-                container.configure([
-                    ("--volume", full_d_dir)
-                ])
-
-            container.run(
-                command=["chown", "-R",
-                         f"{self.config.ApachePulsar.Runtime.Uid}:{self.config.ApachePulsar.Runtime.Gid}",
-                         self.config.ApachePulsar.Prefix]
-            )
+            volume_dirs = [f"{self.config.ApachePulsar.Prefix}/{d}" for d in ["data", "logs"]]
+            container.run(["mkdir", "-p", *volume_dirs])
+            container.configure([("--volume", d) for d in volume_dirs])
 
             container.copy_host_container(Path(f"{self.config.ApachePulsar.Runtime.Resources}/sinks_entrypoint.sh"),
-                                          "/usr/local/bin/entrypoint.sh")
-            container.run(command=["chmod", "+x", "/usr/local/bin/entrypoint.sh"])
+                                          "/usr/local/bin/entrypoint.sh", chmod="755")
+            container.copy_host_container(Path(f"{self.config.ApachePulsar.Runtime.Resources}/healthcheck.sh"),
+                                          HEALTHCHECK_PATH, chmod="755")
+
+            # The prefix is copied with --chown; a recursive chown would duplicate every file in a new layer.
+            container.run(["chown", f"{self.config.ApachePulsar.Runtime.Uid}:{self.config.ApachePulsar.Runtime.Gid}",
+                           self.config.ApachePulsar.Prefix, *volume_dirs])
 
+            container.configure(self.healthcheck_configs())
             container.configure([
                 ("--entrypoint", '["/usr/local/bin/entrypoint.sh"]'),
                 ("--cmd", '[]'),
@@ -170,10 +238,11 @@ class PostgresSinkBuilder(BaseBuilder):
                     container.configure([
                         ("--port", f"{port}")
                     ])
-            image_name_tag = self.image_name + ":" + self.image_tag
-            container.commit(image_name_tag)
+            self.commit_final(container, digest)
 
             self.log(f"Image tagged as: [green]{image_name_tag}[/green]")
+            self.report_size(image_name_tag, previous_size)
+            self.log(f"Spawned {container.subprocess_count} buildah subprocesses", style="dim")
 
     def prune_cache_images(self):
         prune_cache_images(self.config.Buildah.Path, self.cache_prefix)
@@ -2,11 +2,14 @@ from pathlib import Path
 from typing import Optional
 
 import typer
+from rich.console import Console
 
 from .builder import PostgresSinkBuilder
-from apache_pulsar_setup.core import BuildSpec, load_spec
+from apache_pulsar_setup.core import BuildSpec, load_spec, plan_build, print_plans, build_for_platforms, \
+    parse_platforms, render_jdbc_sink, format_jdbc_sink
 
 app = typer.Typer(help="Postgres JDBC sink")
+console = Console()
 
 @app.command("build", help="Build the postgres sink for apache pulsar.")
 def build(
@@ -18,11 +21,19 @@ def build(
                                                 help="Optional. Tag of new image"),
         cache_prefix: Optional[str] = typer.Option("", "--cache-prefix", "--c",
                                                    help="Optional. Custom prefix for generated images acting as cache layers."),
-        version: Optional[str] = typer.Option("latest", "--version", "--v", help="Optional. Version of connector.")
+        version: Optional[str] = typer.Option("latest", "--version", "--v", help="Optional. Version of connector."),
+        squash: bool = typer.Option(False, "--squash",
+                                    help="Commit the final image as a single layer, so slimmed files free space."),
+        platforms: Optional[str] = typer.Option("", "--platforms", "--p",
+                                                help="Optional. Comma separated os/arch list, e.g. "
+                                                     "linux/amd64,linux/arm64. Platforms are built in parallel and "
+                                                     "assembled into a manifest list.")
 ):
     """
     Build the postgres sink for apache pulsar.
 
+    :param platforms:
+    :param squash:
     :param version:
     :param cache_prefix:
     :param spec_file:
@@ -32,9 +43,35 @@ def build(
     """
     config = load_spec(spec_file, BuildSpec)
 
-    builder = PostgresSinkBuilder(config, cache_prefix, image_name, image_tag, version)
+    builder = PostgresSinkBuilder(config, cache_prefix, image_name, image_tag, version, squash)
 
-    builder.build()
+    build_for_platforms("postgres-sink", builder, parse_platforms(platforms))
+
+
+@app.command("plan", help="Show which cached steps of the postgres sink build would hit the layer cache.")
+def plan(
+        spec_file: Optional[Path] = typer.Option("configs/build.yaml", "--spec", "--s",
+                                                 help="Path to build specification file."),
+        cache_prefix: Optional[str] = typer.Option("", "--cache-prefix", "--c",
+                                                   help="Optional. Custom prefix for generated images acting as cache layers."),
+        version: Optional[str] = typer.Option("latest", "--version", "--v", help="Optional. Version of connector."),
+        as_json: bool = typer.Option(False, "--json", help="Print the plan as JSON.")
+):
+    """
+    Show the postgres sink build plan without running anything.
+
+    :param spec_file: Path to build spec file.
+    :param cache_prefix: Custom prefix for cache layers generated.
+    :param version: Version of connector.
+    :param as_json: Print JSON instead of a table.
+
+    :return:
+    """
+    config = load_spec(spec_file, BuildSpec)
+
+    builder = PostgresSinkBuilder(config, cache_prefix, conn_version=version)
+
+    print_plans([plan_build("postgres-sink", builder)], as_json)
 
 
 @app.command("delete-cache", help="Delete cache images used to build the postgres sink for apache pulsar image.")
@@ -57,3 +94,33 @@ def delete_cache(
     builder = PostgresSinkBuilder(config, cache_prefix)
 
     builder.prune_cache_images()
+
+
+@app.command("config", help="Show the sink configuration the postgres sink build writes into the image.")
+def config(
+        spec_file: Optional[Path] = typer.Option("configs/build.yaml", "--spec", "--s",
+                                                 help="Path to build specification file."),
+        preset: Optional[str] = typer.Option("", "--preset",
+                                             help="Optional. Preset to render instead of the one of the spec.")
+):
+    """
+    Print the rendered sink configuration file.
+
+    :param spec_file: Path to build spec file.
+    :param preset: Preset overriding PostgresSink.Sink.Preset.
+
+    :return:
+    """
+    spec = load_spec(spec_file, BuildSpec)
+    sink = spec.PostgresSink.Sink
+
+    builder = PostgresSinkBuilder(spec)
+
+    try:
+        rendered = render_jdbc_sink(preset or sink.Preset, sink.function(builder.archive), sink.configs())
+    except ValueError as e:
+        console.print(f"[bold red]Invalid Configuration:[/bold red] {e}")
+        raise typer.Exit(code=1)
+
+    console.print(f"[bold]# {spec.PostgresSink.ConfigPath}[/bold]")
+    console.print(format_jdbc_sink(rendered), markup=False, highlight=False, end="")
@@ -1,12 +1,39 @@
+from pathlib import Path
+from typing import Optional
+
 import typer
-from rich.console import Console
-from .core import app as core_app
-from .runtime import app as runtime_app
-from .connectors import app as connectors_app
 
-app = typer.Typer(help="Container components for the apache pulsar stack.")
-console = Console()
+from apache_pulsar_setup.lazy_group import lazy_group
+
+# Sub-groups are imported when invoked, so --help and completion do not load the builders (see lazy_group)
+app = typer.Typer(help="Container components for the apache pulsar stack.", cls=lazy_group({
+    "core": ("apache_pulsar_setup.containers.core", "Core binaries for apache pulsar."),
+    "runtime": ("apache_pulsar_setup.containers.runtime", "An apache pulsar runtime."),
+    "connectors": ("apache_pulsar_setup.containers.connectors", "Connectors for the pulsar stack."),
+    "all": ("apache_pulsar_setup.containers.all",
+            "The complete apache pulsar stack (core, runtime and connectors)."),
+    "cache": ("apache_pulsar_setup.containers.cache", "Layer cache shared by all builders."),
+    "build-bench": ("apache_pulsar_setup.containers.build_bench",
+                    "Benchmark of the build orchestration against a fake buildah, without network or containers."),
+}))
+
+
+@app.callback()
+def containers(
+        ctx: typer.Context,
+        trace_file: Optional[Path] = typer.Option(None, "--trace-file",
+                                                  help="Optional. Trace buildah operations and write them to this "
+                                                       "file in Chrome trace-event format.")
+):
+    """
+    Container components for the apache pulsar stack.
+
+    :param ctx:
+    :param trace_file: Where to write the build trace.
+    :return:
+    """
+    if trace_file is not None:
+        from apache_pulsar_setup.core import tracer
 
-app.add_typer(core_app, name="core")
-app.add_typer(runtime_app, name="runtime")
-app.add_typer(connectors_app, name="connectors")
+        tracer.enable()
+        ctx.call_on_close(lambda: tracer.finish(trace_file))
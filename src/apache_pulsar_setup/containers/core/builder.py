@@ -1,9 +1,12 @@
-from apache_pulsar_setup.core import BaseBuilder, BuildahContainer, prune_cache_images, BuildSpec
+from typing import Any, Dict
+
+from apache_pulsar_setup.core import BaseBuilder, BuildahContainer, prune_cache_images, BuildSpec, CachedStep, \
+    zypper_install_step
 
 
 class CoreBuilder(BaseBuilder):
-    def __init__(self, config: BuildSpec, cache_prefix: str = ""):
-        super().__init__(config, cache_prefix)
+    def __init__(self, config: BuildSpec, cache_prefix: str = "", squash: bool = False):
+        super().__init__(config, cache_prefix, squash)
         self.image_name = f"{self.config.ProjectName}-core"
         self.image_tag = self.config.ApachePulsar.Version
 
@@ -13,29 +16,64 @@ class CoreBuilder(BaseBuilder):
         else:
             self.cache_prefix = f"{self.config.ProjectName}/cache/core/{self.config.ApachePulsar.Version}"
 
+    def cached_steps(self) -> Dict[str, CachedStep]:
+        steps = {}
+
+        if self.config.ApachePulsar.Build.Dependencies:
+            steps["deps"] = zypper_install_step(self.config.ApachePulsar.Build.Dependencies)
+
+        steps["download_extract"] = CachedStep.copy_host(
+            "download_extract",
+            lambda container: container.artifacts.extract(
+                self.config.ApachePulsar.SourceUrl,
+                self.config.ApachePulsar.Sha512,
+                strip_components=1,
+                output=self.console
+            ),
+            self.config.ApachePulsar.Prefix,
+            extra_cache_keys={
+                "step": "download_extract",
+                "url": self.config.ApachePulsar.SourceUrl,
+                "sha512": self.config.ApachePulsar.Sha512,
+                "prefix": self.config.ApachePulsar.Prefix
+            }
+        )
+
+        return steps
+
+    def memo_inputs(self) -> Dict[str, Any]:
+        return {"version": self.config.ApachePulsar.Version, "prefix": self.config.ApachePulsar.Prefix}
+
     def build(self):
         self.log(f"Starting build for Apache Pulsar {self.config.ApachePulsar.Version} core", style="bold blue")
 
+        digest = self.build_digest()
+        if self.reuse_build(digest):
+            return
+
+        steps = self.cached_steps()
+        image_name_tag = self.final_image
+        previous_size = self.image_size(image_name_tag)
+
         current_step = 1
         total_no_of_steps = 4
 
         with BuildahContainer(
-                base_image=self.config.BaseImage,
+                base_image=self.base_image,
                 image_name=self.image_name,
                 config=self.config,
-                cache_prefix=self.cache_prefix
+                cache_prefix=self.cache_prefix,
+                output=self.console,
+                steps=list(steps.values()),
+                platform=self.platform
         ) as container:
             self.log(
-                f"[bold blue]Step {current_step}/{total_no_of_steps}[/bold blue]: Installing build dependencies (curl, tar)")
+                f"[bold blue]Step {current_step}/{total_no_of_steps}[/bold blue]: Installing build dependencies")
 
-            container.run_cached(
-                command=[
-                    "sh", "-c",
-                    f"""
-                        zypper --non-interactive refresh &&
-                        zypper --non-interactive install """ + " ".join(self.config.ApachePulsar.Build.Dependencies)],
-                extra_cache_keys={"step": "deps", "packages": sorted(self.config.ApachePulsar.Build.Dependencies)}
-            )
+            if "deps" in steps:
+                container.run_step(steps["deps"])
+            else:
+                self.log("No build dependencies declared, skipping.", style="dim")
 
             current_step += 1
             self.log(
@@ -47,23 +85,7 @@ class CoreBuilder(BaseBuilder):
             self.log(
                 f"[bold blue]Step {current_step}/{total_no_of_steps}[/bold blue]: Downloading and Extracting from {self.config.ApachePulsar.SourceUrl}")
 
-            tar_path = f"/tmp/pulsar-{self.config.ApachePulsar.Version}.tar.gz"
-
-            container.run_cached(
-                command=[
-                    "sh", "-c",
-                    f"""
-                            curl -L '{self.config.ApachePulsar.SourceUrl}' -o {tar_path} && 
-                            tar -xzf {tar_path} -C {self.config.ApachePulsar.Prefix} --strip-components=1 &&
-                            rm {tar_path}
-                            """
-                ],
-                extra_cache_keys={
-                    "step": "download_extract",
-                    "url": self.config.ApachePulsar.SourceUrl,
-                    "prefix": self.config.ApachePulsar.Prefix
-                }
-            )
+            container.run_step(steps["download_extract"])
 
             current_step += 1
             self.log(
@@ -83,10 +105,11 @@ class CoreBuilder(BaseBuilder):
                 ("--label", f"org.apache.pulsar.prefix={self.config.ApachePulsar.Prefix}"),
             ])
 
-            image_name_tag = self.image_name + ":" + self.image_tag
-            container.commit(image_name_tag)
+            self.commit_final(container, digest)
 
             self.log(f"Image tagged as: [green]{image_name_tag}[/green]")
+            self.report_size(image_name_tag, previous_size)
+            self.log(f"Spawned {container.subprocess_count} buildah subprocesses", style="dim")
 
     def prune_cache_images(self):
         prune_cache_images(self.config.Buildah.Path, self.cache_prefix)
\ No newline at end of file
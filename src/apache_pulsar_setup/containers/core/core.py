@@ -4,7 +4,8 @@ from typing import Optional
 import typer
 
 from .builder import CoreBuilder
-from apache_pulsar_setup.core import load_spec, BuildSpec
+from apache_pulsar_setup.core import load_spec, BuildSpec, plan_build, print_plans, build_for_platforms, \
+    parse_platforms
 
 app = typer.Typer(help="Core binaries for apache pulsar.")
 
@@ -14,20 +15,52 @@ def build(
         spec_file: Optional[Path] = typer.Option("configs/build.yaml", "--spec", "--s",
                                                  help="Path to build specification file."),
         cache_prefix: Optional[str] = typer.Option("", "--cache-prefix", "--c",
-                                                   help="Optional. Custom prefix for generated images acting as cache layers.")
+                                                   help="Optional. Custom prefix for generated images acting as cache layers."),
+        squash: bool = typer.Option(False, "--squash",
+                                    help="Commit the final image as a single layer, so slimmed files free space."),
+        platforms: Optional[str] = typer.Option("", "--platforms", "--p",
+                                                help="Optional. Comma separated os/arch list, e.g. "
+                                                     "linux/amd64,linux/arm64. Platforms are built in parallel and "
+                                                     "assembled into a manifest list.")
 ):
     """
     Build apache pulsar binaries from source (core).
 
     :param spec_file: Path to build spec file.
     :param cache_prefix: Custom prefix for cache layers generated.
+    :param squash: Squash the final image.
+    :param platforms: Target platforms.
+
+    :return:
+    """
+    config = load_spec(spec_file, BuildSpec)
+
+    builder = CoreBuilder(config, cache_prefix, squash)
+    build_for_platforms("core", builder, parse_platforms(platforms))
+
+
+@app.command("plan", help="Show which cached steps of the core build would hit the layer cache.")
+def plan(
+        spec_file: Optional[Path] = typer.Option("configs/build.yaml", "--spec", "--s",
+                                                 help="Path to build specification file."),
+        cache_prefix: Optional[str] = typer.Option("", "--cache-prefix", "--c",
+                                                   help="Optional. Custom prefix for generated images acting as cache layers."),
+        as_json: bool = typer.Option(False, "--json", help="Print the plan as JSON.")
+):
+    """
+    Show the core build plan without running anything.
+
+    :param spec_file: Path to build spec file.
+    :param cache_prefix: Custom prefix for cache layers generated.
+    :param as_json: Print JSON instead of a table.
 
     :return:
     """
     config = load_spec(spec_file, BuildSpec)
 
     builder = CoreBuilder(config, cache_prefix)
-    builder.build()
+
+    print_plans([plan_build("core", builder)], as_json)
 
 
 @app.command("delete-cache", help="Delete cache images used to build apache pulsar binaries from source (core).")
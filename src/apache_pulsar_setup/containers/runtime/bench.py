@@ -0,0 +1,263 @@
+import asyncio
+import itertools
+import json
+import os
+import re
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from rich.console import Console
+from rich.table import Table
+
+from apache_pulsar_setup.core import BuildSpec, ProcessError, run_process, HEALTHCHECK_PATH
+
+_THROUGHPUT = re.compile(r"Aggregated throughput stats --- ([\d,]+) records (?:sent|received) --- ([\d.,]+) msg/s")
+_LATENCY = re.compile(r"Aggregated latency stats --- Latency: mean:\s*([\d.,]+) ms - med:\s*([\d.,]+) - "
+                      r"95pct:\s*([\d.,]+) - 99pct:\s*([\d.,]+) - 99\.9pct:\s*([\d.,]+)")
+
+
+def parse_perf_output(output: str) -> Dict[str, float]:
+    """
+    Final aggregated stats of a `pulsar-perf produce` or `pulsar-perf consume` run.
+    :param output:
+    :return: messages, msg_s and latency percentiles in ms (p50, p99, p999); empty if the run printed no summary.
+    """
+    stats = {}
+
+    throughput = _THROUGHPUT.findall(output)
+    if throughput:
+        messages, rate = throughput[-1]
+        stats["messages"] = int(messages.replace(",", ""))
+        stats["msg_s"] = float(rate.replace(",", ""))
+
+    latency = _LATENCY.findall(output)
+    if latency:
+        _, p50, _, p99, p999 = (float(v.replace(",", "")) for v in latency[-1])
+        stats.update({"p50": p50, "p99": p99, "p999": p999})
+
+    return stats
+
+
+def compare_results(results: dict, baseline: dict, threshold: float) -> List[str]:
+    """
+    Regressions of results against baseline: throughput lower or p99 latency higher by more than threshold.
+    :param results:
+    :param baseline:
+    :param threshold: Allowed relative change, e.g. 0.1
+    :return: One message per regression.
+    """
+    regressions = []
+    previous = {w["name"]: w for w in baseline.get("workloads", [])}
+
+    for workload in results["workloads"]:
+        base = previous.get(workload["name"])
+        if base is None:
+            continue
+
+        for side in ("produce", "consume"):
+            new, old = workload.get(side, {}), base.get(side, {})
+            if new.get("msg_s") is not None and old.get("msg_s"):
+                if new["msg_s"] < old["msg_s"] * (1 - threshold):
+                    regressions.append(f"{workload['name']}: {side} throughput {new['msg_s']:.0f} msg/s, "
+                                       f"baseline {old['msg_s']:.0f} msg/s")
+            if new.get("p99") is not None and old.get("p99"):
+                if new["p99"] > old["p99"] * (1 + threshold):
+                    regressions.append(f"{workload['name']}: {side} p99 latency {new['p99']:.2f} ms, "
+                                       f"baseline {old['p99']:.2f} ms")
+
+    return regressions
+
+
+class RuntimeBench:
+    """
+    pulsar-perf throughput and latency suite against a runtime image.
+
+    The image runs as a standalone in a local podman container limited to Bench.Memory and Bench.Cpus. For every
+    combination of Bench.Matrix a topic is created, and `pulsar-perf consume` and `pulsar-perf produce` run
+    concurrently inside the container for Bench.DurationSeconds. The clients share the container's limits with the
+    broker, so results are only comparable between runs with the same settings.
+    """
+
+    def __init__(self, config: BuildSpec, image: str, output: Optional[Console] = None):
+        self.config = config
+        self.bench = config.Bench
+        self.image = image
+        self.console = output if output is not None else Console()
+        self.container = f"{config.ProjectName}-bench"
+
+    def workloads(self) -> List[dict]:
+        matrix = self.bench.Matrix
+        workloads = []
+        for size, batching, partitions, producers in itertools.product(matrix.MessageSize, matrix.Batching,
+                                                                        matrix.Partitions, matrix.Producers):
+            workloads.append({
+                "name": f"size{size}-{'batch' if batching else 'nobatch'}-p{partitions}-n{producers}",
+                "message_size": size,
+                "batching": batching,
+                "partitions": partitions,
+                "producers": producers,
+            })
+        return workloads
+
+    async def _podman(self, *args: str, on_line=None) -> str:
+        return (await run_process(self.bench.Podman, *args, on_line=on_line)).stdout
+
+    async def _exec(self, *command: str, on_line=None) -> str:
+        return await self._podman("exec", self.container, *command, on_line=on_line)
+
+    async def _start(self):
+        await run_process(self.bench.Podman, "rm", "-f", self.container, check=False)
+
+        self.console.print(f"Starting [green]{self.image}[/green] as {self.container} "
+                           f"({self.bench.Cpus} CPUs, {self.bench.Memory} memory)")
+        await self._podman("run", "-d", "--name", self.container, "--memory", self.bench.Memory,
+                           "--cpus", str(self.bench.Cpus), self.image,
+                           "pulsar", "standalone", "--no-functions-worker", "--no-stream-storage")
+
+        deadline = time.monotonic() + self.bench.StartupTimeoutSeconds
+        while True:
+            try:
+                # The image's probe, a JVM per poll would compete with the starting broker for the CPU quota
+                await self._exec(HEALTHCHECK_PATH, "ready")
+                return
+            except ProcessError as e:
+                state = (await run_process(self.bench.Podman, "inspect", "--format", "{{.State.Running}}",
+                                           self.container, check=False)).stdout.strip()
+                if state != "true":
+                    logs = await run_process(self.bench.Podman, "logs", "--tail", "30", self.container, check=False)
+                    raise RuntimeError(f"Benchmark container exited during startup:\n{logs.stdout}{logs.stderr}")
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"Standalone not healthy after {self.bench.StartupTimeoutSeconds}s: "
+                                       f"{e.stderr.strip()[-500:]}")
+            await asyncio.sleep(2)
+
+    async def _run_workload(self, index: int, run_id: str, workload: dict) -> dict:
+        topic = f"persistent://public/default/bench-{run_id}-{index}"
+        if workload["partitions"] > 1:
+            await self._exec("pulsar-admin", "topics", "create-partitioned-topic", "-p",
+                             str(workload["partitions"]), topic)
+        else:
+            await self._exec("pulsar-admin", "topics", "create", topic)
+
+        duration = self.bench.DurationSeconds + self.bench.WarmupSeconds
+        produce = ["pulsar-perf", "produce", "--test-duration", str(duration),
+                   "--warmup-time", str(self.bench.WarmupSeconds), "--size", str(workload["message_size"]),
+                   "--num-producers", str(workload["producers"]), "--rate", str(self.bench.Rate)]
+        if not workload["batching"]:
+            produce.append("--disable-batching")
+        produce.append(topic)
+
+        # The consumer outlives the producer, so it receives the tail of the run
+        consume = ["pulsar-perf", "consume", "--test-duration", str(duration + 5), topic]
+
+        self.console.print(f"[dim]Running {workload['name']} for {duration}s[/dim]")
+        consumer = asyncio.ensure_future(self._exec(*consume))
+        try:
+            producer_output = await self._exec(*produce)
+            consumer_output = await consumer
+        finally:
+            if not consumer.done():
+                consumer.cancel()
+
+        return {**workload, "produce": parse_perf_output(producer_output),
+                "consume": parse_perf_output(consumer_output)}
+
+    async def _run(self) -> dict:
+        results = {
+            "image": self.image,
+            "at": time.time(),
+            "settings": {
+                "memory": self.bench.Memory,
+                "cpus": self.bench.Cpus,
+                "duration_seconds": self.bench.DurationSeconds,
+                "rate": self.bench.Rate,
+                "pulsar_gc": self.config.ApachePulsar.Runtime.PulsarGc,
+                "java": self.config.ApachePulsar.Runtime.Java.Jre.model_dump(),
+            },
+            "workloads": [],
+        }
+
+        await self._start()
+        try:
+            image_id = await self._podman("inspect", "--format", "{{.Image}}", self.container)
+            results["image_id"] = image_id.strip()
+
+            run_id = str(int(results["at"]))
+            for index, workload in enumerate(self.workloads()):
+                results["workloads"].append(await self._run_workload(index, run_id, workload))
+        finally:
+            await run_process(self.bench.Podman, "rm", "-f", self.container, check=False)
+
+        return results
+
+    def run(self) -> dict:
+        """
+        Run every workload of the matrix and store the results in Bench.ResultsDirectory (latest.json and one file
+        per run).
+        :return: Results
+        """
+        results = asyncio.run(self._run())
+
+        directory = Path(self.bench.ResultsDirectory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for path in (directory / f"bench-{int(results['at'])}.json", directory / "latest.json"):
+            _write_json(path, results)
+
+        self.console.print(f"[dim]Results written to {directory}[/dim]")
+        return results
+
+    def load_baseline(self) -> Optional[dict]:
+        try:
+            with open(self.bench.Baseline, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def save_baseline(self, results: dict):
+        _write_json(Path(self.bench.Baseline), results)
+        self.console.print(f"Baseline saved to [green]{self.bench.Baseline}[/green]")
+
+    def print_results(self, results: dict, baseline: Optional[dict] = None):
+        previous = {w["name"]: w for w in (baseline or {}).get("workloads", [])}
+
+        table = Table(title=f"pulsar-perf against {results['image']}")
+        table.add_column("Workload")
+        table.add_column("Produce msg/s", justify="right")
+        table.add_column("p50 ms", justify="right")
+        table.add_column("p99 ms", justify="right")
+        table.add_column("p99.9 ms", justify="right")
+        table.add_column("Consume msg/s", justify="right")
+        table.add_column("E2E p99 ms", justify="right")
+
+        for workload in results["workloads"]:
+            produce, consume = workload.get("produce", {}), workload.get("consume", {})
+            base = previous.get(workload["name"], {})
+            table.add_row(
+                workload["name"],
+                _with_change(produce.get("msg_s"), base.get("produce", {}).get("msg_s"), "{:.0f}"),
+                _with_change(produce.get("p50"), base.get("produce", {}).get("p50"), "{:.2f}"),
+                _with_change(produce.get("p99"), base.get("produce", {}).get("p99"), "{:.2f}"),
+                _with_change(produce.get("p999"), base.get("produce", {}).get("p999"), "{:.2f}"),
+                _with_change(consume.get("msg_s"), base.get("consume", {}).get("msg_s"), "{:.0f}"),
+                _with_change(consume.get("p99"), base.get("consume", {}).get("p99"), "{:.2f}"),
+            )
+
+        self.console.print(table)
+
+
+def _with_change(value: Optional[float], base: Optional[float], fmt: str) -> str:
+    if value is None:
+        return "-"
+    text = fmt.format(value)
+    if base:
+        text += f" ({(value - base) / base:+.0%})"
+    return text
+
+
+def _write_json(path: Path, data: dict):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
@@ -1,11 +1,17 @@
 from pathlib import Path
+from typing import Any, Dict
 
-from apache_pulsar_setup.core import BaseBuilder, BuildSpec, prune_cache_images, BuildahContainer
+from apache_pulsar_setup.core import BaseBuilder, BuildSpec, prune_cache_images, BuildahContainer, CachedStep, \
+    zypper_install_step, slim_step, pulsar_conf_step, appcds_step, HEALTHCHECK_PATH
+from .jlink import JlinkBuilder, java_runtime_step
 
 
 class RuntimeBuilder(BaseBuilder):
-    def __init__(self, config: BuildSpec, cache_prefix: str = "", image_name: str = "", image_tag: str = ""):
-        super().__init__(config, cache_prefix)
+    healthcheck = True
+
+    def __init__(self, config: BuildSpec, cache_prefix: str = "", image_name: str = "", image_tag: str = "",
+                 squash: bool = False):
+        super().__init__(config, cache_prefix, squash)
 
         if len(image_name) > 0:
             self.image_name = image_name
@@ -23,49 +29,114 @@ class RuntimeBuilder(BaseBuilder):
         else:
             self.cache_prefix = f"{self.config.ProjectName}/cache/runtime/{self.config.ApachePulsar.Version}"
 
+    def cached_steps(self) -> Dict[str, CachedStep]:
+        core_image = self.platform_image(f"{self.config.ProjectName}-core:{self.config.ApachePulsar.Version}")
+
+        steps = {
+            "core": CachedStep.copy_image(
+                "core",
+                core_image,
+                self.image_identity(core_image),
+                self.config.ApachePulsar.Prefix,
+                self.config.ApachePulsar.Prefix,
+                chown=f"{self.config.ApachePulsar.Runtime.Uid}:{self.config.ApachePulsar.Runtime.Gid}",
+                shared=True
+            ),
+            "deps": zypper_install_step(self.config.ApachePulsar.Runtime.Dependencies, shared=True),
+            "jre": java_runtime_step(self)
+        }
+
+        if self.config.ApachePulsar.Runtime.Slim.Drop:
+            slim = self.config.ApachePulsar.Runtime.Slim
+            steps["slim"] = slim_step(self.config.ApachePulsar.Prefix, slim.Drop, slim.Keep, shared=True)
+
+        java = self.config.ApachePulsar.Runtime.Java
+        if java.Cds.Enabled:
+            steps["appcds"] = appcds_step(
+                f"{self.config.ApachePulsar.Prefix}/lib/pulsar.jsa",
+                self.config.ApachePulsar.Prefix,
+                java.Cds.Command,
+                java.Cds.ReadyPattern,
+                java.Cds.TimeoutSeconds,
+                {"pulsar": self.config.ApachePulsar.Version,
+                 "java": f"{java.Jre.Major}.{java.Jre.Minor}+{java.Jre.Build}",
+                 "jlink": java.Jlink.Enabled}
+            )
+
+        conf = self.config.ApachePulsar.Runtime.Conf
+        conf_step = pulsar_conf_step(self.config.ApachePulsar.Prefix, conf.Preset, conf.roles(),
+                                     chown=f"{self.config.ApachePulsar.Runtime.Uid}:"
+                                           f"{self.config.ApachePulsar.Runtime.Gid}")
+        if conf_step is not None:
+            steps["conf"] = conf_step
+
+        return steps
+
+    def memo_inputs(self) -> Dict[str, Any]:
+        return {
+            "version": self.config.ApachePulsar.Version,
+            "prefix": self.config.ApachePulsar.Prefix,
+            "runtime": self.config.ApachePulsar.Runtime.model_dump(mode="json"),
+            "entrypoint": self.resource_digest("entrypoint.sh"),
+            "healthcheck": self.resource_digest("healthcheck.sh"),
+        }
+
     def build(self):
         self.log(f"Starting build for Apache Pulsar {self.config.ApachePulsar.Version} runtime",
                  style="bold blue")
 
+        if self.config.ApachePulsar.Runtime.Java.Jlink.Enabled:
+            jlink = JlinkBuilder(self.config)
+            if self.platform:
+                jlink = jlink.for_platform(self.platform)
+            jlink.console = self.console
+            jlink.build()
+
+        # After the jlink stage, whose image is an input of the jre step
+        digest = self.build_digest()
+        if self.reuse_build(digest):
+            return
+
+        steps = self.cached_steps()
+
         current_step = 1
 
         with BuildahContainer(
-                base_image=self.config.BaseImage,
+                base_image=self.base_image,
                 image_name=self.image_name,
                 config=self.config,
-                cache_prefix=self.cache_prefix
+                cache_prefix=self.cache_prefix,
+                output=self.console,
+                steps=list(steps.values()),
+                shared_cache_prefix=self.shared_cache_prefix,
+                platform=self.platform
         ) as container:
             self.log(f"[bold blue]Step {current_step}[/bold blue]: Retrieving apache pulsar artifacts")
 
-            self.image_tag = self.config.ApachePulsar.Version
+            image_name_tag = self.final_image
+            previous_size = self.image_size(image_name_tag)
 
-            container.copy_container_current(
-                f"{self.config.ProjectName}-core:{self.config.ApachePulsar.Version}",
-                self.config.ApachePulsar.Prefix,
-                self.config.ApachePulsar.Prefix
-            )
+            container.run_step(steps["core"])
 
             current_step += 1
             self.log(
                 f"[bold blue]Step {current_step}[/bold blue]: Installing apache pulsar runtime dependencies")
 
-            container.run_cached(
-                command=[
-                    "sh", "-c",
-                    f"""
-                        zypper --non-interactive refresh &&
-                        zypper --non-interactive install """ + " ".join(self.config.ApachePulsar.Runtime.Dependencies)],
-                extra_cache_keys={"step": "deps", "packages": sorted(self.config.ApachePulsar.Runtime.Dependencies)}
-            )
+            container.run_step(steps["deps"])
 
-            container.run(command=["zypper", "clean", "--all"])
+            container.run_step(steps["jre"])
+            container.configure([("--env", "JAVA_HOME=/opt/java")])
 
-            container.install_jdk_jre(
-                self.config.ApachePulsar.Runtime.Java.Jre.Major,
-                self.config.ApachePulsar.Runtime.Java.Jre.Minor,
-                self.config.ApachePulsar.Runtime.Java.Jre.Build,
-                component="jre"
-            )
+            if "slim" in steps:
+                container.run_step(steps["slim"])
+
+            if "appcds" in steps:
+                current_step += 1
+                self.log(f"[bold blue]Step {current_step}[/bold blue]: Creating the AppCDS archive")
+                container.run_step(steps["appcds"])
+
+            if "conf" in steps:
+                container.run_step(steps["conf"])
 
             current_step += 1
             self.log(
@@ -101,24 +172,26 @@ class RuntimeBuilder(BaseBuilder):
                 ("--env", "LANG=C.UTF-8"),
                 ("--env", "LC_ALL=C.UTF-8")
             ])
-
-            for d in ["data", "logs"]:
-                full_d_dir = f"{self.config.ApachePulsar.Prefix}/{d}"
-                container.run(["mkdir", "-p", full_d_dir])
+            if self.config.ApachePulsar.Runtime.PulsarGc:
+                # Default GC flags; the entrypoint adds GC thread counts for the CPU quota unless PULSAR_GC is set
                 container.configure([
-                    ("--volume", full_d_dir)
+                    ("--env", f"PULSAR_GC_DEFAULT={' '.join(self.config.ApachePulsar.Runtime.PulsarGc)}")
                 ])
 
-            container.run(
-                command=["chown", "-R",
-                         f"{self.config.ApachePulsar.Runtime.Uid}:{self.config.ApachePulsar.Runtime.Gid}",
-                         self.config.ApachePulsar.Prefix]
-            )
+            volume_dirs = [f"{self.config.ApachePulsar.Prefix}/{d}" for d in ["data", "logs"]]
+            container.run(["mkdir", "-p", *volume_dirs])
+            container.configure([("--volume", d) for d in volume_dirs])
 
             container.copy_host_container(Path(f"{self.config.ApachePulsar.Runtime.Resources}/entrypoint.sh"),
-                                          "/usr/local/bin/entrypoint.sh")
-            container.run(command=["chmod", "+x", "/usr/local/bin/entrypoint.sh"])
+                                          "/usr/local/bin/entrypoint.sh", chmod="755")
+            container.copy_host_container(Path(f"{self.config.ApachePulsar.Runtime.Resources}/healthcheck.sh"),
+                                          HEALTHCHECK_PATH, chmod="755")
+
+            # The prefix is copied with --chown; a recursive chown would duplicate every file in a new layer.
+            container.run(["chown", f"{self.config.ApachePulsar.Runtime.Uid}:{self.config.ApachePulsar.Runtime.Gid}",
+                           self.config.ApachePulsar.Prefix, *volume_dirs])
 
+            container.configure(self.healthcheck_configs())
             container.configure([
                 ("--entrypoint", '["/usr/local/bin/entrypoint.sh"]'),
                 ("--cmd", '["pulsar", "standalone"]'),
@@ -138,10 +211,11 @@ class RuntimeBuilder(BaseBuilder):
                     container.configure([
                         ("--port", f"{port}")
                     ])
-            image_name_tag = self.image_name + ":" + self.image_tag
-            container.commit(image_name_tag)
+            self.commit_final(container, digest)
 
             self.log(f"Image tagged as: [green]{image_name_tag}[/green]")
+            self.report_size(image_name_tag, previous_size)
+            self.log(f"Spawned {container.subprocess_count} buildah subprocesses", style="dim")
 
     def prune_cache_images(self):
         prune_cache_images(self.config.Buildah.Path, self.cache_prefix)
@@ -0,0 +1,170 @@
+import threading
+from typing import Dict, List
+
+from apache_pulsar_setup.core import BaseBuilder, BuildSpec, prune_cache_images, BuildahContainer, CachedStep, \
+    JlinkModules, jdk_jre_step
+from apache_pulsar_setup.core.steps import cache_chain
+
+JLINK_OUTPUT = "/opt/jlink"
+_PULSAR_LIB = "/opt/pulsar/lib"
+
+
+class JlinkBuilder(BaseBuilder):
+    """
+    Throwaway stage building a minimal Java runtime for Pulsar.
+
+    The Temurin JDK and the Pulsar jars of the core image are put in a container, jdeps lists the modules the jars
+    need and jlink links them (plus Java.Jlink.ExtraModules) into JLINK_OUTPUT. Runtime images copy that directory to
+    /opt/java instead of installing the full JRE.
+    """
+
+    _build_locks: Dict[str, threading.Lock] = {}
+    _build_locks_lock = threading.Lock()
+
+    def __init__(self, config: BuildSpec, cache_prefix: str = ""):
+        super().__init__(config, cache_prefix)
+        java = self.config.ApachePulsar.Runtime.Java.Jre
+        self.jdk = f"{java.Major}.{java.Minor.lstrip('.')}+{java.Build}"
+        self.image_name = f"{self.config.ProjectName}-jlink"
+        self.image_tag = f"{self.config.ApachePulsar.Version}-jdk{self.jdk.replace('+', '_')}"
+
+    def _init_cache_prefix(self, cache_prefix: str):
+        if len(cache_prefix) > 0:
+            self.cache_prefix = cache_prefix
+        else:
+            self.cache_prefix = f"{self.config.ProjectName}/cache/jlink/{self.config.ApachePulsar.Version}"
+
+    def cached_steps(self) -> Dict[str, CachedStep]:
+        java = self.config.ApachePulsar.Runtime.Java
+        core_image = self.platform_image(f"{self.config.ProjectName}-core:{self.config.ApachePulsar.Version}")
+
+        return {
+            "jdk": jdk_jre_step(java.Jre.Major, java.Jre.Minor, java.Jre.Build, component="jdk",
+                                machine=self.machine),
+            "lib": CachedStep.copy_image(
+                "lib",
+                core_image,
+                self.image_identity(core_image),
+                f"{self.config.ApachePulsar.Prefix}/lib",
+                _PULSAR_LIB
+            ),
+            "jlink": CachedStep(
+                "jlink",
+                [["jlink", JLINK_OUTPUT], None, {"step": "jlink", "extra_modules": sorted(java.Jlink.ExtraModules),
+                                                 "options": self.options()}],
+                self._link
+            )
+        }
+
+    def options(self) -> List[str]:
+        """
+        jlink options: Java.Jlink.Options, plus the default CDS archive AppCDS archives are layered on when Java.Cds is
+        enabled.
+        :return:
+        """
+        java = self.config.ApachePulsar.Runtime.Java
+        options = list(java.Jlink.Options)
+        if java.Cds.Enabled and "--generate-cds-archive" not in options:
+            options.append("--generate-cds-archive")
+        return options
+
+    def modules(self, container: BuildahContainer) -> List[str]:
+        """
+        Modules required by the Pulsar jars, from the state directory or computed with jdeps.
+        :param container: Stage container holding the JDK and the Pulsar jars.
+        :return:
+        """
+        cache = JlinkModules.for_spec(self.config)
+        modules = cache.get(self.jdk, self.config.ApachePulsar.Version)
+        if modules is not None:
+            self.log(f"Using cached module list for JDK {self.jdk} and Pulsar {self.config.ApachePulsar.Version}",
+                     style="dim")
+            return modules
+
+        self.log("Resolving required Java modules with jdeps", style="dim")
+        output = container.run_get_output([
+            "sh", "-c",
+            f"/opt/java/bin/jdeps --ignore-missing-deps --multi-release "
+            f"{self.config.ApachePulsar.Runtime.Java.Jre.Major} -q --print-module-deps "
+            f"--class-path '{_PULSAR_LIB}/*' {_PULSAR_LIB}/*.jar"
+        ])
+        modules = [m for m in output.splitlines()[-1].split(",") if m] if output else []
+        if not modules:
+            raise RuntimeError("jdeps did not report any module for the Pulsar jars")
+
+        cache.put(self.jdk, self.config.ApachePulsar.Version, modules)
+        return modules
+
+    def _link(self, container: BuildahContainer):
+        java = self.config.ApachePulsar.Runtime.Java
+        modules = sorted(set(self.modules(container)) | set(java.Jlink.ExtraModules))
+
+        self.log(f"Linking {len(modules)} modules into {JLINK_OUTPUT}", style="dim")
+        container.run(["/opt/java/bin/jlink", "--add-modules", ",".join(modules), *self.options(),
+                       "--output", JLINK_OUTPUT])
+
+    def up_to_date(self) -> bool:
+        """
+        True if the stage image was committed on the layer the current cached steps produce.
+        :return:
+        """
+        chain = cache_chain(self.base_image, self.cache_prefix, list(self.cached_steps().values()))
+        return self.image_identity(self.final_image) == chain[-1]
+
+    def build(self):
+        # Runtime builders call build() before copying the runtime; only the first one does the work.
+        with self._build_locks_lock:
+            lock = self._build_locks.setdefault(self.final_image, threading.Lock())
+
+        with lock:
+            if self.up_to_date():
+                self.log(f"Java runtime {self.final_image} is up to date", style="dim")
+                return
+
+            self.log(f"Starting jlink build of a Java {self.jdk} runtime for Apache Pulsar "
+                     f"{self.config.ApachePulsar.Version}", style="bold blue")
+
+            steps = self.cached_steps()
+
+            with BuildahContainer(
+                    base_image=self.base_image,
+                    image_name=self.image_name,
+                    config=self.config,
+                    cache_prefix=self.cache_prefix,
+                    output=self.console,
+                    steps=list(steps.values()),
+                    platform=self.platform
+            ) as container:
+                container.run_step(steps["jdk"])
+                container.run_step(steps["lib"])
+                container.run_step(steps["jlink"])
+
+                container.run([f"{JLINK_OUTPUT}/bin/java", "--list-modules"])
+
+                container.commit(self.final_image)
+
+                self.log(f"Image tagged as: [green]{self.final_image}[/green]")
+                self.log(f"Spawned {container.subprocess_count} buildah subprocesses", style="dim")
+
+    def prune_cache_images(self):
+        prune_cache_images(self.config.Buildah.Path, self.cache_prefix)
+
+
+def java_runtime_step(builder: BaseBuilder) -> CachedStep:
+    """
+    Cached step putting the Java runtime into /opt/java: the jlink stage output when Java.Jlink is enabled, else the
+    Temurin JRE. Shared, so runtime and connector images reuse the layer.
+    :param builder:
+    :return:
+    """
+    java = builder.config.ApachePulsar.Runtime.Java
+
+    if not java.Jlink.Enabled:
+        return jdk_jre_step(java.Jre.Major, java.Jre.Minor, java.Jre.Build, component="jre", shared=True,
+                            machine=builder.machine)
+
+    stage = JlinkBuilder(builder.config)
+    if builder.platform:
+        stage = stage.for_platform(builder.platform)
+    return CachedStep.copy_image("jre", stage.final_image, builder.image_identity(stage.final_image), JLINK_OUTPUT,
+                                 "/opt/java", shared=True)
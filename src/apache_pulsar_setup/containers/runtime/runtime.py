@@ -2,9 +2,15 @@ from pathlib import Path
 from typing import Optional
 
 import typer
+from rich.console import Console
 
+from .bench import RuntimeBench, compare_results
 from .builder import RuntimeBuilder
-from apache_pulsar_setup.core import BuildSpec, load_spec
+from apache_pulsar_setup.core import BuildSpec, load_spec, plan_build, print_plans, build_for_platforms, \
+    parse_platforms, render_pulsar_conf, ProcessError
+from apache_pulsar_setup.core.pulsar_conf import CONF_FILES
+
+console = Console()
 
 app = typer.Typer(help="An apache pulsar runtime.")
 
@@ -17,11 +23,19 @@ def build(
         image_tag: Optional[str] = typer.Option("", "--image-tag", "--t",
                                                 help="Optional. Tag of new apache pulsar runtime image"),
         cache_prefix: Optional[str] = typer.Option("", "--cache-prefix", "--c",
-                                                   help="Optional. Custom prefix for generated images acting as cache layers.")
+                                                   help="Optional. Custom prefix for generated images acting as cache layers."),
+        squash: bool = typer.Option(False, "--squash",
+                                    help="Commit the final image as a single layer, so slimmed files free space."),
+        platforms: Optional[str] = typer.Option("", "--platforms", "--p",
+                                                help="Optional. Comma separated os/arch list, e.g. "
+                                                     "linux/amd64,linux/arm64. Platforms are built in parallel and "
+                                                     "assembled into a manifest list.")
 ):
     """
     Build Apache Pulsar runtime image.
 
+    :param platforms:
+    :param squash:
     :param cache_prefix:
     :param spec_file:
     :param image_name:
@@ -30,9 +44,91 @@ def build(
     """
     config = load_spec(spec_file, BuildSpec)
 
-    builder = RuntimeBuilder(config, cache_prefix, image_name, image_tag)
+    builder = RuntimeBuilder(config, cache_prefix, image_name, image_tag, squash)
 
-    builder.build()
+    build_for_platforms("runtime", builder, parse_platforms(platforms))
+
+
+@app.command("plan", help="Show which cached steps of the apache pulsar runtime build would hit the layer cache.")
+def plan(
+        spec_file: Optional[Path] = typer.Option("configs/build.yaml", "--spec", "--s",
+                                                 help="Path to build specification file."),
+        cache_prefix: Optional[str] = typer.Option("", "--cache-prefix", "--c",
+                                                   help="Optional. Custom prefix for generated images acting as cache layers."),
+        as_json: bool = typer.Option(False, "--json", help="Print the plan as JSON.")
+):
+    """
+    Show the apache pulsar runtime build plan without running anything.
+
+    :param spec_file: Path to build spec file.
+    :param cache_prefix: Custom prefix for cache layers generated.
+    :param as_json: Print JSON instead of a table.
+
+    :return:
+    """
+    config = load_spec(spec_file, BuildSpec)
+
+    builder = RuntimeBuilder(config, cache_prefix)
+
+    print_plans([plan_build("runtime", builder)], as_json)
+
+
+@app.command("bench", help="Run pulsar-perf workloads against a built apache pulsar runtime image and compare them "
+                            "with the baseline.")
+def bench(
+        spec_file: Optional[Path] = typer.Option("configs/build.yaml", "--spec", "--s",
+                                                 help="Path to build specification file."),
+        image_name: Optional[str] = typer.Option("apache-pulsar", "--image-name", "--n",
+                                                 help="Name of the apache pulsar runtime image."),
+        image_tag: Optional[str] = typer.Option("", "--image-tag", "--t",
+                                                help="Optional. Tag of the apache pulsar runtime image"),
+        save_baseline: bool = typer.Option(False, "--save-baseline",
+                                           help="Store the results as the new baseline."),
+        threshold: Optional[float] = typer.Option(None, "--threshold",
+                                                  help="Optional. Allowed relative regression, overrides "
+                                                       "Bench.Threshold.")
+):
+    """
+    Benchmark the Apache Pulsar runtime image in a local standalone container.
+
+    :param spec_file: Path to build spec file.
+    :param image_name:
+    :param image_tag:
+    :param save_baseline: Store the results as baseline instead of failing on regressions.
+    :param threshold: Allowed relative regression of throughput and p99 latency.
+
+    :return:
+    """
+    config = load_spec(spec_file, BuildSpec)
+
+    image = RuntimeBuilder(config, "", image_name, image_tag).final_image
+    suite = RuntimeBench(config, image, console)
+
+    try:
+        results = suite.run()
+    except (RuntimeError, ProcessError) as e:
+        console.print(f"[bold red]Benchmark failed:[/bold red] {e}")
+        raise typer.Exit(code=1)
+
+    baseline = suite.load_baseline()
+    suite.print_results(results, baseline)
+
+    if save_baseline:
+        suite.save_baseline(results)
+        return
+
+    if baseline is None:
+        console.print(f"[dim]No baseline at {config.Bench.Baseline}, run with --save-baseline to store one.[/dim]")
+        return
+
+    regressions = compare_results(results, baseline, threshold if threshold is not None else config.Bench.Threshold)
+    if regressions:
+        console.print("[bold red]Regressions against the baseline:[/bold red]")
+        for regression in regressions:
+            console.print(f"  {regression}")
+        raise typer.Exit(code=1)
+
+    console.print("[green]No regression against the baseline.[/green]")
 
 
 @app.command("delete-cache", help="Delete cache images used to build apache pulsar runtime image.")
@@ -55,3 +151,38 @@ def delete_cache(
     builder = RuntimeBuilder(config, cache_prefix)
 
     builder.prune_cache_images()
+
+
+@app.command("conf", help="Show the settings the apache pulsar runtime build writes into the configuration files.")
+def conf(
+        spec_file: Optional[Path] = typer.Option("configs/build.yaml", "--spec", "--s",
+                                                 help="Path to build specification file."),
+        preset: Optional[str] = typer.Option("", "--preset",
+                                             help="Optional. Preset to render instead of the one of the spec.")
+):
+    """
+    Print the rendered configuration settings per file.
+
+    :param spec_file: Path to build spec file.
+    :param preset: Preset overriding ApachePulsar.Runtime.Conf.Preset.
+
+    :return:
+    """
+    config = load_spec(spec_file, BuildSpec)
+    settings = config.ApachePulsar.Runtime.Conf
+
+    try:
+        rendered = render_pulsar_conf(preset or settings.Preset, settings.roles())
+    except ValueError as e:
+        console.print(f"[bold red]Invalid Configuration:[/bold red] {e}")
+        raise typer.Exit(code=1)
+
+    if not rendered:
+        console.print("[dim]No settings to render.[/dim]")
+        return
+
+    for role, values in rendered.items():
+        console.print(f"[bold]# {config.ApachePulsar.Prefix}/conf/{CONF_FILES[role]}[/bold]")
+        for key, value in values.items():
+            console.print(f"{key}={value}", markup=False, highlight=False)
+        console.print()
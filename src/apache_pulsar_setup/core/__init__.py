@@ -1,3 +1,14 @@
-from .buildah import BuildahContainer, prune_cache_images
-from .builder_base import BaseBuilder, BaseRuntime
+from .buildah import BuildahContainer, prune_cache_images, jdk_jre_step, zypper_install_step, slim_step, appcds_step
+from .builder_base import BaseBuilder, BaseRuntime, HEALTHCHECK_PATH
+from .cache_gc import collect_cache_garbage
+from .image_index import ImageIndex
+from .jdbc_sink import JDBC_SINK_PRESETS, jdbc_sink_config_step, render_jdbc_sink, format_jdbc_sink
+from .orchestrator import BuildGraph, build_for_platforms
+from .plan import plan_build, print_plans
+from .platforms import parse_platforms
+from .process import ProcessError, run_process
+from .pulsar_conf import PRESETS, pulsar_conf_step, render_pulsar_conf
 from .spec import BuildSpec, load_spec
+from .state import JlinkModules
+from .steps import CachedStep
+from .tracing import BuildTracer, tracer
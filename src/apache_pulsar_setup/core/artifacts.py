@@ -0,0 +1,181 @@
+import hashlib
+import json
+import os
+import shutil
+import tarfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from rich.console import Console
+
+from .downloader import Downloader
+from .spec import BuildSpec
+
+console = Console()
+
+
+class ArtifactCache:
+    """
+    Host-side, content-addressed store for downloaded artifacts.
+
+    Entries are keyed by URL and expected SHA-512 and evicted least-recently-used first once the store grows
+    beyond max_size_mb. Downloaded archives can be extracted once on the host and fed into containers with
+    `buildah copy`, so containers need neither curl nor tar.
+    """
+
+    _instances: Dict[Path, "ArtifactCache"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, directory: Path, max_size_mb: int, downloader: Optional[Downloader] = None):
+        self.directory = directory
+        self.max_size = max_size_mb * 1024 * 1024
+        self.downloader = downloader if downloader is not None else Downloader()
+        self._index_path = directory / "index.json"
+        self._lock = threading.RLock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+
+    @classmethod
+    def for_spec(cls, config: BuildSpec) -> "ArtifactCache":
+        """
+        Return the cache shared by every builder using the same directory.
+
+        :param config: Build spec.
+        :return:
+        """
+        directory = Path(config.Artifacts.Directory).resolve()
+        with cls._instances_lock:
+            if directory not in cls._instances:
+                cls._instances[directory] = cls(directory, config.Artifacts.MaxSizeMb, Downloader.for_spec(config))
+            return cls._instances[directory]
+
+    @staticmethod
+    def key(url: str, sha512: str = "") -> str:
+        return hashlib.sha256(f"{url}\n{sha512.lower()}".encode("utf-8")).hexdigest()[:32]
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def _load_index(self) -> Dict[str, dict]:
+        try:
+            with open(self._index_path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_index(self, index: Dict[str, dict]):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = self._index_path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(index, f, indent=2, sort_keys=True)
+        os.replace(tmp, self._index_path)
+
+    def _touch(self, key: str, **fields):
+        with self._lock:
+            index = self._load_index()
+            entry = index.setdefault(key, {})
+            entry.update(fields)
+            entry["last_used"] = time.time()
+            entry["size"] = disk_usage(self.directory / key)
+            self._save_index(index)
+            self._evict(index, keep=key)
+
+    def _evict(self, index: Dict[str, dict], keep: str):
+        total = sum(entry.get("size", 0) for entry in index.values())
+        if total <= self.max_size:
+            return
+
+        for key, entry in sorted(index.items(), key=lambda item: item[1].get("last_used", 0)):
+            if total <= self.max_size:
+                break
+            if key == keep or self._key_lock(key).locked():
+                continue
+
+            console.print(f"[dim]Evicting cached artifact {entry.get('url', key)}[/dim]")
+            shutil.rmtree(self.directory / key, ignore_errors=True)
+            total -= entry.get("size", 0)
+            del index[key]
+
+        self._save_index(index)
+
+    def fetch(self, url: str, sha512: str = "", output: Optional[Console] = None) -> Path:
+        """
+        Return the local path of url, downloading it if it is not in the store yet.
+
+        :param url: Artifact URL.
+        :param sha512: Optional. Expected SHA-512 hex digest; the download fails if it does not match.
+        :param output: Console to log to.
+        :return: Path to the downloaded file.
+        """
+        output = output if output is not None else console
+        key = self.key(url, sha512)
+        target = self.directory / key / url.rstrip("/").rsplit("/", 1)[-1]
+
+        with self._key_lock(key):
+            if target.exists():
+                output.print(f"[bold green] Using cached artifact {target.name}[/bold green]")
+            else:
+                output.print(f"[dim]Downloading {url}[/dim]")
+                target.parent.mkdir(parents=True, exist_ok=True)
+                self.downloader.download(url, target, sha512, output)
+
+            self._touch(key, url=url, sha512=sha512)
+
+        return target
+
+    def extract(self, url: str, sha512: str = "", strip_components: int = 0, output: Optional[Console] = None) -> Path:
+        """
+        Return a directory holding the extracted contents of the tarball at url.
+
+        Extraction happens once per artifact; later calls reuse the extracted tree.
+
+        :param url: Tarball URL.
+        :param sha512: Optional. Expected SHA-512 hex digest.
+        :param strip_components: Number of leading path components to strip, like tar --strip-components.
+        :param output: Console to log to.
+        :return: Path to the extracted directory.
+        """
+        output = output if output is not None else console
+        archive = self.fetch(url, sha512, output)
+        key = self.key(url, sha512)
+        target = self.directory / key / f"extracted-{strip_components}"
+
+        with self._key_lock(key):
+            if not target.exists():
+                output.print(f"[dim]Extracting {archive.name}[/dim]")
+                staging = target.with_name(target.name + ".part")
+                shutil.rmtree(staging, ignore_errors=True)
+                staging.mkdir(parents=True)
+                with tarfile.open(archive, "r:*") as tar:
+                    tar.extractall(staging, members=_strip_components(tar, strip_components), filter="tar")
+                os.replace(staging, target)
+
+            self._touch(key)
+
+        return target
+
+
+def _strip_components(tar: tarfile.TarFile, count: int):
+    for member in tar.getmembers():
+        parts = [p for p in member.name.split("/") if p not in ("", ".")][count:]
+        if not parts:
+            continue
+        member.name = "/".join(parts)
+        if member.islnk():
+            member.linkname = "/".join([p for p in member.linkname.split("/") if p not in ("", ".")][count:])
+        yield member
+
+
+def disk_usage(path: Path) -> int:
+    """
+    Size in bytes of a file or of all files below a directory.
+    :param path:
+    :return:
+    """
+    if not path.exists():
+        return 0
+    if path.is_file():
+        return path.stat().st_size
+    return sum(p.lstat().st_size for p in path.rglob("*") if not p.is_dir() or p.is_symlink())
@@ -1,95 +1,519 @@
-import hashlib
+import asyncio
 import json
-import sys
+import platform
+import shlex
+import shutil
+import threading
+import time
+from contextlib import nullcontext
 from pathlib import Path
-from typing import Any, List, Optional, Dict, Tuple
+from typing import Any, Awaitable, Callable, ContextManager, List, Optional, Dict, Set, Tuple
 
 import sh
 from rich.console import Console
 
+from .artifacts import ArtifactCache, disk_usage
+from .image_index import ImageIndex, format_size, in_repositories, normalize_image_name
+from .platforms import platform_machine, platform_slug
+from .process import ProcessError, run_process
 from .spec import BuildSpec
+from .state import CacheUsage, StepTimings
+from .steps import CachedStep, cache_chain, calculate_layer_hash, step_cache_prefix
+from .tracing import tracer
 
 console = Console()
 
 
-def prune_cache_images(buildah_path: str, cache_prefix: str):
-    if len(cache_prefix) == 0:
+def prune_cache_images(buildah_path: str, *cache_prefixes: str, batch_size: int = 50) -> int:
+    """
+    Delete all cache images under the given prefixes.
+
+    Uses one image listing, matches repositories exactly (plus their per-platform repositories), deletes newest (child) images first and removes them in
+    batched `buildah rmi` calls.
+    :param buildah_path:
+    :param cache_prefixes: Cache prefixes (repositories) to delete, e.g. project/cache/core/4.0.0
+    :param batch_size: Number of images per `buildah rmi` call.
+    :return: Reclaimed disk space in bytes (0 if unknown).
+    """
+    if not cache_prefixes or any(len(cache_prefix) == 0 for cache_prefix in cache_prefixes):
         raise RuntimeError("cache_prefix is empty")
-    try:
-        buildah_cmd = sh.Command(buildah_path)
-    except sh.CommandNotFound:
-        raise RuntimeError(f"Buildah executable not found at {buildah_path}")
+
+    images = ImageIndex.shared(buildah_path)
 
     try:
-        output = buildah_cmd("images", "--json")
+        images_list = images.images()
     except sh.ErrorReturnCode:
         console.print("[red]Failed to list images.[/red]")
-        return
-
-    try:
-        images_list = json.loads(output)
+        return 0
     except json.JSONDecodeError:
         console.print("[red]Failed to parse Buildah output.[/red]")
-        return
+        return 0
 
-    targets = []
+    # Buildah stores names as e.g. "localhost/my-image:tag", compare repositories in that form
+    repositories = {normalize_image_name(cache_prefix).rsplit(":", 1)[0] for cache_prefix in cache_prefixes}
 
-    if images_list:
-        for img_data in images_list:
-            # The 'names' field is a list of strings like "localhost/my-image:tag"
-            # Some images (dangling) might not have names, so we check existence
-            names = img_data.get("names", [])
-            if not names:
-                continue
+    targets = []
+    estimated = 0
 
-            for name in names:
-                # Buildah sometimes adds 'localhost/' prefix automatically
-                # We check if the name contains our cache prefix
-                if cache_prefix in name:
-                    targets.append(name)
+    # Children are always created after their parents; newest first removes dependents before what they build on.
+    for img_data in sorted(images_list, key=lambda record: record.created, reverse=True):
+        names = [name for name in img_data.names if in_repositories(name, repositories)]
+        if names:
+            targets.extend(names)
+            if len(names) == len(img_data.names):
+                estimated += img_data.size
 
     if not targets:
-        console.print(f"[yellow]No cache layers found for prefix '{cache_prefix}'[/yellow]")
-        return
+        console.print(f"[yellow]No cache layers found for prefix '{', '.join(cache_prefixes)}'[/yellow]")
+        return 0
 
     console.print(f"[bold red]Found {len(targets)} cache layers to remove...[/bold red]")
 
-    for img in targets:
+    return remove_images(buildah_path, targets, batch_size, estimated)
+
+
+def remove_images(buildah_path: str, names: List[str], batch_size: int = 50, estimated: int = 0) -> int:
+    """
+    Remove images with batched `buildah rmi` calls, in the given order, and report the reclaimed space.
+    :param buildah_path:
+    :param names: Image names, dependents before the images they were built on.
+    :param batch_size: Number of images per `buildah rmi` call.
+    :param estimated: Reported when the reclaimed space cannot be measured.
+    :return: Reclaimed disk space in bytes.
+    """
+    try:
+        buildah_cmd = sh.Command(buildah_path)
+    except sh.CommandNotFound:
+        raise RuntimeError(f"Buildah executable not found at {buildah_path}")
+
+    images = ImageIndex.shared(buildah_path)
+
+    free_before = _storage_free(buildah_cmd)
+
+    for i in range(0, len(names), batch_size):
+        batch = names[i:i + batch_size]
+        console.print(f" -> Deleting {len(batch)} images ({i + len(batch)}/{len(names)})")
         try:
-            console.print(f" -> Deleting {img}")
-            buildah_cmd("rmi", img)
-        except sh.ErrorReturnCode as e:
-            console.print(f"[dim]Failed to remove {img} (might be in use or dependent): {e}[/dim]")
+            buildah_cmd("rmi", *batch)
+        except sh.ErrorReturnCode:
+            # Remove one by one so a single image in use does not keep the rest of the batch
+            for img in batch:
+                try:
+                    buildah_cmd("rmi", img)
+                except sh.ErrorReturnCode as e:
+                    if "image not known" not in str(e):
+                        console.print(f"[dim]Failed to remove {img} (might be in use or dependent): {e}[/dim]")
+                        continue
+                images.remove(img)
+            continue
+
+        for img in batch:
+            images.remove(img)
+
+    free_after = _storage_free(buildah_cmd)
+    if free_before is not None and free_after is not None:
+        reclaimed = max(free_after - free_before, 0)
+        console.print(f"[bold green]Reclaimed {format_size(reclaimed)}[/bold green]")
+    else:
+        reclaimed = estimated
+        console.print(f"[bold green]Reclaimed up to {format_size(reclaimed)}[/bold green]")
+
+    return reclaimed
+
+
+def create_manifest(buildah_path: str, name: str, images: List[str], output: Optional[Console] = None):
+    """
+    (Re)create the manifest list name from per-platform images. Os and architecture are read from the images.
+    :param buildah_path:
+    :param name: Manifest list name, e.g. apache-pulsar:4.0.0
+    :param images: Local per-platform images.
+    :param output:
+    :return:
+    """
+    output = output if output is not None else console
+    try:
+        buildah_cmd = sh.Command(buildah_path)
+    except sh.CommandNotFound:
+        raise RuntimeError(f"Buildah executable not found at {buildah_path}")
 
-    for tag in targets:
+    # A previous list of the same name (or a single-platform image with that tag) would shadow the new one
+    try:
+        buildah_cmd("manifest", "rm", name)
+    except sh.ErrorReturnCode:
         try:
-            console.print(f" -> Deleting {tag}")
-            buildah_cmd("rmi", tag)
-        except sh.ErrorReturnCode as e:
-            # Often images are deleted in a cascade; ignore 'image not known' errors
-            if "image not known" not in str(e):
-                console.print(f"[dim]Warning: {e}[/dim]")
+            buildah_cmd("rmi", name)
+        except sh.ErrorReturnCode:
+            pass
+    ImageIndex.shared(buildah_path).remove(name)
+
+    buildah_cmd("manifest", "create", name)
+    for image in images:
+        buildah_cmd("manifest", "add", name, f"containers-storage:{image}")
+
+    output.print(f"Manifest list [green]{name}[/green] created for {', '.join(images)}")
+
+
+def tag_image(buildah_path: str, image: str, name: str):
+    """
+    Add name to a local image.
+    :param buildah_path:
+    :param image: Image name or ID.
+    :param name: New name, e.g. apache-pulsar:4.0.0
+    :return:
+    """
+    try:
+        buildah_cmd = sh.Command(buildah_path)
+    except sh.CommandNotFound:
+        raise RuntimeError(f"Buildah executable not found at {buildah_path}")
+
+    images = ImageIndex.shared(buildah_path)
+    record = images.get(image)
+    buildah_cmd("tag", image, name)
+    if record is not None:
+        images.add(name, record.id)
+
+
+def _storage_free(buildah_cmd: sh.Command) -> Optional[int]:
+    """
+    Free bytes on the filesystem holding buildah's image storage, None if it cannot be determined.
+    :param buildah_cmd:
+    :return:
+    """
+    try:
+        info = json.loads(str(buildah_cmd("info")))
+        return shutil.disk_usage(info["store"]["GraphRoot"]).free
+    except (sh.ErrorReturnCode, json.JSONDecodeError, KeyError, TypeError, OSError):
+        return None
+
+
+# Label holding the cache layer an image was committed on top of.
+SOURCE_LAYER_LABEL = "io.apache-pulsar-setup.source-layer"
+
+# Bytes removed by the slim step, inherited by every image built on top of its layer.
+SLIMMED_BYTES_LABEL = "io.apache-pulsar-setup.slimmed-bytes"
+
+# Startup time in milliseconds until ready, without and with the AppCDS archive of the appcds step ("before,after").
+CDS_STARTUP_LABEL = "io.apache-pulsar-setup.cds-startup-ms"
+
+# Digest of everything a final image was built from (see BaseBuilder.build_digest).
+BUILD_DIGEST_LABEL = "io.apache-pulsar-setup.build-digest"
+
+# Repository below a cache prefix holding one tag per build digest, pointing to the final image built from it.
+MEMO_REPOSITORY = "builds"
+
+
+def is_memo_image(name: str) -> bool:
+    """
+    True if name is a build digest tag (see BaseBuilder.memo_image), not a cache layer.
+    :param name: Normalized image name.
+    :return:
+    """
+    return name.rsplit(":", 1)[0].rsplit("/", 1)[-1] == MEMO_REPOSITORY
+
+# `buildah config` flags holding KEY=value pairs, merged per key.
+_KEYED_CONFIG_FLAGS = {"--env", "-e", "--label", "-l", "--annotation", "-a"}
+
+# `buildah config` flags that may be given several times, each value added once.
+_ADDITIVE_CONFIG_FLAGS = {"--port", "-p", "--volume", "-v"}
+
+
+def _java_arch(machine: str) -> str:
+    """
+    Map a machine architecture to the name used in Adoptium release file names.
+    :param machine:
+    :return:
+    """
+    arches = {"x86_64": "x64", "amd64": "x64", "aarch64": "aarch64", "arm64": "aarch64"}
+    try:
+        return arches[machine.lower()]
+    except KeyError:
+        raise RuntimeError(f"Unsupported architecture: {machine}")
+
+
+def jdk_jre_step(version_major: str, version_minor: str, build: str, component: str = "jdk",
+                 shared: bool = False, machine: str = "") -> CachedStep:
+    """
+    Cached step installing a Java JDK/JRE from Eclipse Adoptium into /opt/java.
+    :param version_major:
+    :param version_minor:
+    :param build:
+    :param component: jdk or jre.
+    :param shared: Tag the layer in the shared cache namespace.
+    :param machine: Optional. Target machine (x86_64, aarch64), defaults to the host's.
+    :return:
+    """
+    if not version_minor.startswith("."):
+        version_minor = f".{version_minor}"
+
+    tag = f"jdk-{version_major}{version_minor}+{build}"
+
+    tag_encoded = tag.replace("+", "%2B")
+
+    filename_version = f"{version_major}{version_minor}_{build}"
+
+    file_arch = _java_arch(machine or platform.machine())
+
+    filename = f"OpenJDK{version_major}U-{component}_{file_arch}_linux_hotspot_{filename_version}.tar.gz"
+
+    url = f"https://github.com/adoptium/temurin{version_major}-binaries/releases/download/{tag_encoded}/{filename}"
+
+    def src(container: "BuildahContainer") -> Path:
+        container.console.print(f"[dim]{component.upper()} {version_major}{version_minor} (Build {build}) from {url}[/dim]")
+        return container.artifacts.extract(url, strip_components=1, output=container.console)
+
+    return CachedStep.copy_host(
+        f"install_{component}",
+        src,
+        "/opt/java",
+        extra_cache_keys={
+            "step": f"install_{component}",
+            "tag": tag,
+            "component": component,
+            "url": url
+        },
+        shared=shared
+    )
+
+
+def zypper_install_step(packages: List[str], shared: bool = False) -> CachedStep:
+    """
+    Cached step installing packages with zypper, without recommended packages and documentation. Repository
+    metadata is cleaned in the same step so it never ends up in a layer.
+    :param packages:
+    :param shared: Tag the layer in the shared cache namespace.
+    :return:
+    """
+    return CachedStep.run(
+        "deps",
+        command=[
+            "sh", "-c",
+            f"""
+                sed -i 's/^#* *rpm.install.excludedocs *=.*/rpm.install.excludedocs = yes/' /etc/zypp/zypp.conf &&
+                zypper --non-interactive refresh &&
+                zypper --non-interactive install --no-recommends """ + " ".join(packages) + """ &&
+                zypper --non-interactive clean --all"""],
+        extra_cache_keys={"step": "deps", "packages": sorted(packages), "no_recommends": True, "excludedocs": True},
+        shared=shared
+    )
+
+
+def slim_step(prefix: str, drop: List[str], keep: Optional[List[str]] = None, shared: bool = False) -> CachedStep:
+    """
+    Cached step removing the paths matched by the drop globs (relative to prefix) unless a keep glob matches them too.
+
+    The removed size is recorded in the SLIMMED_BYTES_LABEL label. Files of lower layers only stop counting towards
+    the image size when the final image is committed with squash.
+    :param prefix:
+    :param drop:
+    :param keep:
+    :param shared: Tag the layer in the shared cache namespace.
+    :return:
+    """
+    keep = keep or []
+    keep_case = f'case "$f" in {"|".join(keep)}) continue ;; esac; ' if keep else ""
+    script = (f'cd "{prefix}" && total=0 && for f in {" ".join(drop)}; do '
+              f'[ -e "$f" ] || continue; {keep_case}'
+              f'total=$((total + $(du -sk "$f" | cut -f1))); rm -rf "$f"; done; echo "$total"')
+
+    def action(container: "BuildahContainer"):
+        output = container.run_get_output(["sh", "-c", script])
+        removed = int(output.splitlines()[-1]) * 1024 if output else 0
+        container.console.print(f"[dim]Slimming removed {format_size(removed)} below {prefix}[/dim]")
+        container.configure([("--label", f"{SLIMMED_BYTES_LABEL}={removed}")])
+
+    return CachedStep("slim", [["slim", prefix], None, {"step": "slim", "drop": sorted(drop), "keep": sorted(keep)}],
+                      action, shared)
+
+
+def appcds_step(archive: str, workdir: str, command: List[str], ready_pattern: str, timeout: int,
+                cache_keys: Dict[str, Any]) -> CachedStep:
+    """
+    Cached step creating a dynamic AppCDS archive of the classes command loads until it is ready.
+
+    command runs twice inside the container: with -XX:ArchiveClassesAtExit, stopped with SIGTERM once ready_pattern
+    appears in its output, then with -XX:SharedArchiveFile to measure the startup time with the archive. JVM options
+    are passed through PULSAR_EXTRA_OPTS. Both startup times are printed and recorded in the CDS_STARTUP_LABEL label;
+    the archive path is set as PULSAR_CDS_ARCHIVE for the entrypoint. If the JVM does not produce an archive, the image
+    is left without one.
+    :param archive: Archive path in the container.
+    :param workdir: Directory command runs in. Its data and logs directories are emptied afterwards.
+    :param command:
+    :param ready_pattern: Output line (grep pattern) marking the end of startup.
+    :param timeout: Seconds to wait for ready_pattern.
+    :param cache_keys: Identity of what the archive depends on, e.g. the Pulsar and Java versions.
+    :return:
+    """
+    quoted = " ".join(shlex.quote(c) for c in command)
+    # Prints the milliseconds until ready_pattern appeared, -1 if it did not
+    script = (f'cd {shlex.quote(workdir)} || exit 1; log=$(mktemp); start=$(date +%s%N); '
+              f'PULSAR_LOG_APPENDER=Console PULSAR_EXTRA_OPTS="$1" {quoted} > "$log" 2>&1 & pid=$!; '
+              f'ready=-1; i=0; while [ $i -lt {timeout * 10} ]; do '
+              f'if grep -q {shlex.quote(ready_pattern)} "$log"; then '
+              f'ready=$(( ($(date +%s%N) - start) / 1000000 )); break; fi; '
+              f'kill -0 $pid 2>/dev/null || break; sleep 0.1; i=$((i + 1)); done; '
+              f'kill -TERM $pid 2>/dev/null; ( sleep 120; kill -KILL $pid ) > /dev/null 2>&1 & watchdog=$!; '
+              f'wait $pid 2>/dev/null; kill $watchdog 2>/dev/null; '
+              f'[ "$ready" -ge 0 ] || tail -n 20 "$log" >&2; '
+              f'rm -rf "$log" data/* logs/*; echo "$ready"')
+
+    def startup(container: "BuildahContainer", options: str) -> int:
+        output = container.run_get_output(["sh", "-c", script, "appcds", options])
+        lines = output.splitlines()
+        return int(lines[-1]) if lines and lines[-1].lstrip("-").isdigit() else -1
+
+    def action(container: "BuildahContainer"):
+        container.console.print(f"[dim]Recording loaded classes of '{' '.join(command)}' into {archive}[/dim]")
+        before = startup(container, f"-XX:ArchiveClassesAtExit={archive}")
+
+        present = container.run_get_output(["sh", "-c", f"[ -s {shlex.quote(archive)} ] && echo yes || echo no"])
+        if not present.endswith("yes"):
+            container.console.print("[yellow]No AppCDS archive was created, building without it[/yellow]")
+            return
+
+        container.run(["chmod", "644", archive])
+        after = startup(container, f"-XX:SharedArchiveFile={archive} -Xshare:auto")
+
+        if before >= 0 and after >= 0:
+            container.console.print(f"[dim]Startup until ready: {before / 1000:.1f}s without AppCDS, "
+                                    f"{after / 1000:.1f}s with AppCDS ({(before - after) / 1000:.1f}s saved)[/dim]")
+        else:
+            container.console.print(f"[yellow]Startup did not reach '{ready_pattern}' within {timeout}s, "
+                                    f"no startup time measured[/yellow]")
+
+        container.configure([
+            ("--env", f"PULSAR_CDS_ARCHIVE={archive}"),
+            ("--label", f"{CDS_STARTUP_LABEL}={before},{after}"),
+        ])
+
+    return CachedStep("appcds", [["appcds", archive], None, {"step": "appcds", "command": command,
+                                                             "ready_pattern": ready_pattern, **cache_keys}], action)
 
 
 class BuildahContainer:
-    def __init__(self, base_image: str, image_name: str, config: BuildSpec, cache_prefix: str):
+    """
+    Working container driven through buildah.
+
+    Every operation has a coroutine variant (arun, acopy_host_container, ...) running buildah as an asyncio
+    subprocess with its output streamed line by line; the synchronous methods are thin wrappers running them on the
+    container's own event loop. Operations on one working container run one after the other: buildah does not
+    guarantee that concurrent run/copy calls on the same container are safe.
+    """
+
+    # Held while a shared step is built, so concurrent builders wait for the layer instead of building it twice
+    _shared_step_locks: Dict[str, threading.Lock] = {}
+    _shared_step_locks_lock = threading.Lock()
+
+    def __init__(self, base_image: str, image_name: str, config: BuildSpec, cache_prefix: str,
+                 output: Optional[Console] = None, steps: Optional[List[CachedStep]] = None,
+                 shared_cache_prefix: str = "", platform: str = ""):
         self.base_image = base_image
         self.current_image = base_image  # Image currently being worked on
-        self.image_name = image_name
+        self.platform = platform  # target os/arch, host platform when empty
+        # Working container name, one per platform so platform builds can run side by side
+        self.image_name = f"{image_name}-{platform_slug(platform)}" if platform else image_name
         self.config = config
         self.cache_prefix = cache_prefix
-
-        try:
-            self._buildah_cmd = sh.Command(config.Buildah.Path)
-        except sh.CommandNotFound:
+        self.shared_cache_prefix = shared_cache_prefix  # namespace for layers of shared steps
+        self.console = output if output is not None else console
+        self.artifacts = ArtifactCache.for_spec(config)
+        self.images = ImageIndex.shared(config.Buildah.Path)
+        self.timings = StepTimings.for_spec(config)
+        self.usage = CacheUsage.for_spec(config)
+        self.subprocess_count = 0  # buildah processes spawned by this container
+        self._pending_config: Dict[Tuple[str, str], str] = {}
+        self.steps = list(steps or [])  # cached steps the build will go through, in order
+        self._fast_forward: Set[str] = set()  # cache tags already included in the image the container started from
+        self._fast_forward_to: Optional[str] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._config_lock: Optional[asyncio.Lock] = None
+
+        self._buildah_path = shutil.which(config.Buildah.Path)
+        if self._buildah_path is None:
             raise RuntimeError(f"Buildah executable not found at {config.Buildah.Path}")
 
+    async def _aexec(self, *args: str, on_line: Optional[Callable[[str], None]] = None) -> str:
+        """
+        Run buildah with args. Every buildah subprocess goes through here so it can be counted.
+        :param args:
+        :param on_line: Optional. Called with every line of output as it arrives.
+        :return: stdout
+        """
+        self.subprocess_count += 1
+        with tracer.span(f"buildah {args[0]}", "subprocess", self.image_name) as span:
+            result = await run_process(self._buildah_path, *args, on_line=on_line)
+            span["exit_code"] = 0
+            return result.stdout
+
+    def _exec(self, *args: str, on_line: Optional[Callable[[str], None]] = None) -> str:
+        return self._sync(self._aexec(*args, on_line=on_line))
+
+    def _sync(self, awaitable: Awaitable):
+        """
+        Run awaitable to completion on the container's event loop.
+        :param awaitable:
+        :return:
+        """
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+        return self._loop.run_until_complete(awaitable)
+
     def __enter__(self):
-        self._create_container(self.current_image)
+        self._create_container(self._resolve_start_image())
         return self
 
+    def cache_chain(self, steps: List[CachedStep]) -> List[str]:
+        """
+        Compute the cache tags steps would produce, starting from the current image.
+        :param steps:
+        :return:
+        """
+        return cache_chain(self.current_image, self.cache_prefix, steps, self.shared_cache_prefix)
+
+    def _resolve_start_image(self) -> str:
+        """
+        Find the deepest existing cache layer of the declared steps.
+
+        The container is created from it directly; steps and uncached commands up to that layer are skipped as
+        the build walks through them.
+        :return: Image to create the working container from.
+        """
+        chain = self.cache_chain(self.steps)
+
+        deepest = -1
+        for i, tag in enumerate(chain):
+            if self._check_image_exists(tag):
+                deepest = i
+
+        if deepest < 0:
+            return self.current_image
+
+        self._fast_forward = set(chain[:deepest + 1])
+        self._fast_forward_to = chain[deepest]
+
+        self.console.print(
+            f"[bold green] Resuming from cached layer {chain[deepest]} ({deepest + 1}/{len(chain)} steps cached)"
+            f"[/bold green]")
+
+        return chain[deepest]
+
+    def _skip_cached(self, description: str) -> bool:
+        """
+        Return True (and log) when the container already includes the result of an uncached command because it was
+        created from a deeper cache layer.
+        :param description:
+        :return:
+        """
+        if not self._fast_forward:
+            return False
+
+        self.console.print(f"[dim]Skipping {description} (included in cached layer)[/dim]")
+        return True
+
     def __exit__(self, exc_type, exc_val, exc_tb):
         self._cleanup()
+        if self._loop is not None:
+            self._loop.close()
+            self._loop = None
 
     def _create_container(self, from_image: str):
         """
@@ -97,85 +521,52 @@ class BuildahContainer:
         :param from_image:
         :return:
         """
-        console.print(f"[dim]Spawning container image from {from_image}[/dim]")
+        self.console.print(f"[dim]Spawning container image from {from_image}[/dim]")
+
+        args = ["from", "--name", self.image_name]
+        if self.platform:
+            args.extend(["--platform", self.platform])
+        args.append(from_image)
 
         try:
-            self._buildah_cmd("from", "--name", self.image_name, from_image)
-        except sh.ErrorReturnCode as e:
-            if "already in use" in str(e.stderr):
+            self._exec(*args)
+        except ProcessError as e:
+            if "already in use" in e.stderr:
                 self._cleanup()
-                self._buildah_cmd("from", "--name", self.image_name, from_image)
+                self._exec(*args)
             else:
                 raise
 
+        # A base image buildah had to pull is new to the index; build digests need its ID
+        self.images.probe(from_image)
+
     def _cleanup(self):
         """
         Remove image_name
         :return:
         """
         try:
-            self._buildah_cmd("rm", self.image_name)
+            self._exec("rm", self.image_name)
         except Exception:
             pass
 
-    def install_jdk_jre(self, version_major: str, version_minor: str, build: str, component: str = "jdk"):
+    def install_jdk_jre(self, version_major: str, version_minor: str, build: str, component: str = "jdk",
+                        shared: bool = False):
         """
         Install Java JDK from Eclipse Adoptium
 
+        The archive is downloaded and extracted on the host through the artifact cache and copied into /opt/java.
+
         NB> Add '/opt/java/bin' to $PATH
         :param version_major:
         :param version_minor:
         :param component:
         :param build:
+        :param shared: Tag the layer in the shared cache namespace.
         :return:
         """
-
-        if not version_minor.startswith("."):
-            version_minor = f".{version_minor}"
-
-        tag = f"jdk-{version_major}{version_minor}+{build}"
-
-        tag_encoded = tag.replace("+", "%2B")
-
-        filename_version = f"{version_major}{version_minor}_{build}"
-
-        install_script = f"""
-        set -e
-        ARCH=$(uname -m)
-    
-        if [ "$ARCH" = "x86_64" ]; then
-            FILE_ARCH="x64"
-        elif [ "$ARCH" = "aarch64" ]; then
-            FILE_ARCH="aarch64"
-        else
-            echo "Unsupported architecture: $ARCH"
-            exit 1
-        fi
-
-        FILENAME="OpenJDK{version_major}U-{component}_${{FILE_ARCH}}_linux_hotspot_{filename_version}.tar.gz"
-        
-        URL="https://github.com/adoptium/temurin{version_major}-binaries/releases/download/{tag_encoded}/$FILENAME"
-
-        echo "Downloading {component.upper()} {version_major}{version_minor} (Build {build})..."
-        echo "Source: $URL"
-        
-        mkdir -p /opt/java
-        
-        curl -L -f -o /tmp/java.tar.gz "$URL"
-        
-        echo "Extracting..."
-        tar --strip-components=1 -xzf /tmp/java.tar.gz -C /opt/java
-        rm /tmp/java.tar.gz
-        """
-
-        self.run_cached(
-            command=["sh", "-c", install_script],
-            extra_cache_keys={
-                "step": f"install_{component}",
-                "tag": tag,
-                "component": component
-            }
-        )
+        machine = platform_machine(self.platform) if self.platform else ""
+        self.run_step(jdk_jre_step(version_major, version_minor, build, component, shared, machine))
 
         self.configure([
             ("--env", "JAVA_HOME=/opt/java"),
@@ -187,11 +578,7 @@ class BuildahContainer:
         :param tag:
         :return:
         """
-        try:
-            output = self._buildah_cmd("images", "-q", tag)  # returns ID if found else empty.
-            return bool(output.strip())
-        except sh.ErrorReturnCode:
-            return False
+        return self.images.exists(tag)
 
     def _calculate_hash(self, inputs: List[Any]) -> str:
         """
@@ -199,19 +586,7 @@ class BuildahContainer:
         :param inputs:
         :return:
         """
-        hasher = hashlib.sha256()
-
-        hasher.update(self.current_image.encode('utf-8'))  # Add current image for chain integrity
-
-        for inpt in inputs:
-            if isinstance(inpt, dict):
-                # Sort keys to ensure {'a':1, 'b':2} always hashes the same as {'b':2, 'a':1}
-                s = json.dumps(inpt, sort_keys=True)
-            else:
-                s = str(inpt)
-            hasher.update(s.encode('utf-8'))
-
-        return hasher.hexdigest()[:12]
+        return calculate_layer_hash(self.current_image, inputs)
 
     def run_cached(self, command: List[str], env: Optional[Dict[str, str]] = None,
                    extra_cache_keys: Optional[Dict[str, str]] = None):
@@ -223,13 +598,59 @@ class BuildahContainer:
         :param extra_cache_keys:
         :return:
         """
+        name = (extra_cache_keys or {}).get("step", "run")
+        self.run_step(CachedStep.run(name, command, env, extra_cache_keys))
+
+    def copy_host_cached(self, src: Callable[[], Path], dest: str, extra_cache_keys: Optional[Dict[str, str]] = None):
+        """
+        Copies a file or directory from the host into the container and caches the layer.
+
+        src is only called on a cache miss, so artifacts are not downloaded when the layer already exists.
+        The contents of src are not hashed; extra_cache_keys must identify them (e.g. artifact url and checksum).
+        :param src: Returns the host path to copy.
+        :param dest:
+        :param extra_cache_keys:
+        :return:
+        """
+        name = (extra_cache_keys or {}).get("step", "copy")
+        self.run_step(CachedStep.copy_host(name, lambda c: src(), dest, extra_cache_keys))
+
+    def run_step(self, step: CachedStep):
+        """
+        Execute a cached step, or reuse its layer if it exists.
+        :param step:
+        :return:
+        """
+        layer_hash = step.layer_hash(self.current_image)
+        cache_prefix = step_cache_prefix(step, self.cache_prefix, self.shared_cache_prefix)
+        cache_tag = cache_prefix + ":" + layer_hash
+
+        with self._shared_step_lock(step, cache_tag):
+            with tracer.span(step.name, "cached_step", self.image_name, layer_hash=layer_hash) as span:
+                span["cache_hit"] = bool(self._fast_forward) or self._check_image_exists(cache_tag)
+                self._run_step(step, layer_hash, cache_prefix, cache_tag)
 
-        hash_inputs = [command, env, extra_cache_keys]
-        layer_hash = self._calculate_hash(hash_inputs)
-        cache_tag = self.cache_prefix + ":" + layer_hash
+    def _shared_step_lock(self, step: CachedStep, cache_tag: str) -> ContextManager:
+        if not step.shared or self._fast_forward:
+            return nullcontext()
+
+        with self._shared_step_locks_lock:
+            return self._shared_step_locks.setdefault(cache_tag, threading.Lock())
+
+    def _run_step(self, step: CachedStep, layer_hash: str, cache_prefix: str, cache_tag: str):
+        self.usage.record_layer(cache_tag, self.current_image)
+
+        if self._fast_forward:
+            if cache_tag not in self._fast_forward:
+                raise RuntimeError(f"Step '{step.name}' does not match the cached steps declared for this build")
+
+            self.current_image = cache_tag
+            if cache_tag == self._fast_forward_to:
+                self._fast_forward.clear()
+            return
 
         if self._check_image_exists(cache_tag):
-            console.print(f"[bold green] Using cached layer {layer_hash}[/bold green]")
+            self.console.print(f"[bold green] Using cached layer {layer_hash}[/bold green]")
 
             self._cleanup()
             self._create_container(cache_tag)
@@ -237,10 +658,14 @@ class BuildahContainer:
             self.current_image = cache_tag
             return
 
-        self.run(command, env)
+        start = time.monotonic()
+
+        step.action(self)
 
         self.commit(cache_tag)
 
+        self.timings.record(cache_prefix, step.name, time.monotonic() - start, layer_hash)
+
         self.current_image = cache_tag
 
     def run(self, command: List[str], env: Optional[Dict[str, str]] = None):
@@ -250,26 +675,113 @@ class BuildahContainer:
         :param env: environment variables for the command
         :return:
         """
+        self._sync(self.arun(command, env))
+
+    async def arun(self, command: List[str], env: Optional[Dict[str, str]] = None):
+        """
+        Coroutine variant of run, streaming the command's output line by line.
+        :param command:
+        :param env:
+        :return:
+        """
+        if self._skip_cached(f"run {' '.join(command)}"):
+            return
+
+        await self.aflush_config()
+
         env_args = []
         if env:
             for k, v in env.items():
                 env_args.extend(["-e", f"{k}={v}"])
 
-        console.print(f"[dim]buildah run {' '.join(env_args)} {self.image_name} -- {' '.join(command)}[/dim]")
-        self._buildah_cmd("run", *env_args, self.image_name, "--", *command, _out=sys.stdout, _err=sys.stderr)
+        self.console.print(f"[dim]buildah run {' '.join(env_args)} {self.image_name} -- {' '.join(command)}[/dim]")
+        with tracer.span(f"run {' '.join(command)[:80]}", "run", self.image_name):
+            await self._aexec("run", *env_args, self.image_name, "--", *command, on_line=self._write_output)
+
+    def _write_output(self, line: str):
+        self.console.file.write(line)
 
     def configure(self, configs: List[Tuple[str, str]]):
-        args = ["config"]
+        """
+        Queue `buildah config` changes.
 
-        for config in configs:
-            args.extend([config[0], config[1]])
+        Changes are merged (later values override earlier ones) and applied as a single `buildah config` call before
+        the next run or commit, see flush_config.
+        :param configs: (flag, value) pairs, e.g. ("--env", "KEY=value").
+        :return:
+        """
+        for flag, value in configs:
+            if flag in _KEYED_CONFIG_FLAGS:
+                key = value.split("=", 1)[0]
+            elif flag in _ADDITIVE_CONFIG_FLAGS:
+                key = value
+            else:
+                key = ""
 
-        args.append(self.image_name)
+            # Re-insert so the merged order follows the most recent change.
+            self._pending_config.pop((flag, key), None)
+            self._pending_config[(flag, key)] = value
 
-        console.print(f"[dim]buildah {' '.join(args)}[/dim]")
-        self._buildah_cmd(*args)
+    def flush_config(self):
+        """
+        Apply queued configuration changes in one `buildah config` call.
+        :return:
+        """
+        self._sync(self.aflush_config())
+
+    async def aflush_config(self):
+        """
+        Coroutine variant of flush_config.
+        :return:
+        """
+        if self._config_lock is None:
+            self._config_lock = asyncio.Lock()
+
+        async with self._config_lock:
+            if not self._pending_config:
+                return
+
+            pending, self._pending_config = self._pending_config, {}
+
+            args = ["config"]
+
+            for (flag, _), value in pending.items():
+                args.extend([flag, value])
+
+            args.append(self.image_name)
+
+            self.console.print(f"[dim]buildah {' '.join(args)}[/dim]")
+            with tracer.span("config", "configure", self.image_name, changes=len(pending)):
+                await self._aexec(*args)
+
+    def commit(self, tag: str, cmd: Optional[List[str]] = None, changes: Optional[List[str]] = None,
+               squash: bool = False, image_format: str = ""):
+        """
+        Commit the working container as tag.
+        :param tag:
+        :param cmd:
+        :param changes:
+        :param squash: Squash all layers into one, so files removed in upper layers no longer count.
+        :param image_format: Optional. oci (buildah's default) or docker; only docker images keep a HEALTHCHECK.
+        :return:
+        """
+        self._sync(self.acommit(tag, cmd, changes, squash, image_format))
+
+    async def acommit(self, tag: str, cmd: Optional[List[str]] = None, changes: Optional[List[str]] = None,
+                      squash: bool = False, image_format: str = ""):
+        """
+        Coroutine variant of commit.
+        :param tag:
+        :param cmd:
+        :param changes:
+        :param squash:
+        :param image_format:
+        :return:
+        """
+        # Record the cache layer the image was built on, a stable identity for its content across re-commits.
+        self.configure([("--label", f"{SOURCE_LAYER_LABEL}={self.current_image}")])
+        await self.aflush_config()
 
-    def commit(self, tag: str, cmd: Optional[List[str]] = None, changes: Optional[List[str]] = None):
         args = ["commit"]
 
         if cmd:
@@ -279,46 +791,109 @@ class BuildahContainer:
             for instruction in changes:
                 args.extend(["--change", instruction])
 
+        if squash:
+            args.append("--squash")
+
+        if image_format:
+            args.extend(["--format", image_format])
+
         args.extend([self.image_name, tag])
 
-        console.print(f"[dim]buildah {' '.join(args)}[/dim]")
-        self._buildah_cmd(*args)
+        self.console.print(f"[dim]buildah {' '.join(args)}[/dim]")
+        with tracer.span(f"commit {tag}", "commit", self.image_name) as span:
+            output = (await self._aexec(*args)).strip()
+
+            # buildah prints the new image ID as the last line of stdout
+            if output:
+                self.images.add(tag, output.splitlines()[-1])
+
+        if not self._is_cache_tag(tag):
+            self.usage.record_final(tag, self.current_image)
+
+        if tracer.enabled:
+            span["layer_size_delta"] = self.images.measure(tag) - self.images.measure(self.current_image)
+
+    def _is_cache_tag(self, tag: str) -> bool:
+        return any(prefix and tag.startswith(f"{prefix}:") for prefix in (self.cache_prefix, self.shared_cache_prefix))
 
     def run_get_output(self, command: List[str]) -> str:
         """
         Runs command and returns stdout as a string.
         """
-        result = self._buildah_cmd("run", self.image_name, "--", *command)
-
-        # Case A: _buildah_cmd returned the output string directly
-        if isinstance(result, str):
-            return result.strip()
+        return self._sync(self.arun_get_output(command))
 
-        # Case B: _buildah_cmd returned a sh.RunningCommand object
-        # We access .stdout (bytes) and decode it
-        if hasattr(result, "stdout"):
-            return result.stdout.decode('utf-8').strip()
+    async def arun_get_output(self, command: List[str]) -> str:
+        """
+        Coroutine variant of run_get_output.
+        :param command:
+        :return:
+        """
+        await self.aflush_config()
 
-        # Fallback: Try converting whatever it is to a string
-        return str(result).strip()
+        return (await self._aexec("run", self.image_name, "--", *command)).strip()
 
-    def copy_host_container(self, src: Path, dest: str):
+    def copy_host_container(self, src: Path, dest: str, chmod: str = "", chown: str = ""):
         """
         Copies a file or directory from the host into the container.
         """
+        self._sync(self.acopy_host_container(src, dest, chmod, chown))
+
+    async def acopy_host_container(self, src: Path, dest: str, chmod: str = "", chown: str = ""):
+        """
+        Coroutine variant of copy_host_container.
+        :param src:
+        :param dest:
+        :param chmod: Optional. Mode of the copied files, e.g. 755, saving a separate chmod.
+        :param chown: Optional. user:group owning the copied files.
+        :return:
+        """
         if not src.exists():
             raise FileNotFoundError(f"Source file {src} does not exist.")
 
-        console.print(f"[dim]buildah copy {self.image_name} {str(src)} {dest}[/dim]")
-        self._buildah_cmd("copy", self.image_name, str(src), dest)
+        if self._skip_cached(f"copy {src}"):
+            return
+
+        args = ["copy"]
+        if chmod:
+            args.extend(["--chmod", chmod])
+        if chown:
+            args.extend(["--chown", chown])
+        args.extend([self.image_name, str(src), dest])
 
-    def copy_container_current(self, src_container: str, src: str, dest: str):
+        self.console.print(f"[dim]buildah {' '.join(args)}[/dim]")
+        with tracer.span(f"copy {src.name} -> {dest}", "copy", self.image_name) as span:
+            await self._aexec(*args)
+            if tracer.enabled:
+                span["bytes"] = disk_usage(src)
+
+    def copy_container_current(self, src_container: str, src: str, dest: str, chown: str = ""):
         """
         Copies a files from container to current container
         :param src_container:
         :param src:
         :param dest:
+        :param chown: Optional. user:group owning the copied files, avoids a later `chown -R` duplicating them.
         :return:
         """
-        console.print(f"[dim]buildah copy --from {src_container} {self.image_name} {src} {dest}[/dim]")
-        self._buildah_cmd("copy", "--from", src_container, self.image_name, src, dest)
+        self._sync(self.acopy_container_current(src_container, src, dest, chown))
+
+    async def acopy_container_current(self, src_container: str, src: str, dest: str, chown: str = ""):
+        """
+        Coroutine variant of copy_container_current.
+        :param src_container:
+        :param src:
+        :param dest:
+        :param chown:
+        :return:
+        """
+        if self._skip_cached(f"copy --from {src_container} {src}"):
+            return
+
+        args = ["copy", "--from", src_container]
+        if chown:
+            args.extend(["--chown", chown])
+        args.extend([self.image_name, src, dest])
+
+        self.console.print(f"[dim]buildah {' '.join(args)}[/dim]")
+        with tracer.span(f"copy --from {src_container} {src} -> {dest}", "copy", self.image_name):
+            await self._aexec(*args)
@@ -1,16 +1,56 @@
+import copy
+import hashlib
+import inspect
 from abc import ABC, abstractmethod
+from functools import lru_cache
+from importlib import metadata
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
 
 from rich.console import Console
+from rich.table import Table
 
-from .buildah import BuildahContainer
+from .buildah import BuildahContainer, BUILD_DIGEST_LABEL, MEMO_REPOSITORY, SOURCE_LAYER_LABEL, \
+    SLIMMED_BYTES_LABEL, tag_image
+from .image_index import ImageIndex, format_size
+from .platforms import platform_machine, platform_slug
+from .steps import CachedStep, cache_chain, calculate_layer_hash
 from apache_pulsar_setup.core.spec import BuildSpec
 
 console = Console()
 
+# Health probe of images running Pulsar, see resources/healthcheck.sh
+HEALTHCHECK_PATH = "/usr/local/bin/healthcheck.sh"
+
+
+@lru_cache(maxsize=None)
+def _tool_version() -> str:
+    try:
+        return metadata.version("apache-pulsar-setup")
+    except metadata.PackageNotFoundError:
+        return ""
+
+
+@lru_cache(maxsize=None)
+def _file_digest(path: str) -> str:
+    try:
+        return hashlib.sha256(Path(path).read_bytes()).hexdigest()
+    except OSError:
+        return ""
+
 
 class BaseBuilder(ABC):
-    def __init__(self, config: BuildSpec, cache_prefix: str = ""):
+    # Whether the final image runs Pulsar and carries the health probe
+    healthcheck = False
+
+    def __init__(self, config: BuildSpec, cache_prefix: str = "", squash: bool = False):
         self.config = config
+        self.console = console
+        self.base_image = config.BaseImage
+        self.squash = squash  # commit the final image as a single layer
+        self.platform = ""  # target os/arch, host platform when empty (see for_platform)
+        # Content-addressed namespace for layers of shared steps, reused across builders
+        self.shared_cache_prefix = config.Cache.SharedPrefix or f"{config.ProjectName}/cache/shared"
         self._init_cache_prefix(cache_prefix)
 
     @abstractmethod
@@ -21,8 +61,215 @@ class BaseBuilder(ABC):
     def build(self):
         pass
 
+    def for_platform(self, platform: str) -> "BaseBuilder":
+        """
+        Copy of this builder targeting platform, with its own cache prefixes and per-platform image tags.
+        :param platform: os/arch, e.g. linux/arm64
+        :return:
+        """
+        clone = copy.copy(self)
+        clone.platform = platform
+        clone.cache_prefix = f"{self.cache_prefix}/{platform_slug(platform)}"
+        clone.shared_cache_prefix = f"{self.shared_cache_prefix}/{platform_slug(platform)}"
+        return clone
+
+    @property
+    def machine(self) -> str:
+        """
+        `uname -m` machine of the target platform, empty for the host.
+        :return:
+        """
+        return platform_machine(self.platform) if self.platform else ""
+
+    def platform_image(self, image: str) -> str:
+        """
+        Per-platform variant of a final image name, e.g. apache-pulsar:4.0.0-linux-arm64. Unchanged for the host.
+        :param image:
+        :return:
+        """
+        return f"{image}-{platform_slug(self.platform)}" if self.platform else image
+
+    @property
+    def final_image(self) -> str:
+        """
+        Image committed by build().
+        :return:
+        """
+        return self.platform_image(f"{self.image_name}:{self.image_tag}")
+
+    def cached_steps(self) -> Dict[str, CachedStep]:
+        """
+        Cached steps of the build, keyed by name, in the order build() runs them.
+
+        Declaring them up front lets the container compute the cache chain and start from the deepest cached layer.
+        :return:
+        """
+        return {}
+
+    def image_identity(self, image: str) -> str:
+        """
+        Stable identity of a local image's content: the cache layer it was committed on when known, else its ID.
+        Empty if the image does not exist.
+        :param image:
+        :return:
+        """
+        images = ImageIndex.shared(self.config.Buildah.Path)
+        record = images.get(image)
+        if record is None:
+            return ""
+
+        return images.labels(image).get(SOURCE_LAYER_LABEL, record.id)
+
+    def memo_inputs(self) -> Dict[str, Any]:
+        """
+        What build() depends on besides the cached steps: spec settings and resource files used by its uncached
+        commands and configuration. Part of the build digest.
+        :return:
+        """
+        return {}
+
+    def resource_digest(self, name: str) -> str:
+        """
+        SHA-256 of a file in Runtime.Resources, empty if it does not exist.
+        :param name:
+        :return:
+        """
+        return _file_digest(f"{self.config.ApachePulsar.Runtime.Resources}/{name}")
+
+    @property
+    def image_format(self) -> str:
+        """
+        Format of the final image: docker for images with a HEALTHCHECK, which OCI images cannot hold, buildah's
+        default otherwise.
+        :return:
+        """
+        return "docker" if self.healthcheck and self.config.ApachePulsar.Runtime.Healthcheck.Enabled else ""
+
+    def healthcheck_configs(self) -> List[Tuple[str, str]]:
+        """
+        `buildah config` changes running the health probe (HEALTHCHECK_PATH, copied by build()) in liveness mode.
+        :return: Empty when the image has no health check.
+        """
+        if not self.image_format:
+            return []
+
+        health = self.config.ApachePulsar.Runtime.Healthcheck
+        return [
+            ("--healthcheck", f"CMD {HEALTHCHECK_PATH} live"),
+            ("--healthcheck-interval", health.Interval),
+            ("--healthcheck-timeout", health.Timeout),
+            ("--healthcheck-start-period", health.StartPeriod),
+            ("--healthcheck-retries", str(health.Retries)),
+        ]
+
+    def build_digest(self) -> str:
+        """
+        Digest of everything the final image is built from: the base image content, the cache chain of the cached
+        steps (spec settings, artifacts and source images such as core), memo_inputs, the platform, the tool version
+        and the builder's own code.
+        :return: Empty if the base image is not local yet, its content is unknown until it is pulled.
+        """
+        base = ImageIndex.shared(self.config.Buildah.Path).probe(self.base_image)
+        if base is None:
+            return ""
+
+        chain = cache_chain(self.base_image, self.cache_prefix, list(self.cached_steps().values()),
+                            self.shared_cache_prefix)
+        return calculate_layer_hash(base.id, [
+            {"builder": type(self).__name__, "tool": _tool_version(),
+             "code": _file_digest(inspect.getsourcefile(type(self)) or ""),
+             "platform": self.platform, "squash": self.squash},
+            chain[-1] if chain else "",
+            self.memo_inputs()
+        ])
+
+    def memo_image(self, digest: str) -> str:
+        """
+        Cache tag pointing to the final image built with digest.
+        :param digest:
+        :return:
+        """
+        return f"{self.cache_prefix}/{MEMO_REPOSITORY}:{digest}"
+
+    def reuse_build(self, digest: str) -> bool:
+        """
+        Tag the final image to an earlier build with the same digest, if there is one.
+
+        The lookup is a single index probe of the digest's cache tag; the whole build, including its uncached
+        commands and the commit, is skipped on a hit.
+        :param digest: See build_digest.
+        :return: True if the final image is up to date and build() can return.
+        """
+        if not digest:
+            return False
+
+        images = ImageIndex.shared(self.config.Buildah.Path)
+        record = images.get(self.memo_image(digest))
+        if record is None:
+            return False
+
+        current = images.get(self.final_image)
+        if current is None or current.id != record.id:
+            tag_image(self.config.Buildah.Path, record.id, self.final_image)
+
+        self.log(f"{self.final_image} is up to date (build {digest}), skipping the build", style="bold green")
+        return True
+
+    def commit_final(self, container: BuildahContainer, digest: str):
+        """
+        Commit the final image, labelled with its build digest and tagged for reuse_build.
+        :param container:
+        :param digest: See build_digest. Computed again when empty, the container pulled the base image by now.
+        :return:
+        """
+        if not digest:
+            digest = self.build_digest()
+
+        if digest:
+            container.configure([("--label", f"{BUILD_DIGEST_LABEL}={digest}")])
+
+        container.commit(self.final_image, squash=self.squash, image_format=self.image_format)
+
+        if digest:
+            tag_image(self.config.Buildah.Path, self.final_image, self.memo_image(digest))
+
+    def image_size(self, image: str) -> int:
+        """
+        Size of a local image in bytes, 0 if it does not exist.
+        :param image:
+        :return:
+        """
+        return ImageIndex.shared(self.config.Buildah.Path).measure(image)
+
+    def report_size(self, image: str, previous_size: int):
+        """
+        Print the size of a freshly committed image next to the size of the image it replaced.
+        :param image:
+        :param previous_size: Size of the image with the same tag before the build, 0 if there was none.
+        :return:
+        """
+        images = ImageIndex.shared(self.config.Buildah.Path)
+        size = images.measure(image)
+        slimmed = int(images.labels(image).get(SLIMMED_BYTES_LABEL, 0) or 0)
+
+        table = Table(title=f"Size of {image}")
+        table.add_column("Before", justify="right")
+        table.add_column("After", justify="right")
+        table.add_column("Change", justify="right")
+        table.add_column("Dropped by slimming", justify="right")
+        table.add_column("Squashed")
+
+        change = "-"
+        if previous_size:
+            sign = "+" if size >= previous_size else "-"
+            change = f"{sign}{format_size(abs(size - previous_size))}"
+
+        table.add_row(format_size(previous_size) if previous_size else "-", format_size(size), change,
+                      format_size(slimmed) if slimmed else "-", "yes" if self.squash else "no")
+        self.console.print(table)
+
     def log(self, message: str, style: str = "white"):
-        console.print(f"[{style}]{message}[/{style}]")
+        self.console.print(f"[{style}]{message}[/{style}]")
 
 
 class BaseRuntime(ABC):
@@ -0,0 +1,100 @@
+import heapq
+from typing import Dict, List, Set
+
+from rich.console import Console
+
+from .buildah import SOURCE_LAYER_LABEL, is_memo_image, remove_images
+from .image_index import ImageIndex, format_size, in_repositories, normalize_image_name
+from .spec import BuildSpec
+from .state import CacheUsage
+
+console = Console()
+
+
+def collect_cache_garbage(config: BuildSpec, cache_prefixes: List[str], budget_mb: int,
+                          dry_run: bool = False) -> List[str]:
+    """
+    Evict least-recently-used cache layers until the cache fits budget_mb.
+
+    Only leaf layers (no cached children left) are evicted, and chains that a final image was committed on are kept.
+    Build digest tags point to final images, not layers; they are neither counted nor evicted.
+    The size of a layer is the size of its image minus the size of its parent image.
+    :param config:
+    :param cache_prefixes: Cache prefixes (repositories) to collect.
+    :param budget_mb: Target cache size.
+    :param dry_run: Only report what would be evicted.
+    :return: Evicted image names.
+    """
+    images = ImageIndex.shared(config.Buildah.Path)
+    usage = CacheUsage.for_spec(config)
+    data = usage.load()
+
+    repositories = {normalize_image_name(cache_prefix).rsplit(":", 1)[0] for cache_prefix in cache_prefixes}
+
+    layers = {}
+    for record in images.images():
+        for name in record.names:
+            if in_repositories(name, repositories) and not is_memo_image(name):
+                layers[name] = record
+
+    parents: Dict[str, str] = {}
+    for name in layers:
+        parent = data["layers"].get(name, {}).get("parent") or images.labels(name).get(SOURCE_LAYER_LABEL, "")
+        parents[name] = normalize_image_name(parent) if parent else ""
+
+    protected: Set[str] = set()
+    for image, source in data["finals"].items():
+        if not images.exists(image):
+            continue
+        node = source
+        while node in layers and node not in protected:
+            protected.add(node)
+            node = parents[node]
+
+    sizes: Dict[str, int] = {}
+    children: Dict[str, int] = {name: 0 for name in layers}
+    for name, record in layers.items():
+        parent = images.get(parents[name]) if parents[name] else None
+        sizes[name] = max(record.size - (parent.size if parent else 0), 0)
+        if parents[name] in children:
+            children[parents[name]] += 1
+
+    def last_used(name: str) -> float:
+        return data["layers"].get(name, {}).get("last_used") or layers[name].created
+
+    total = sum(sizes.values())
+    budget = budget_mb * 1000 * 1000
+
+    console.print(f"Cache size {format_size(total)} in {len(layers)} layers ({len(protected)} in use by final images), "
+                  f"budget {format_size(budget)}")
+
+    candidates = [(last_used(name), name) for name in layers if children[name] == 0 and name not in protected]
+    heapq.heapify(candidates)
+
+    evicted = []
+    while total > budget and candidates:
+        _, name = heapq.heappop(candidates)
+        evicted.append(name)
+        total -= sizes[name]
+
+        parent = parents[name]
+        if parent in children:
+            children[parent] -= 1
+            if children[parent] == 0 and parent not in protected:
+                heapq.heappush(candidates, (last_used(parent), parent))
+
+    if not evicted:
+        console.print("[green]Cache fits the budget, nothing to evict.[/green]")
+        return []
+
+    if total > budget:
+        console.print(f"[yellow]Only {format_size(total)} can be reached without evicting layers in use.[/yellow]")
+
+    for name in evicted:
+        console.print(f" -> {'Would evict' if dry_run else 'Evicting'} {name} ({format_size(sizes[name])})")
+
+    if not dry_run:
+        remove_images(config.Buildah.Path, evicted, estimated=sum(sizes[name] for name in evicted))
+        usage.forget(evicted)
+
+    return evicted
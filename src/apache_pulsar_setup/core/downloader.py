@@ -0,0 +1,289 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from rich.console import Console
+
+from .image_index import format_size
+from .spec import BuildSpec
+
+console = Console()
+
+_CHUNK_SIZE = 1024 * 1024
+_USER_AGENT = "apache-pulsar-setup"
+
+
+class ChecksumMismatch(RuntimeError):
+    pass
+
+
+class Downloader:
+    """
+    Host-side HTTP download engine.
+
+    Servers supporting range requests are downloaded in fixed-size segments over several connections into a
+    preallocated `.part` file; finished segments are recorded next to it so an interrupted download resumes where it
+    stopped. The SHA-512 is computed while segments arrive (in file order), so verification does not need another
+    pass over the file. URLs below one of the mirrors are tried on every mirror in order.
+    """
+
+    def __init__(self, connections: int = 4, segment_size_mb: int = 8, retries: int = 3, timeout: float = 30,
+                 mirrors: Optional[List[str]] = None, published_checksums: bool = True):
+        self.connections = max(connections, 1)
+        self.segment_size = max(segment_size_mb, 1) * 1024 * 1024
+        self.retries = retries
+        self.timeout = timeout
+        self.mirrors = list(mirrors or [])
+        self.published_checksums = published_checksums
+
+    @classmethod
+    def for_spec(cls, config: BuildSpec) -> "Downloader":
+        return cls(
+            connections=config.Artifacts.Connections,
+            segment_size_mb=config.Artifacts.SegmentSizeMb,
+            retries=config.Artifacts.Retries,
+            mirrors=config.Artifacts.Mirrors,
+            published_checksums=config.Artifacts.PublishedChecksums
+        )
+
+    def candidates(self, url: str) -> List[str]:
+        """
+        URLs to try for url: the same path on every mirror, in mirror order, if url is below one of them.
+        :param url:
+        :return:
+        """
+        for mirror in self.mirrors:
+            base = mirror.rstrip("/") + "/"
+            if url.startswith(base):
+                path = url[len(base):]
+                return [m.rstrip("/") + "/" + path for m in self.mirrors]
+        return [url]
+
+    def download(self, url: str, target: Path, sha512: str = "", output: Optional[Console] = None):
+        """
+        Download url to target, trying mirrors in order and resuming partial downloads.
+
+        :param url:
+        :param target:
+        :param sha512: Optional. Expected SHA-512 hex digest. When empty and url is below a mirror, the published
+            `.sha512` file is used if available.
+        :param output:
+        :return:
+        """
+        output = output if output is not None else console
+        candidates = self.candidates(url)
+
+        if not sha512 and self.published_checksums and len(candidates) > 1:
+            sha512 = self._published_sha512(candidates, output)
+
+        errors = []
+        for candidate in candidates:
+            start = time.monotonic()
+            try:
+                size = self._download(candidate, target, sha512.lower(), output)
+            except ChecksumMismatch as e:
+                # Do not resume from a corrupted file on the next mirror
+                _discard_partial(target)
+                errors.append(f"{candidate}: {e}")
+                output.print(f"[yellow]{e}[/yellow]")
+                continue
+            except (urllib.error.URLError, OSError, ValueError) as e:
+                errors.append(f"{candidate}: {e}")
+                output.print(f"[yellow]Download from {candidate} failed: {e}[/yellow]")
+                continue
+
+            seconds = max(time.monotonic() - start, 1e-6)
+            output.print(f"[dim]Downloaded {format_size(size)} from {candidate} in {seconds:.1f}s "
+                         f"({format_size(size / seconds)}/s)[/dim]")
+            return
+
+        raise RuntimeError(f"Download of {url} failed:\n  " + "\n  ".join(errors))
+
+    def _request(self, url: str, headers: Optional[Dict[str, str]] = None):
+        request = urllib.request.Request(url, headers={"User-Agent": _USER_AGENT, **(headers or {})})
+        return urllib.request.urlopen(request, timeout=self.timeout)
+
+    def _probe(self, url: str) -> Tuple[Optional[int], bool]:
+        """
+        :param url:
+        :return: Size (None if unknown) and whether the server honours range requests.
+        """
+        with self._request(url, {"Range": "bytes=0-0"}) as response:
+            if response.status == 206:
+                content_range = response.headers.get("Content-Range", "")
+                total = content_range.rsplit("/", 1)[-1]
+                return (int(total), True) if total.isdigit() else (None, False)
+
+            length = response.headers.get("Content-Length")
+            return (int(length) if length and length.isdigit() else None), False
+
+    def _download(self, url: str, target: Path, sha512: str, output: Console) -> int:
+        size, ranges = self._probe(url)
+
+        if ranges and size:
+            hasher = self._download_segments(url, target, size, output)
+        else:
+            hasher = self._download_stream(url, target)
+
+        partial = _partial(target)
+        if sha512 and hasher.hexdigest() != sha512:
+            raise ChecksumMismatch(f"Checksum mismatch for {url}: expected {sha512}, got {hasher.hexdigest()}")
+
+        os.replace(partial, target)
+        _state(target).unlink(missing_ok=True)
+        return target.stat().st_size
+
+    def _download_stream(self, url: str, target: Path):
+        hasher = hashlib.sha512()
+        _state(target).unlink(missing_ok=True)
+
+        with self._request(url) as response, open(_partial(target), "wb") as f:
+            while chunk := response.read(_CHUNK_SIZE):
+                hasher.update(chunk)
+                f.write(chunk)
+
+        return hasher
+
+    def _download_segments(self, url: str, target: Path, size: int, output: Console):
+        partial = _partial(target)
+        segments = [(offset, min(offset + self.segment_size, size) - 1) for offset in range(0, size, self.segment_size)]
+
+        state = _load_state(target)
+        if (state.get("size") != size or state.get("segment_size") != self.segment_size
+                or not partial.exists() or partial.stat().st_size != size):
+            state = {"size": size, "segment_size": self.segment_size, "done": []}
+            with open(partial, "wb") as f:
+                f.truncate(size)
+        elif state["done"]:
+            output.print(f"[dim]Resuming {target.name}: {len(state['done'])}/{len(segments)} segments present[/dim]")
+
+        done = set(state["done"])
+        state_lock = threading.Lock()
+
+        hasher = hashlib.sha512()
+        hashed = 0  # segments [0, hashed) are included in hasher
+
+        def advance_hash():
+            nonlocal hashed
+            with open(partial, "rb") as f:
+                while hashed < len(segments) and hashed in done:
+                    start, end = segments[hashed]
+                    f.seek(start)
+                    remaining = end - start + 1
+                    while remaining:
+                        chunk = f.read(min(_CHUNK_SIZE, remaining))
+                        hasher.update(chunk)
+                        remaining -= len(chunk)
+                    hashed += 1
+
+        def fetch(index: int):
+            start, end = segments[index]
+            for attempt in range(self.retries + 1):
+                try:
+                    self._fetch_segment(url, partial, start, end)
+                    break
+                except (urllib.error.URLError, OSError, ValueError):
+                    if attempt == self.retries:
+                        raise
+                    time.sleep(min(2 ** attempt, 10))
+
+            with state_lock:
+                done.add(index)
+                state["done"] = sorted(done)
+                _save_state(target, state)
+
+        advance_hash()
+
+        pending = [i for i in range(len(segments)) if i not in done]
+        with ThreadPoolExecutor(max_workers=min(self.connections, max(len(pending), 1)),
+                                thread_name_prefix="download") as executor:
+            futures = [executor.submit(fetch, i) for i in pending]
+            for future in as_completed(futures):
+                error = future.exception()
+                if error is not None:
+                    for f in futures:
+                        f.cancel()
+                    raise error
+                advance_hash()
+
+        return hasher
+
+    def _fetch_segment(self, url: str, partial: Path, start: int, end: int):
+        with self._request(url, {"Range": f"bytes={start}-{end}"}) as response:
+            if response.status != 206:
+                raise ValueError(f"Server ignored range request for bytes {start}-{end}")
+
+            with open(partial, "r+b") as f:
+                f.seek(start)
+                written = 0
+                while chunk := response.read(_CHUNK_SIZE):
+                    f.write(chunk)
+                    written += len(chunk)
+
+        if written != end - start + 1:
+            raise ValueError(f"Short read for bytes {start}-{end}: got {written} bytes")
+
+    def _published_sha512(self, candidates: List[str], output: Console) -> str:
+        for candidate in candidates:
+            try:
+                with self._request(f"{candidate}.sha512") as response:
+                    digest = parse_sha512(response.read().decode("utf-8", errors="replace"))
+            except (urllib.error.URLError, OSError, ValueError):
+                continue
+
+            if digest:
+                output.print(f"[dim]Verifying against published checksum {candidate}.sha512[/dim]")
+                return digest
+
+        return ""
+
+
+def parse_sha512(text: str) -> str:
+    """
+    Extract the digest from a `.sha512` file, either `sha512sum` output or the `gpg --print-md` layout
+    (`file: 1234 ABCD ...` over several lines).
+    :param text:
+    :return: Lowercase hex digest, empty if none was found.
+    """
+    match = re.search(r"\b[0-9a-fA-F]{128}\b", text)
+    if match:
+        return match.group(0).lower()
+
+    digits = re.sub(r"[^0-9a-fA-F]", "", text.split(":", 1)[-1])
+    return digits.lower() if len(digits) == 128 else ""
+
+
+def _partial(target: Path) -> Path:
+    return target.with_name(target.name + ".part")
+
+
+def _state(target: Path) -> Path:
+    return target.with_name(target.name + ".part.json")
+
+
+def _load_state(target: Path) -> dict:
+    try:
+        with open(_state(target), "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _save_state(target: Path, state: dict):
+    tmp = _state(target).with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, _state(target))
+
+
+def _discard_partial(target: Path):
+    _partial(target).unlink(missing_ok=True)
+    _state(target).unlink(missing_ok=True)
@@ -0,0 +1,306 @@
+import json
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Set
+
+import sh
+
+_SIZE_UNITS = {"b": 1, "kb": 1000, "mb": 1000 ** 2, "gb": 1000 ** 3, "tb": 1000 ** 4,
+               "kib": 1024, "mib": 1024 ** 2, "gib": 1024 ** 3, "tib": 1024 ** 4}
+
+
+@dataclass
+class ImageRecord:
+    id: str
+    names: List[str] = field(default_factory=list)
+    digest: str = ""
+    size: int = 0  # bytes, 0 when unknown
+    created: float = 0.0
+    labels: Optional[Dict[str, str]] = None  # loaded on first use, see ImageIndex.labels
+
+
+def normalize_image_name(name: str) -> str:
+    """
+    Normalize an image reference the way buildah stores it, e.g. 'my/image' -> 'localhost/my/image:latest'.
+    :param name:
+    :return:
+    """
+    first, _, rest = name.partition("/")
+    if not rest or ("." not in first and ":" not in first and first != "localhost"):
+        name = f"localhost/{name}"
+
+    if "@" not in name and ":" not in name.rsplit("/", 1)[-1]:
+        name = f"{name}:latest"
+
+    return name
+
+
+def in_repositories(name: str, repositories: Set[str]) -> bool:
+    """
+    True if the repository of a normalized image name is one of repositories, or a per-platform repository below one
+    of them (e.g. <cache prefix>/linux-arm64).
+    :param name:
+    :param repositories: Normalized repositories, without tag.
+    :return:
+    """
+    if "@" in name:
+        return False
+
+    repository = name.rsplit(":", 1)[0]
+    return repository in repositories or repository.rsplit("/", 1)[0] in repositories
+
+
+def parse_size(value) -> int:
+    """
+    Parse a size reported by buildah (bytes or a human readable string such as '312 MB').
+    :param value:
+    :return: Size in bytes.
+    """
+    if isinstance(value, (int, float)):
+        return int(value)
+
+    match = re.fullmatch(r"\s*([\d.]+)\s*([a-zA-Z]*)\s*", str(value or ""))
+    if not match:
+        return 0
+
+    return int(float(match.group(1)) * _SIZE_UNITS.get(match.group(2).lower() or "b", 1))
+
+
+def format_size(size: float) -> str:
+    """
+    Human readable size, e.g. 312.4MB.
+    :param size: Size in bytes.
+    :return:
+    """
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(size) < 1000:
+            return f"{size:.0f}{unit}" if unit == "B" else f"{size:.1f}{unit}"
+        size /= 1000
+    return f"{size:.1f}TB"
+
+
+def _image_record(img_data: dict) -> ImageRecord:
+    """
+    Record of one entry of `buildah images --json`.
+    :param img_data:
+    :return:
+    """
+    return ImageRecord(
+        id=img_data.get("id", ""),
+        names=list(img_data.get("names") or []),
+        digest=img_data.get("digest", ""),
+        size=parse_size(img_data.get("size")),
+        created=float(img_data.get("created") or 0)
+    )
+
+
+class ImageIndex:
+    """
+    In-memory view of local images.
+
+    Loaded with a single `buildah images --json` call per process and kept up to date through add/remove as images
+    are committed or deleted, so cache probes are dictionary lookups instead of subprocesses.
+    """
+
+    _instances: Dict[str, "ImageIndex"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, buildah_path: str):
+        try:
+            self._buildah_cmd = sh.Command(buildah_path)
+        except sh.CommandNotFound:
+            raise RuntimeError(f"Buildah executable not found at {buildah_path}")
+
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._by_id: Dict[str, ImageRecord] = {}
+        self._by_name: Dict[str, str] = {}
+        self._by_digest: Dict[str, str] = {}
+
+    @classmethod
+    def shared(cls, buildah_path: str) -> "ImageIndex":
+        """
+        Return the process wide index for the buildah executable at buildah_path.
+        :param buildah_path:
+        :return:
+        """
+        with cls._instances_lock:
+            if buildah_path not in cls._instances:
+                cls._instances[buildah_path] = cls(buildah_path)
+            return cls._instances[buildah_path]
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.refresh()
+
+    def refresh(self):
+        """
+        (Re)load the index from `buildah images --json`.
+        :return:
+        """
+        output = self._buildah_cmd("images", "--json")
+        images_list = json.loads(str(output) or "[]") or []
+
+        with self._lock:
+            self._by_id.clear()
+            self._by_name.clear()
+            self._by_digest.clear()
+
+            for img_data in images_list:
+                self._insert(_image_record(img_data))
+
+            self._loaded = True
+
+    def probe(self, name: str) -> Optional[ImageRecord]:
+        """
+        Look an image up in buildah's storage when the index does not know it, e.g. a base image pulled by
+        `buildah from`, and record it.
+        :param name: Image name or ID.
+        :return: None if buildah does not know it either.
+        """
+        record = self.get(name)
+        if record is not None:
+            return record
+
+        try:
+            output = self._buildah_cmd("images", "--json", name)
+        except sh.ErrorReturnCode:
+            return None
+
+        with self._lock:
+            for img_data in json.loads(str(output) or "[]") or []:
+                record = self._by_id.get(img_data.get("id", ""))
+                if record is None:
+                    record = _image_record(img_data)
+                    self._insert(record)
+
+                # Short names resolve to the full name buildah reports
+                normalized = normalize_image_name(name)
+                if normalized not in record.names:
+                    record.names.append(normalized)
+                self._by_name[normalized] = record.id
+                return record
+
+        return None
+
+    def _insert(self, record: ImageRecord):
+        self._by_id[record.id] = record
+        for name in record.names:
+            self._by_name[name] = record.id
+        if record.digest:
+            self._by_digest[record.digest] = record.id
+
+    def images(self) -> List[ImageRecord]:
+        with self._lock:
+            self._ensure_loaded()
+            return list(self._by_id.values())
+
+    def get(self, name: str) -> Optional[ImageRecord]:
+        """
+        Look an image up by name (tag) or ID.
+        :param name:
+        :return:
+        """
+        with self._lock:
+            self._ensure_loaded()
+            image_id = self._by_name.get(normalize_image_name(name), name)
+            return self._by_id.get(image_id)
+
+    def get_by_digest(self, digest: str) -> Optional[ImageRecord]:
+        with self._lock:
+            self._ensure_loaded()
+            image_id = self._by_digest.get(digest)
+            return self._by_id.get(image_id) if image_id else None
+
+    def exists(self, name: str) -> bool:
+        return self.get(name) is not None
+
+    def labels(self, name: str) -> Dict[str, str]:
+        """
+        Labels of an image, inspected once per image ID.
+        :param name: Image name or ID.
+        :return: Empty if the image does not exist.
+        """
+        record = self.get(name)
+        if record is None:
+            return {}
+
+        if record.labels is None:
+            output = self._buildah_cmd("inspect", "--type", "image", "--format", "{{json .OCIv1.Config.Labels}}",
+                                       record.id)
+            record.labels = json.loads(str(output).strip() or "null") or {}
+
+        return record.labels
+
+    def measure(self, name: str) -> int:
+        """
+        Size of an image in bytes, asking buildah when it is not known yet (e.g. for images committed since the
+        index was loaded).
+        :param name:
+        :return: 0 if the image does not exist.
+        """
+        record = self.get(name)
+        if record is None:
+            return 0
+
+        if not record.size:
+            output = self._buildah_cmd("images", "--json", record.id)
+            for img_data in json.loads(str(output) or "[]") or []:
+                if img_data.get("id") == record.id:
+                    record.size = parse_size(img_data.get("size"))
+
+        return record.size
+
+    def add(self, name: str, image_id: str, size: int = 0):
+        """
+        Record that name now points to image_id (e.g. after a commit).
+        :param name:
+        :param image_id:
+        :param size: Size in bytes if known.
+        :return:
+        """
+        with self._lock:
+            if not self._loaded:
+                # The next load reads the new image from buildah anyway.
+                return
+
+            name = normalize_image_name(name)
+            self._untag(name)
+
+            record = self._by_id.get(image_id)
+            if record is None:
+                record = ImageRecord(id=image_id, size=size)
+                self._by_id[image_id] = record
+            record.names.append(name)
+            self._by_name[name] = image_id
+
+    def remove(self, name: str):
+        """
+        Record that name was removed (e.g. after an rmi). Images left without names are dropped.
+        :param name: Image name or ID.
+        :return:
+        """
+        with self._lock:
+            if not self._loaded:
+                return
+
+            if name in self._by_id:
+                record = self._by_id.pop(name)
+                for n in record.names:
+                    self._by_name.pop(n, None)
+                self._by_digest.pop(record.digest, None)
+                return
+
+            self._untag(normalize_image_name(name))
+
+    def _untag(self, name: str):
+        image_id = self._by_name.pop(name, None)
+        if image_id is None:
+            return
+
+        record = self._by_id[image_id]
+        record.names.remove(name)
+        if not record.names:
+            del self._by_id[image_id]
+            self._by_digest.pop(record.digest, None)
@@ -0,0 +1,132 @@
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, TYPE_CHECKING
+
+import yaml
+
+from .steps import CachedStep
+
+if TYPE_CHECKING:
+    from .buildah import BuildahContainer
+
+# Named sets of sink settings, applied before the settings of the spec. "function" holds settings of the sink
+# instance (pulsar-admin sinks localrun), "configs" those of the JDBC connector.
+JDBC_SINK_PRESETS: Dict[str, Dict[str, Dict[str, Any]]] = {
+    # Small batches flushed quickly, still one JDBC batch per flush instead of a statement per record
+    "low-latency": {
+        "function": {"parallelism": 1},
+        "configs": {"batchSize": 100, "timeoutMs": 50, "useJdbcBatch": True, "useTransactions": True},
+    },
+    # Large JDBC batches committed in one transaction, spread over parallel instances (Shared subscription)
+    "high-throughput": {
+        "function": {"parallelism": 4, "processingGuarantees": "ATLEAST_ONCE"},
+        "configs": {"batchSize": 5000, "timeoutMs": 1000, "useJdbcBatch": True, "useTransactions": True},
+    },
+    # One instance on a Failover subscription, so records are written in topic order
+    "ordered": {
+        "function": {"parallelism": 1, "retainOrdering": True, "processingGuarantees": "ATLEAST_ONCE"},
+        "configs": {"batchSize": 500, "timeoutMs": 500, "useJdbcBatch": True, "useTransactions": True},
+    },
+}
+
+_INSERT_MODES = ("INSERT", "UPSERT", "UPDATE")
+_GUARANTEES = ("ATLEAST_ONCE", "ATMOST_ONCE", "EFFECTIVELY_ONCE")
+# Credentials are added by the entrypoint from the environment, never written into the image
+_SECRETS = ("userName", "password")
+
+
+def validate_jdbc_sink(function: Dict[str, Any], configs: Dict[str, Any]):
+    """
+    Check rendered sink settings.
+    :param function: Settings of the sink instance.
+    :param configs: Settings of the JDBC connector.
+    :return:
+    :raises ValueError:
+    """
+    for key in _SECRETS:
+        if key in configs:
+            raise ValueError(f"{key} must not be part of the image, pass it as environment variable "
+                             f"(see sinks_entrypoint.sh)")
+
+    for key, minimum in (("batchSize", 1), ("timeoutMs", 0)):
+        value = configs.get(key)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, int) or value < minimum):
+            raise ValueError(f"{key} must be an integer >= {minimum}, got {value!r}")
+
+    parallelism = function.get("parallelism")
+    if parallelism is not None and (isinstance(parallelism, bool) or not isinstance(parallelism, int)
+                                    or parallelism < 1):
+        raise ValueError(f"parallelism must be an integer >= 1, got {parallelism!r}")
+
+    insert_mode = configs.get("insertMode", "INSERT")
+    if insert_mode not in _INSERT_MODES:
+        raise ValueError(f"insertMode must be one of {', '.join(_INSERT_MODES)}, got {insert_mode!r}")
+    if insert_mode != "INSERT" and not configs.get("key"):
+        raise ValueError(f"insertMode {insert_mode} needs the key columns (Key)")
+
+    guarantees = function.get("processingGuarantees", "ATLEAST_ONCE")
+    if guarantees not in _GUARANTEES:
+        raise ValueError(f"processingGuarantees must be one of {', '.join(_GUARANTEES)}, got {guarantees!r}")
+
+    if function.get("retainOrdering") and (parallelism or 1) > 1:
+        raise ValueError("retainOrdering uses a Failover subscription, only one of the parallel instances would "
+                         "receive records; set parallelism to 1")
+
+
+def _merge(defaults: Dict[str, Any], values: Dict[str, Any]) -> Dict[str, Any]:
+    # Keys in the order of values, then the remaining defaults
+    merged = {key: defaults.get(key) if value is None else value for key, value in values.items()}
+    merged.update({key: value for key, value in defaults.items() if key not in merged})
+    return {key: value for key, value in merged.items() if value is not None}
+
+
+def render_jdbc_sink(preset: str, function: Dict[str, Any], configs: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Sink configuration file contents: the preset's settings, overridden by those of the spec.
+    :param preset: Optional. Name of one of JDBC_SINK_PRESETS.
+    :param function: Settings of the sink instance (tenant, namespace, name, inputs, parallelism, ...). None values
+        are left out.
+    :param configs: Settings of the JDBC connector (jdbcUrl, tableName, batchSize, ...). None values are left out.
+    :return: Validated configuration, `configs` last.
+    :raises ValueError:
+    """
+    if preset and preset not in JDBC_SINK_PRESETS:
+        raise ValueError(f"Unknown preset '{preset}', available: {', '.join(JDBC_SINK_PRESETS)}")
+
+    defaults = JDBC_SINK_PRESETS.get(preset, {})
+    rendered_function = _merge(defaults.get("function", {}), function)
+    rendered_configs = _merge(defaults.get("configs", {}), configs)
+    validate_jdbc_sink(rendered_function, rendered_configs)
+
+    # The entrypoint appends credentials below `configs`, so it must be the last mapping
+    return {**rendered_function, "configs": rendered_configs}
+
+
+def format_jdbc_sink(rendered: Dict[str, Any]) -> str:
+    """
+    YAML of a rendered sink configuration, in the order of rendered.
+    :param rendered:
+    :return:
+    """
+    return "# Rendered by apache-pulsar-setup\n" + yaml.safe_dump(rendered, sort_keys=False, default_flow_style=False)
+
+
+def jdbc_sink_config_step(path: str, rendered: Dict[str, Any], chown: str = "") -> CachedStep:
+    """
+    Cached step writing a rendered sink configuration to path.
+    :param path: Path inside the container.
+    :param rendered: See render_jdbc_sink.
+    :param chown: Optional. user:group owning the file.
+    :return:
+    """
+    text = format_jdbc_sink(rendered)
+
+    def action(container: "BuildahContainer"):
+        with tempfile.TemporaryDirectory(prefix="jdbc-sink-") as tmp:
+            target = Path(tmp) / Path(path).name
+            target.write_text(text)
+            container.console.print(f"[dim]Rendering sink configuration into {path}[/dim]")
+            container.copy_host_container(target, path, chown=chown)
+
+    return CachedStep("sink_config", [["sink-config", path], None, {"step": "sink_config", "config": rendered,
+                                                                      "chown": chown}], action)
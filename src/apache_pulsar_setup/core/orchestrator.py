@@ -0,0 +1,205 @@
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+import typer
+from rich.console import Console
+from rich.rule import Rule
+from rich.table import Table
+
+from .buildah import create_manifest
+from .builder_base import BaseBuilder
+
+console = Console()
+
+
+@dataclass
+class BuildNode:
+    name: str
+    builder: BaseBuilder
+    depends_on: List[str] = field(default_factory=list)
+    status: str = "pending"
+    duration: float = 0.0
+    error: Optional[BaseException] = None
+
+
+class BuildGraph:
+    """
+    Runs builders as a dependency graph.
+
+    Builders whose dependencies have completed are scheduled on a worker pool of at most max_workers threads.
+    When more than one worker is used, each builder logs into its own buffer which is printed as a single block
+    once the builder finishes so that output is not interleaved.
+
+    Builders added with platforms run once per platform; a manifest list of the per-platform images is created
+    when all of them succeeded.
+    """
+
+    def __init__(self, max_workers: int = 2, output: Optional[Console] = None):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+
+        self.max_workers = max_workers
+        self.console = output if output is not None else console
+        self.nodes: Dict[str, BuildNode] = {}
+        self._platforms: Dict[str, List[str]] = {}  # multi-platform node name -> platforms
+        self._manifests: List[Tuple[BaseBuilder, List[str]]] = []
+        self._output_lock = threading.Lock()
+
+    def add(self, name: str, builder: BaseBuilder, depends_on: Optional[List[str]] = None,
+            platforms: Optional[List[str]] = None, manifest: bool = True):
+        """
+        Register a builder in the graph.
+
+        :param name: Unique name of the node.
+        :param builder: Builder to run.
+        :param depends_on: Names of nodes that must complete successfully before this one starts.
+        :param platforms: Optional. Build once per platform (node "name[platform]"), each platform node depending
+            on the same platform of multi-platform dependencies.
+        :param manifest: Assemble a manifest list of the per-platform images; off for intermediate stages.
+        :return:
+        """
+        if not platforms:
+            self._add(name, builder, depends_on)
+            return
+
+        for platform in platforms:
+            deps = [f"{dep}[{platform}]" if dep in self._platforms else dep for dep in depends_on or []]
+            self._add(f"{name}[{platform}]", builder.for_platform(platform), deps)
+
+        self._platforms[name] = list(platforms)
+        if manifest:
+            self._manifests.append((builder, list(platforms)))
+
+    def _add(self, name: str, builder: BaseBuilder, depends_on: Optional[List[str]] = None):
+        if name in self.nodes:
+            raise ValueError(f"Build node '{name}' already registered")
+
+        self.nodes[name] = BuildNode(name=name, builder=builder, depends_on=list(depends_on or []))
+
+    def _validate(self):
+        for node in self.nodes.values():
+            for dep in node.depends_on:
+                if dep not in self.nodes:
+                    raise ValueError(f"Build node '{node.name}' depends on unknown node '{dep}'")
+
+        # Kahn's algorithm; anything left over is part of a cycle.
+        remaining = {name: set(node.depends_on) for name, node in self.nodes.items()}
+        while remaining:
+            ready = [name for name, deps in remaining.items() if not deps]
+            if not ready:
+                raise ValueError(f"Dependency cycle between build nodes: {', '.join(sorted(remaining))}")
+            for name in ready:
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+
+    def _run_node(self, node: BuildNode):
+        buffer = None
+        if self.max_workers > 1:
+            buffer = io.StringIO()
+            node.builder.console = Console(file=buffer, force_terminal=self.console.is_terminal,
+                                           width=self.console.width)
+
+        with self._output_lock:
+            self.console.print(f"[bold blue]>> Started[/bold blue] {node.name}")
+
+        start = time.monotonic()
+        try:
+            node.builder.build()
+        finally:
+            node.duration = time.monotonic() - start
+            if buffer is not None:
+                with self._output_lock:
+                    self.console.print(Rule(node.name))
+                    self.console.file.write(buffer.getvalue())
+                    self.console.print(Rule())
+
+    def run(self) -> Dict[str, BuildNode]:
+        """
+        Build every node, running independent ones concurrently.
+
+        :return: Nodes with their final status and duration.
+        """
+        self._validate()
+
+        running: Dict[Future, BuildNode] = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="builder") as executor:
+            while True:
+                for node in self.nodes.values():
+                    if node.status != "pending":
+                        continue
+
+                    dep_status = [self.nodes[dep].status for dep in node.depends_on]
+                    if any(s in ("failed", "skipped") for s in dep_status):
+                        node.status = "skipped"
+                    elif all(s == "done" for s in dep_status):
+                        node.status = "running"
+                        running[executor.submit(self._run_node, node)] = node
+
+                if not running:
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    node = running.pop(future)
+                    node.error = future.exception()
+                    node.status = "failed" if node.error else "done"
+                    with self._output_lock:
+                        if node.error:
+                            self.console.print(f"[bold red]>> Failed[/bold red] {node.name}: {node.error}")
+                        else:
+                            self.console.print(
+                                f"[bold green]>> Finished[/bold green] {node.name} in {node.duration:.1f}s")
+
+        self._print_summary()
+
+        failed = [node.name for node in self.nodes.values() if node.status != "done"]
+        if failed:
+            raise RuntimeError(f"Build did not complete for: {', '.join(failed)}")
+
+        for builder, platforms in self._manifests:
+            create_manifest(builder.config.Buildah.Path, builder.final_image,
+                            [builder.for_platform(platform).final_image for platform in platforms], self.console)
+
+        return self.nodes
+
+    def _print_summary(self):
+        table = Table(title="Build summary")
+        table.add_column("Builder")
+        table.add_column("Depends on")
+        table.add_column("Status")
+        table.add_column("Duration", justify="right")
+
+        styles = {"done": "green", "failed": "red", "skipped": "yellow"}
+        for node in self.nodes.values():
+            style = styles.get(node.status, "white")
+            table.add_row(node.name, ", ".join(node.depends_on) or "-", f"[{style}]{node.status}[/{style}]",
+                          f"{node.duration:.1f}s")
+
+        self.console.print(table)
+
+
+def build_for_platforms(name: str, builder: BaseBuilder, platforms: List[str]):
+    """
+    Build on the host platform, or once per platform in parallel followed by a manifest list.
+    :param name: Name shown for the builder.
+    :param builder:
+    :param platforms: os/arch platforms, empty for the host platform.
+    :return:
+    """
+    if not platforms:
+        builder.build()
+        return
+
+    graph = BuildGraph(max_workers=len(platforms))
+    graph.add(name, builder, platforms=platforms)
+
+    try:
+        graph.run()
+    except RuntimeError:
+        raise typer.Exit(code=1)
@@ -0,0 +1,117 @@
+import json
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional
+
+from rich.console import Console
+from rich.table import Table
+
+from .builder_base import BaseBuilder
+from .image_index import ImageIndex
+from .state import StepTimings
+from .steps import cache_chain, step_cache_prefix
+
+console = Console()
+
+
+@dataclass
+class PlannedStep:
+    name: str
+    tag: str
+    exists: bool  # cache layer present locally
+    cached: bool  # covered by the layer the build will start from
+    last_seconds: Optional[float] = None
+
+
+@dataclass
+class BuildPlan:
+    builder: str
+    base_image: str
+    cache_prefix: str
+    steps: List[PlannedStep] = field(default_factory=list)
+
+    @property
+    def start_image(self) -> str:
+        cached = [step.tag for step in self.steps if step.cached]
+        return cached[-1] if cached else self.base_image
+
+    @property
+    def estimated_seconds(self) -> Optional[float]:
+        """
+        Sum of the last known durations of the steps that will execute, None if any of them was never timed.
+        :return:
+        """
+        pending = [step.last_seconds for step in self.steps if not step.cached]
+        if any(seconds is None for seconds in pending):
+            return None
+        return sum(pending)
+
+
+def plan_build(name: str, builder: BaseBuilder) -> BuildPlan:
+    """
+    Evaluate a builder's cached steps against the layer cache without running anything.
+
+    Mirrors BuildahContainer: the build starts from the deepest existing layer, every step up to it is a hit.
+    :param name: Name shown for the builder.
+    :param builder:
+    :return:
+    """
+    images = ImageIndex.shared(builder.config.Buildah.Path)
+    timings = StepTimings.for_spec(builder.config)
+
+    steps = list(builder.cached_steps().values())
+    tags = cache_chain(builder.base_image, builder.cache_prefix, steps, builder.shared_cache_prefix)
+    exists = [images.exists(tag) for tag in tags]
+    deepest = max((i for i, e in enumerate(exists) if e), default=-1)
+
+    plan = BuildPlan(builder=name, base_image=builder.base_image, cache_prefix=builder.cache_prefix)
+    for i, (step, tag) in enumerate(zip(steps, tags)):
+        plan.steps.append(PlannedStep(
+            name=step.name,
+            tag=tag,
+            exists=exists[i],
+            cached=i <= deepest,
+            last_seconds=timings.last(step_cache_prefix(step, builder.cache_prefix, builder.shared_cache_prefix),
+                                      step.name)
+        ))
+
+    return plan
+
+
+def print_plans(plans: List[BuildPlan], as_json: bool = False, output: Optional[Console] = None):
+    """
+    Print build plans as a table or JSON.
+    :param plans:
+    :param as_json:
+    :param output:
+    :return:
+    """
+    output = output if output is not None else console
+
+    if as_json:
+        data: List[Dict] = []
+        for plan in plans:
+            item = asdict(plan)
+            item["start_image"] = plan.start_image
+            item["estimated_seconds"] = plan.estimated_seconds
+            data.append(item)
+        output.print_json(json.dumps(data))
+        return
+
+    for plan in plans:
+        table = Table(title=f"{plan.builder} ({plan.cache_prefix})")
+        table.add_column("#", justify="right")
+        table.add_column("Step")
+        table.add_column("Layer")
+        table.add_column("Action")
+        table.add_column("Last run", justify="right")
+
+        for i, step in enumerate(plan.steps, start=1):
+            action = "[green]cached[/green]" if step.cached else "[yellow]execute[/yellow]"
+            last = f"{step.last_seconds:.1f}s" if step.last_seconds is not None else "-"
+            table.add_row(str(i), step.name, step.tag.rsplit(":", 1)[-1], action, last)
+
+        output.print(table)
+
+        estimate = plan.estimated_seconds
+        estimate_text = f"~{estimate:.0f}s" if estimate is not None else "unknown (some steps never ran)"
+        output.print(f"Starts from [bold]{plan.start_image}[/bold], estimated duration of executed steps: {estimate_text}\n")
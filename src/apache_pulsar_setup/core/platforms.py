@@ -0,0 +1,50 @@
+from typing import List
+
+import typer
+
+# OCI architecture names -> `uname -m` names, as used in artifact file names
+_MACHINES = {
+    "amd64": "x86_64",
+    "arm64": "aarch64",
+}
+
+
+def parse_platforms(value: str) -> List[str]:
+    """
+    Parse a comma separated list of os/arch[/variant] platforms, e.g. linux/amd64,linux/arm64.
+    :param value:
+    :return: Platforms in the given order, without duplicates. Empty for the host platform.
+    """
+    platforms = []
+    for item in (p.strip() for p in (value or "").split(",")):
+        if not item:
+            continue
+
+        parts = item.split("/")
+        if len(parts) not in (2, 3) or not all(parts):
+            raise typer.BadParameter(f"Invalid platform '{item}', expected os/arch[/variant]")
+        if parts[1] not in _MACHINES:
+            raise typer.BadParameter(f"Unsupported architecture '{parts[1]}', supported: {', '.join(_MACHINES)}")
+
+        if item not in platforms:
+            platforms.append(item)
+
+    return platforms
+
+
+def platform_slug(platform: str) -> str:
+    """
+    Platform as a tag/name component, e.g. linux/arm64 -> linux-arm64.
+    :param platform:
+    :return:
+    """
+    return platform.replace("/", "-")
+
+
+def platform_machine(platform: str) -> str:
+    """
+    `uname -m` style machine of a platform, e.g. linux/arm64 -> aarch64.
+    :param platform:
+    :return:
+    """
+    return _MACHINES[platform.split("/")[1]]
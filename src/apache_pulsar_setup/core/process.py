@@ -0,0 +1,75 @@
+import asyncio
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+# Longest line read at once; longer lines (e.g. progress output without newlines) are delivered in pieces
+_LINE_LIMIT = 1024 * 1024
+
+
+@dataclass
+class ProcessResult:
+    args: List[str]
+    exit_code: int
+    stdout: str
+    stderr: str
+
+
+class ProcessError(RuntimeError):
+    """
+    Raised when a process exits with a non-zero code. Carries exit_code, stdout and stderr like sh.ErrorReturnCode.
+    """
+
+    def __init__(self, result: ProcessResult):
+        self.result = result
+        self.exit_code = result.exit_code
+        self.stdout = result.stdout
+        self.stderr = result.stderr
+        super().__init__(f"{' '.join(result.args)} exited with code {result.exit_code}: "
+                         f"{result.stderr.strip()[-2000:]}")
+
+
+async def _pump(stream: asyncio.StreamReader, lines: List[str], on_line: Optional[Callable[[str], None]]):
+    while True:
+        try:
+            line = await stream.readline()
+        except ValueError:
+            line = await stream.read(_LINE_LIMIT)
+        if not line:
+            return
+
+        text = line.decode("utf-8", errors="replace")
+        lines.append(text)
+        if on_line is not None:
+            on_line(text)
+
+
+async def run_process(*args: str, on_line: Optional[Callable[[str], None]] = None,
+                      check: bool = True) -> ProcessResult:
+    """
+    Run a process with asyncio, streaming stdout and stderr line by line while it runs.
+
+    :param args: Executable and arguments.
+    :param on_line: Optional. Called with every line of stdout and stderr as it arrives.
+    :param check: Raise ProcessError on a non-zero exit code.
+    :return:
+    """
+    process = await asyncio.create_subprocess_exec(*args, stdin=asyncio.subprocess.DEVNULL,
+                                                   stdout=asyncio.subprocess.PIPE,
+                                                   stderr=asyncio.subprocess.PIPE, limit=_LINE_LIMIT)
+
+    stdout: List[str] = []
+    stderr: List[str] = []
+    try:
+        await asyncio.gather(_pump(process.stdout, stdout, on_line), _pump(process.stderr, stderr, on_line))
+        exit_code = await process.wait()
+    except asyncio.CancelledError:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+
+    result = ProcessResult(args=list(args), exit_code=exit_code, stdout="".join(stdout), stderr="".join(stderr))
+    if check and exit_code != 0:
+        raise ProcessError(result)
+
+    return result
@@ -0,0 +1,191 @@
+import re
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Optional, TYPE_CHECKING
+
+from .steps import CachedStep
+
+if TYPE_CHECKING:
+    from .buildah import BuildahContainer
+
+# Role -> configuration file below $PULSAR_HOME/conf
+CONF_FILES = {
+    "standalone": "standalone.conf",
+    "broker": "broker.conf",
+    "bookie": "bookkeeper.conf",
+    "zookeeper": "zookeeper.conf",
+}
+
+_SINGLE_NODE_QUORUM = {
+    "managedLedgerDefaultEnsembleSize": 1,
+    "managedLedgerDefaultWriteQuorum": 1,
+    "managedLedgerDefaultAckQuorum": 1,
+}
+
+# Named sets of settings per role, applied before the role settings of the spec
+PRESETS: Dict[str, Dict[str, Dict[str, Any]]] = {
+    # One bookie: quorums of 1, otherwise brokers fail to create ledgers
+    "single-node": {
+        "standalone": dict(_SINGLE_NODE_QUORUM),
+        "broker": dict(_SINGLE_NODE_QUORUM),
+    },
+    # Journal writes are flushed as soon as the queue is empty instead of waiting for a group commit, and tailing
+    # reads are notified of new entries without polling delay
+    "low-latency": {
+        "standalone": {
+            "managedLedgerNewEntriesCheckDelayInMillis": 0,
+        },
+        "broker": {
+            "managedLedgerNewEntriesCheckDelayInMillis": 0,
+        },
+        "bookie": {
+            "journalMaxGroupWaitMSec": 0,
+            "journalFlushWhenQueueEmpty": True,
+            "journalAdaptiveGroupWrites": True,
+        },
+    },
+    # Larger group commits, entry caches and read batches; needs direct memory for the caches (see PULSAR_MEM)
+    "high-throughput": {
+        "standalone": {
+            "managedLedgerCacheSizeMB": 1024,
+            "dispatcherMaxReadBatchSize": 500,
+        },
+        "broker": {
+            "managedLedgerCacheSizeMB": 1024,
+            "managedLedgerCacheEvictionWatermark": 0.9,
+            "dispatcherMaxReadBatchSize": 500,
+        },
+        "bookie": {
+            "journalMaxGroupWaitMSec": 10,
+            "journalBufferedWritesThreshold": 1048576,
+            "journalFlushWhenQueueEmpty": False,
+            "dbStorage_writeCacheMaxSizeMb": 512,
+            "dbStorage_readAheadCacheMaxSizeMb": 512,
+        },
+    },
+}
+
+_KEY = re.compile(r"^[A-Za-z][A-Za-z0-9_.\-]*$")
+# Settings that must be non-negative integers: sizes in MB and thread counts
+_SIZE_OR_COUNT = re.compile(r"(SizeMB|SizeMb|MaxSizeMb|Threads)$")
+_QUORUM = ("managedLedgerDefaultEnsembleSize", "managedLedgerDefaultWriteQuorum", "managedLedgerDefaultAckQuorum")
+
+
+def format_conf_value(value: Any) -> str:
+    """
+    Value as written to a Pulsar configuration file: booleans in lower case, lists comma separated.
+    :param value:
+    :return:
+    """
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (list, tuple)):
+        return ",".join(format_conf_value(v) for v in value)
+    if value is None:
+        return ""
+    return str(value)
+
+
+def validate_conf(role: str, settings: Dict[str, str]):
+    """
+    Check rendered settings of a role.
+    :param role:
+    :param settings:
+    :return:
+    :raises ValueError: On invalid keys, sizes or thread counts, or inconsistent quorums.
+    """
+    for key, value in settings.items():
+        if not _KEY.match(key):
+            raise ValueError(f"{role}: invalid configuration key '{key}'")
+        if "\n" in value:
+            raise ValueError(f"{role}: value of {key} must be a single line")
+        if _SIZE_OR_COUNT.search(key) and not value.isdigit():
+            raise ValueError(f"{role}: {key} must be a non-negative integer, got '{value}'")
+
+    if any(k in settings for k in _QUORUM):
+        # Pulsar defaults, for the settings not given
+        ensemble, write, ack = (int(settings.get(k, "2")) for k in _QUORUM)
+        if not ensemble >= write >= ack >= 1:
+            raise ValueError(f"{role}: quorums must satisfy ensemble ({ensemble}) >= write ({write}) >= ack ({ack}) "
+                             f">= 1")
+
+
+def render_pulsar_conf(preset: str, roles: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, str]]:
+    """
+    Settings to apply per role: the preset's, overridden by the role settings of the spec.
+    :param preset: Optional. Name of one of PRESETS.
+    :param roles: Settings per role (standalone, broker, bookie, zookeeper).
+    :return: Validated settings per role, values formatted for the configuration file. Roles without settings are left
+        out.
+    :raises ValueError:
+    """
+    if preset and preset not in PRESETS:
+        raise ValueError(f"Unknown preset '{preset}', available: {', '.join(PRESETS)}")
+
+    rendered = {}
+    for role in CONF_FILES:
+        settings = {**PRESETS.get(preset, {}).get(role, {}), **(roles.get(role) or {})}
+        if not settings:
+            continue
+
+        settings = {key: format_conf_value(value) for key, value in settings.items()}
+        validate_conf(role, settings)
+        rendered[role] = settings
+
+    return rendered
+
+
+def merge_conf(text: str, settings: Dict[str, str]) -> str:
+    """
+    Set settings in the contents of a `key=value` configuration file.
+
+    The first active line of a key is replaced in place, so the file keeps its comments and layout; keys the file
+    does not have are appended.
+    :param text:
+    :param settings:
+    :return:
+    """
+    remaining = dict(settings)
+    lines = []
+    for line in text.splitlines():
+        key = line.split("=", 1)[0].strip() if "=" in line and not line.lstrip().startswith("#") else ""
+        if key in remaining:
+            lines.append(f"{key}={remaining.pop(key)}")
+        else:
+            lines.append(line)
+
+    if remaining:
+        lines.extend(["", "### Added by apache-pulsar-setup"])
+        lines.extend(f"{key}={value}" for key, value in remaining.items())
+
+    return "\n".join(lines) + "\n"
+
+
+def pulsar_conf_step(prefix: str, preset: str, roles: Dict[str, Dict[str, Any]],
+                     chown: str = "") -> Optional[CachedStep]:
+    """
+    Cached step writing the rendered settings into the configuration files below prefix/conf.
+    :param prefix: Pulsar installation prefix.
+    :param preset:
+    :param roles:
+    :param chown: Optional. user:group owning the rewritten files.
+    :return: None if there is nothing to render.
+    """
+    rendered = render_pulsar_conf(preset, roles)
+    if not rendered:
+        return None
+
+    paths = {role: f"{prefix}/conf/{CONF_FILES[role]}" for role in rendered}
+
+    def action(container: "BuildahContainer"):
+        with tempfile.TemporaryDirectory(prefix="pulsar-conf-") as tmp:
+            # One after the other, concurrent buildah calls on one working container are not safe
+            for role, settings in rendered.items():
+                original = container.run_get_output(["cat", paths[role]])
+                target = Path(tmp) / CONF_FILES[role]
+                target.write_text(merge_conf(original, settings))
+                container.console.print(f"[dim]Rendering {len(settings)} settings into {paths[role]}[/dim]")
+                container.copy_host_container(target, paths[role], chown=chown)
+
+    return CachedStep("conf", [["conf", prefix], None, {"step": "conf", "preset": preset, "settings": rendered,
+                                                        "chown": chown}], action)
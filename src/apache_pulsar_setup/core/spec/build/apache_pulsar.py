@@ -1,6 +1,6 @@
-from typing import List
+from typing import Any, Dict, List
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 
 
 class JavaConfig(BaseModel):
@@ -9,8 +9,66 @@ class JavaConfig(BaseModel):
     Build: str
 
 
+class JlinkConfig(BaseModel):
+    Enabled: bool = False
+    # Modules jdeps cannot see because they are only loaded reflectively or through service providers
+    ExtraModules: List[str] = Field(default_factory=lambda: [
+        "jdk.crypto.ec", "jdk.crypto.cryptoki", "jdk.unsupported", "jdk.zipfs", "jdk.naming.dns", "jdk.management",
+        "jdk.management.agent", "jdk.jfr", "jdk.localedata"
+    ])
+    Options: List[str] = Field(default_factory=lambda: ["--strip-debug", "--no-man-pages", "--no-header-files"])
+
+
+class CdsConfig(BaseModel):
+    Enabled: bool = False
+    # Started in ApachePulsar.Prefix to record the classes loaded during startup, stopped once ReadyPattern is logged
+    Command: List[str] = Field(default_factory=lambda: ["bin/pulsar", "standalone", "--no-functions-worker",
+                                                        "--no-stream-storage"])
+    ReadyPattern: str = "messaging service is ready"
+    TimeoutSeconds: int = 300
+
+
 class JavaJreConfig(BaseModel):
     Jre: JavaConfig = Field(default_factory=JavaConfig)
+    Jlink: JlinkConfig = Field(default_factory=JlinkConfig)
+    Cds: CdsConfig = Field(default_factory=CdsConfig)
+
+
+class SlimConfig(BaseModel):
+    # Shell globs relative to ApachePulsar.Prefix removed from the image, unless they also match a Keep glob
+    Drop: List[str] = Field(default_factory=list)
+    Keep: List[str] = Field(default_factory=list)
+
+
+class HealthcheckConfig(BaseModel):
+    # Image HEALTHCHECK running resources/healthcheck.sh (bash, no JVM). Needs the docker image format, OCI images
+    # have no health check.
+    Enabled: bool = True
+    Interval: str = '30s'
+    Timeout: str = '5s'
+    StartPeriod: str = '120s'
+    Retries: int = 3
+
+
+class PulsarConfConfig(BaseModel):
+    # Optional. Named preset (single-node, low-latency, high-throughput), overridden by the role settings below
+    Preset: str = ''
+    # Settings per role, written into conf/standalone.conf, broker.conf, bookkeeper.conf and zookeeper.conf
+    Standalone: Dict[str, Any] = Field(default_factory=dict)
+    Broker: Dict[str, Any] = Field(default_factory=dict)
+    Bookie: Dict[str, Any] = Field(default_factory=dict)
+    Zookeeper: Dict[str, Any] = Field(default_factory=dict)
+
+    def roles(self) -> Dict[str, Dict[str, Any]]:
+        return {"standalone": self.Standalone, "broker": self.Broker, "bookie": self.Bookie,
+                "zookeeper": self.Zookeeper}
+
+    @model_validator(mode="after")
+    def validate_rendered(self) -> "PulsarConfConfig":
+        from apache_pulsar_setup.core.pulsar_conf import render_pulsar_conf
+
+        render_pulsar_conf(self.Preset, self.roles())
+        return self
 
 
 class RuntimeConfig(BaseModel):
@@ -21,6 +79,9 @@ class RuntimeConfig(BaseModel):
     PulsarGc: List[str] = Field(default_factory=list)
     Java: JavaJreConfig = Field(default_factory=JavaJreConfig)
     Ports: List[int] = Field(default_factory=list)
+    Slim: SlimConfig = Field(default_factory=SlimConfig)
+    Conf: PulsarConfConfig = Field(default_factory=PulsarConfConfig)
+    Healthcheck: HealthcheckConfig = Field(default_factory=HealthcheckConfig)
 
 
 class BuildConfig(BaseModel):
@@ -31,6 +92,7 @@ class BuildConfig(BaseModel):
 class ApachePulsarConfig(BaseModel):
     Version: str
     SourceUrl: str
+    Sha512: str = ''
     Prefix: str = '/usr/local/pulsar'
     Build: BuildConfig = Field(default_factory=BuildConfig)
     Runtime: RuntimeConfig = Field(default_factory=RuntimeConfig)
@@ -1,6 +1,9 @@
+from typing import Dict, List
+
 from pydantic import BaseModel, Field
 
 from .apache_pulsar import ApachePulsarConfig
+from .connectors import ConnectorConfig
 from .postgres_sink import PostgresSinkConfig
 
 
@@ -8,9 +11,56 @@ class BuildahConfig(BaseModel):
     Path: str = 'buildah'
 
 
+class ArtifactsConfig(BaseModel):
+    Directory: str = '.tmp/artifacts'
+    MaxSizeMb: int = 4096
+    Connections: int = 4
+    SegmentSizeMb: int = 8
+    Retries: int = 3
+    # Equivalent base URLs tried in order for artifacts below any of them
+    Mirrors: List[str] = Field(default_factory=list)
+    PublishedChecksums: bool = True
+
+
+class CacheConfig(BaseModel):
+    StateDirectory: str = '.tmp/state'
+    BudgetMb: int = 20480
+    SharedPrefix: str = ''
+
+
+class BenchMatrixConfig(BaseModel):
+    # Every combination is one workload
+    MessageSize: List[int] = Field(default_factory=lambda: [128, 1024])
+    Batching: List[bool] = Field(default_factory=lambda: [True, False])
+    Partitions: List[int] = Field(default_factory=lambda: [1, 4])
+    Producers: List[int] = Field(default_factory=lambda: [1])
+
+
+class BenchConfig(BaseModel):
+    Podman: str = 'podman'
+    # Limits of the benchmarked container, so results are comparable between hosts and runs
+    Memory: str = '4g'
+    Cpus: float = 4
+    DurationSeconds: int = 30
+    WarmupSeconds: int = 5
+    # Publish rate in msg/s over all producers, 0 for unthrottled
+    Rate: int = 0
+    StartupTimeoutSeconds: int = 180
+    Matrix: BenchMatrixConfig = Field(default_factory=BenchMatrixConfig)
+    ResultsDirectory: str = '.tmp/bench'
+    Baseline: str = '.tmp/bench/baseline.json'
+    # Allowed relative regression of throughput and p99 latency against the baseline
+    Threshold: float = 0.1
+
+
 class BuildSpec(BaseModel):
     ProjectName: str
     BaseImage: str
     Buildah: BuildahConfig = Field(default_factory=BuildahConfig)
+    Artifacts: ArtifactsConfig = Field(default_factory=ArtifactsConfig)
+    Cache: CacheConfig = Field(default_factory=CacheConfig)
     ApachePulsar: ApachePulsarConfig = Field(default_factory=ApachePulsarConfig)
     PostgresSink: PostgresSinkConfig = Field(default_factory=PostgresSinkConfig)
+    # Pulsar IO connectors layered on the runtime image, by name
+    Connectors: Dict[str, ConnectorConfig] = Field(default_factory=dict)
+    Bench: BenchConfig = Field(default_factory=BenchConfig)
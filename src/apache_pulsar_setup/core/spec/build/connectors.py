@@ -0,0 +1,27 @@
+from typing import Dict, Literal
+
+from pydantic import BaseModel, Field, model_validator
+
+
+class ConnectorVersionConfig(BaseModel):
+    SourceUrl: str
+    Sha512: str = ''
+
+
+class ConnectorConfig(BaseModel):
+    # `pulsar-admin sinks localrun` or `pulsar-admin sources localrun`
+    Kind: Literal['sink', 'source'] = 'sink'
+    Current: str
+    # Optional. Connector configuration inside the container, passed as --sink-config-file / --source-config-file.
+    # Not part of the image, it has to be mounted at this path.
+    ConfigPath: str = ''
+    BrokerUrl: str = 'pulsar://localhost:6650'
+    # Metrics server of the instance, probed by the health check
+    MetricsPort: int = 9094
+    Versions: Dict[str, ConnectorVersionConfig] = Field(default_factory=dict)
+
+    @model_validator(mode="after")
+    def check_current(self) -> "ConnectorConfig":
+        if self.Current not in self.Versions:
+            raise ValueError(f"Current version {self.Current} has no entry in Versions")
+        return self
@@ -1,15 +1,77 @@
-from typing import List, Dict
+from typing import Any, Dict, List, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
+
+from .apache_pulsar import SlimConfig
 
 class VersionsConfig(BaseModel):
     SourceUrl: str
+    Sha512: str = ''
     Dependencies: List[str] = Field(default_factory=list)
     Uid: int
     Gid: int
 
+class JdbcSinkConfig(BaseModel):
+    # Optional. Named preset (low-latency, high-throughput, ordered), overridden by the settings below
+    Preset: str = ''
+    Tenant: str = 'public'
+    Namespace: str = 'default'
+    Name: str = 'postgres-sink'
+    TopicsPattern: str = 'persistent://public/default/.*'
+    JdbcUrl: str = 'jdbc:postgresql://postgres:5432/postgres'
+    TableName: str = 'public.event_journal'
+    # Comma separated columns; key columns are required by the UPSERT and UPDATE insert modes
+    Key: str = ''
+    NonKey: str = ''
+    # Unset settings keep the preset's value, or the connector's default
+    InsertMode: Optional[str] = None
+    BatchSize: Optional[int] = None
+    TimeoutMs: Optional[int] = None
+    UseTransactions: Optional[bool] = None
+    UseJdbcBatch: Optional[bool] = None
+    Parallelism: Optional[int] = None
+    ProcessingGuarantees: Optional[str] = None
+    RetainOrdering: Optional[bool] = None
+
+    def function(self, archive: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            "tenant": self.Tenant,
+            "namespace": self.Namespace,
+            "name": self.Name,
+            "topicsPattern": self.TopicsPattern,
+            "archive": archive,
+            "parallelism": self.Parallelism,
+            "processingGuarantees": self.ProcessingGuarantees,
+            "retainOrdering": self.RetainOrdering,
+        }
+
+    def configs(self) -> Dict[str, Any]:
+        return {
+            "jdbcUrl": self.JdbcUrl,
+            "tableName": self.TableName,
+            "key": self.Key or None,
+            "nonKey": self.NonKey or None,
+            "insertMode": self.InsertMode,
+            "batchSize": self.BatchSize,
+            "timeoutMs": self.TimeoutMs,
+            "useTransactions": self.UseTransactions,
+            "useJdbcBatch": self.UseJdbcBatch,
+        }
+
+    @model_validator(mode="after")
+    def validate_rendered(self) -> "JdbcSinkConfig":
+        from apache_pulsar_setup.core.jdbc_sink import render_jdbc_sink
+
+        render_jdbc_sink(self.Preset, self.function(), self.configs())
+        return self
+
 class PostgresSinkConfig(BaseModel):
     Current: str
     ConfigPath: str
     BrokerUrl: str
+    # Metrics server of the sink instance, probed by the health check
+    MetricsPort: int = 9094
     Versions: Dict[str, VersionsConfig] = Field(default_factory=list)
+    Slim: SlimConfig = Field(default_factory=SlimConfig)
+    # Sink configuration rendered into ConfigPath at build time
+    Sink: JdbcSinkConfig = Field(default_factory=JdbcSinkConfig)
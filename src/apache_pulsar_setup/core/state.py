@@ -0,0 +1,159 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .image_index import normalize_image_name
+from .spec import BuildSpec
+
+
+class JsonState:
+    """
+    JSON file in the state directory, one shared instance per file. Subclasses name the file and hold self._lock
+    around a _load/_save pair.
+    """
+
+    filename = ""
+
+    _instances: Dict[Path, "JsonState"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_spec(cls, config: BuildSpec):
+        path = (Path(config.Cache.StateDirectory) / cls.filename).resolve()
+        with JsonState._instances_lock:
+            if path not in JsonState._instances:
+                JsonState._instances[path] = cls(path)
+            return JsonState._instances[path]
+
+    def _load(self) -> Dict[str, Any]:
+        """
+        Contents of the file, empty if it is missing or corrupt.
+        :return:
+        """
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save(self, data: Dict[str, Any]):
+        """
+        Replace the file atomically.
+        :param data:
+        :return:
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.path)
+
+
+class StepTimings(JsonState):
+    """
+    Durations of cached steps the last time they executed, persisted in the state directory.
+    """
+
+    filename = "timings.json"
+
+    def record(self, cache_prefix: str, step_name: str, seconds: float, layer_hash: str):
+        """
+        Store the duration of an executed step.
+        :param cache_prefix:
+        :param step_name:
+        :param seconds:
+        :param layer_hash:
+        :return:
+        """
+        with self._lock:
+            timings = self._load()
+            timings[f"{cache_prefix}/{step_name}"] = {"seconds": round(seconds, 3), "hash": layer_hash,
+                                                       "at": time.time()}
+            self._save(timings)
+
+    def last(self, cache_prefix: str, step_name: str) -> Optional[float]:
+        """
+        Duration of the step the last time it executed, None if never recorded.
+        :param cache_prefix:
+        :param step_name:
+        :return:
+        """
+        with self._lock:
+            entry = self._load().get(f"{cache_prefix}/{step_name}")
+        return entry["seconds"] if entry else None
+
+
+class CacheUsage(JsonState):
+    """
+    Last-hit timestamps and parents of cache layers plus the cache layer each final image was committed on,
+    persisted in the state directory. Used by the cache garbage collector.
+    """
+
+    filename = "cache_usage.json"
+
+    def load(self) -> Dict[str, Dict[str, dict]]:
+        """
+        :return: {"layers": {tag: {"last_used": ts, "parent": tag}}, "finals": {image: source layer tag}}
+        """
+        data = self._load()
+        data.setdefault("layers", {})
+        data.setdefault("finals", {})
+        return data
+
+    def record_layer(self, tag: str, parent: str):
+        """
+        Mark a cache layer as used now.
+        :param tag:
+        :param parent: Image the layer was built on.
+        :return:
+        """
+        with self._lock:
+            data = self.load()
+            data["layers"][normalize_image_name(tag)] = {"last_used": time.time(),
+                                                         "parent": normalize_image_name(parent)}
+            self._save(data)
+
+    def record_final(self, image: str, source: str):
+        """
+        Record the cache layer a final image was committed on, so its chain is kept by the garbage collector.
+        :param image:
+        :param source:
+        :return:
+        """
+        with self._lock:
+            data = self.load()
+            data["finals"][normalize_image_name(image)] = normalize_image_name(source)
+            self._save(data)
+
+    def forget(self, tags: List[str]):
+        with self._lock:
+            data = self.load()
+            for tag in tags:
+                data["layers"].pop(normalize_image_name(tag), None)
+            self._save(data)
+
+
+class JlinkModules(JsonState):
+    """
+    Java modules required by a Pulsar distribution as reported by jdeps, keyed by JDK and Pulsar version and
+    persisted in the state directory.
+    """
+
+    filename = "jlink_modules.json"
+
+    def get(self, jdk: str, pulsar_version: str) -> Optional[List[str]]:
+        with self._lock:
+            return self._load().get(f"{jdk}/{pulsar_version}")
+
+    def put(self, jdk: str, pulsar_version: str, modules: List[str]):
+        with self._lock:
+            data = self._load()
+            data[f"{jdk}/{pulsar_version}"] = sorted(modules)
+            self._save(data)
@@ -0,0 +1,131 @@
+import hashlib
+import json
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .buildah import BuildahContainer
+
+
+def calculate_layer_hash(parent: str, inputs: List[Any]) -> str:
+    """
+    Generate SHA256 hash from the parent image and inputs (commands, environment variables/arguments, additional
+    command context information like versions)
+    :param parent: Image the layer is built on top of.
+    :param inputs:
+    :return:
+    """
+    hasher = hashlib.sha256()
+
+    hasher.update(parent.encode('utf-8'))  # Add current image for chain integrity
+
+    for inpt in inputs:
+        if isinstance(inpt, dict):
+            # Sort keys to ensure {'a':1, 'b':2} always hashes the same as {'b':2, 'a':1}
+            s = json.dumps(inpt, sort_keys=True)
+        else:
+            s = str(inpt)
+        hasher.update(s.encode('utf-8'))
+
+    return hasher.hexdigest()[:12]
+
+
+def step_cache_prefix(step: "CachedStep", cache_prefix: str, shared_cache_prefix: str = "") -> str:
+    """
+    Cache prefix the layer of step is tagged under: the shared namespace for shared steps, else the builder's own.
+    :param step:
+    :param cache_prefix:
+    :param shared_cache_prefix:
+    :return:
+    """
+    return shared_cache_prefix if step.shared and shared_cache_prefix else cache_prefix
+
+
+def cache_chain(parent: str, cache_prefix: str, steps: List["CachedStep"], shared_cache_prefix: str = "") -> List[str]:
+    """
+    Compute the cache tags steps produce when built on top of parent.
+    :param parent:
+    :param cache_prefix:
+    :param steps:
+    :param shared_cache_prefix: Optional. Namespace for the layers of shared steps.
+    :return:
+    """
+    tags = []
+    for step in steps:
+        parent = f"{step_cache_prefix(step, cache_prefix, shared_cache_prefix)}:{step.layer_hash(parent)}"
+        tags.append(parent)
+    return tags
+
+
+@dataclass
+class CachedStep:
+    """
+    A build step whose result is committed as a cache layer.
+
+    The layer hash only depends on the parent image and hash_inputs, so the whole cache chain of a builder can be
+    computed before anything runs.
+
+    Layers of shared steps are tagged in a namespace common to all builders: builders running the same shared steps
+    on the same parent reuse each other's layers. Uncommitted commands run between shared steps are not hashed, so
+    they must be identical in every builder sharing the steps.
+    """
+    name: str
+    hash_inputs: List[Any]
+    action: Callable[["BuildahContainer"], None]
+    shared: bool = False
+
+    def layer_hash(self, parent: str) -> str:
+        return calculate_layer_hash(parent, self.hash_inputs)
+
+    @classmethod
+    def run(cls, name: str, command: List[str], env: Optional[Dict[str, str]] = None,
+            extra_cache_keys: Optional[Dict[str, Any]] = None, shared: bool = False) -> "CachedStep":
+        """
+        Step running command inside the container.
+        :param name:
+        :param command:
+        :param env:
+        :param extra_cache_keys:
+        :param shared: Tag the layer in the shared cache namespace.
+        :return:
+        """
+        return cls(name, [command, env, extra_cache_keys], lambda c: c.run(command, env), shared)
+
+    @classmethod
+    def copy_host(cls, name: str, src: Callable[["BuildahContainer"], Path], dest: str,
+                  extra_cache_keys: Optional[Dict[str, Any]] = None, shared: bool = False) -> "CachedStep":
+        """
+        Step copying a host file or directory into the container.
+
+        src is only called when the step executes. The contents of src are not hashed; extra_cache_keys must
+        identify them (e.g. artifact url and checksum).
+        :param name:
+        :param src: Returns the host path to copy.
+        :param dest:
+        :param extra_cache_keys:
+        :param shared: Tag the layer in the shared cache namespace.
+        :return:
+        """
+        return cls(name, [["copy", dest], None, extra_cache_keys], lambda c: c.copy_host_container(src(c), dest),
+                   shared)
+
+    @classmethod
+    def copy_image(cls, name: str, src_image: str, src_image_key: str, src: str, dest: str, chown: str = "",
+                   shared: bool = False) -> "CachedStep":
+        """
+        Step copying a path from another image into the container.
+        :param name:
+        :param src_image: Image to copy from.
+        :param src_image_key: Identity of src_image's content, so the layer is rebuilt when src_image changes.
+        :param src:
+        :param dest:
+        :param chown: Optional. user:group owning the copied files.
+        :param shared: Tag the layer in the shared cache namespace.
+        :return:
+        """
+        keys = {"image": src_image, "source": src_image_key}
+        if chown:
+            keys["chown"] = chown
+        return cls(name, [["copy-from", src, dest], None, keys],
+                   lambda c: c.copy_container_current(src_image, src, dest, chown), shared)
@@ -0,0 +1,173 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from rich.console import Console
+from rich.table import Table
+
+from .image_index import format_size
+
+console = Console()
+
+
+@dataclass
+class TraceSpan:
+    name: str
+    category: str
+    track: str  # builder / working container the span belongs to
+    start: float
+    duration: float = 0.0
+    args: Dict[str, Any] = field(default_factory=dict)
+
+
+def _check_args(name: str, args: Dict[str, Any]):
+    """
+    Fail at the span instead of at export time when its arguments cannot be written to the trace.
+    :param name:
+    :param args:
+    :return:
+    :raises TypeError:
+    """
+    try:
+        json.dumps(args)
+    except (TypeError, ValueError) as e:
+        raise TypeError(f"Arguments of trace span '{name}' are not JSON serializable: {e}") from e
+
+
+class BuildTracer:
+    """
+    Collects timed spans of buildah operations.
+
+    Disabled by default; when enabled, spans can be exported in Chrome trace-event format (chrome://tracing,
+    Perfetto) and summarized per track.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.spans: List[TraceSpan] = []
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def enable(self):
+        self.enabled = True
+        self._origin = time.perf_counter()
+
+    @contextmanager
+    def span(self, name: str, category: str, track: str, **args) -> Iterator[Dict[str, Any]]:
+        """
+        Time the enclosed block. The yielded dict can be filled with extra arguments (cache hit, exit code, ...).
+        :param name:
+        :param category: subprocess, run, cached_step, commit, copy or configure.
+        :param track:
+        :param args:
+        :return:
+        """
+        if not self.enabled:
+            yield args
+            return
+
+        start = time.perf_counter()
+        try:
+            yield args
+            _check_args(name, args)
+        except Exception as e:
+            args.setdefault("exit_code", getattr(e, "exit_code", 1))
+            raise
+        finally:
+            record = TraceSpan(name=name, category=category, track=track, start=start - self._origin,
+                               duration=time.perf_counter() - start, args=args)
+            with self._lock:
+                self.spans.append(record)
+
+    def export_chrome_trace(self, path: Path):
+        """
+        Write spans as Chrome trace-event JSON.
+        :param path:
+        :return:
+        """
+        tracks = {track: i for i, track in enumerate(sorted({s.track for s in self.spans}), start=1)}
+
+        events: List[Dict[str, Any]] = [
+            {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": track}}
+            for track, tid in tracks.items()
+        ]
+        for s in self.spans:
+            events.append({
+                "name": s.name,
+                "cat": s.category,
+                "ph": "X",
+                "ts": round(s.start * 1_000_000),
+                "dur": round(s.duration * 1_000_000),
+                "pid": os.getpid(),
+                "tid": tracks[s.track],
+                "args": s.args
+            })
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    def print_summary(self, output: Optional[Console] = None):
+        output = output if output is not None else console
+
+        table = Table(title="Build trace summary")
+        table.add_column("Track")
+        table.add_column("Wall time", justify="right")
+        table.add_column("Run", justify="right")
+        table.add_column("Commit", justify="right")
+        table.add_column("Copy", justify="right")
+        table.add_column("Cache hit/miss", justify="right")
+        table.add_column("Subprocesses", justify="right")
+        table.add_column("Copied", justify="right")
+        table.add_column("Layers", justify="right")
+
+        for track in sorted({s.track for s in self.spans}):
+            spans = [s for s in self.spans if s.track == track]
+            wall = max(s.start + s.duration for s in spans) - min(s.start for s in spans)
+
+            def total(category: str) -> str:
+                return f"{sum(s.duration for s in spans if s.category == category):.1f}s"
+
+            steps = [s for s in spans if s.category == "cached_step"]
+            hits = sum(1 for s in steps if s.args.get("cache_hit"))
+            copied = sum(s.args.get("bytes", 0) for s in spans if s.category == "copy")
+            layers = sum(s.args.get("layer_size_delta", 0) for s in spans if s.category == "commit")
+            subprocesses = sum(1 for s in spans if s.category == "subprocess")
+
+            table.add_row(track, f"{wall:.1f}s", total("run"), total("commit"), total("copy"),
+                          f"{hits}/{len(steps) - hits}", str(subprocesses), format_size(copied),
+                          format_size(layers))
+
+        output.print(table)
+
+        slowest = sorted((s for s in self.spans if s.category not in ("cached_step", "subprocess")),
+                         key=lambda s: s.duration, reverse=True)[:5]
+        if slowest:
+            output.print("[bold]Slowest operations:[/bold]")
+            for s in slowest:
+                output.print(f"  {s.duration:7.1f}s  [dim]{s.track}[/dim] {s.name}")
+
+    def finish(self, trace_file: Optional[Path], output: Optional[Console] = None):
+        """
+        Export and summarize collected spans.
+        :param trace_file: Optional. Where to write the Chrome trace.
+        :param output:
+        :return:
+        """
+        output = output if output is not None else console
+        if not self.spans:
+            return
+
+        if trace_file:
+            self.export_chrome_trace(trace_file)
+            output.print(f"Trace written to [green]{trace_file}[/green]")
+
+        self.print_summary(output)
+
+
+tracer = BuildTracer()
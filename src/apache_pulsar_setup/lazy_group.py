@@ -0,0 +1,76 @@
+import importlib
+from typing import Dict, List, Optional, Tuple, Type, Union
+
+import typer
+from typer.core import TyperCommand, TyperGroup
+
+# Command name -> (module exposing a typer `app`, help shown in listings)
+LazyCommands = Dict[str, Tuple[str, str]]
+
+
+class _Placeholder(TyperCommand):
+    """
+    Stands in for a command group that has not been imported, so listings (--help, completion) stay import-free.
+    """
+
+    def __init__(self, name: str, help_text: str, group: "LazyGroup"):
+        super().__init__(name, help=help_text, short_help=help_text)
+        self._group = group
+
+    def invoke(self, ctx: typer.Context):
+        return self._group.load(self.name).invoke(ctx)
+
+
+class LazyGroup(TyperGroup):
+    """
+    Typer group whose sub-groups are imported on first use.
+
+    Sub-groups are declared by module path in lazy_commands (see lazy_group) instead of `app.add_typer(...)`, so
+    `--help` and shell completion of this group import none of them. Resolving a command (running it, or descending
+    into it for its own help or completion) imports only that one module.
+    """
+
+    lazy_commands: LazyCommands = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._loaded: Dict[str, TyperGroup] = {}
+
+    def load(self, name: str) -> TyperGroup:
+        """
+        Import the sub-group name and convert its typer app to a command group.
+        :param name:
+        :return:
+        """
+        if name not in self._loaded:
+            module, _ = self.lazy_commands[name]
+            app: typer.Typer = importlib.import_module(module).app
+            command = typer.main.get_group(app)
+            command.name = name
+            self._loaded[name] = command
+        return self._loaded[name]
+
+    def list_commands(self, ctx: typer.Context) -> List[str]:
+        return list(super().list_commands(ctx)) + [n for n in self.lazy_commands if n not in self.commands]
+
+    def get_command(self, ctx: typer.Context, cmd_name: str) -> Optional[Union[TyperCommand, TyperGroup]]:
+        if cmd_name in self.commands or cmd_name not in self.lazy_commands:
+            return super().get_command(ctx, cmd_name)
+        if cmd_name in self._loaded:
+            return self._loaded[cmd_name]
+        return _Placeholder(cmd_name, self.lazy_commands[cmd_name][1], self)
+
+    def resolve_command(self, ctx: typer.Context, args: List[str]):
+        name, command, remaining = super().resolve_command(ctx, args)
+        if isinstance(command, _Placeholder):
+            command = self.load(command.name)
+        return name, command, remaining
+
+
+def lazy_group(commands: LazyCommands) -> Type[LazyGroup]:
+    """
+    Group class for `typer.Typer(cls=...)` with lazily imported sub-groups.
+    :param commands: Command name -> (module exposing a typer `app`, help shown in listings).
+    :return:
+    """
+    return type("LazyGroup", (LazyGroup,), {"lazy_commands": dict(commands)})
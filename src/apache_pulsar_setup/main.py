@@ -1,9 +1,20 @@
 import typer
-from .containers import app as containers_app
 
-app = typer.Typer(help="Apache Pulsar Setup CLI Tool.")
+from .lazy_group import lazy_group
+
+app = typer.Typer(help="Apache Pulsar Setup CLI Tool.", cls=lazy_group({
+    "containers": ("apache_pulsar_setup.containers", "Container components for the apache pulsar stack."),
+}))
+
+
+@app.callback()
+def main():
+    """
+    Apache Pulsar Setup CLI Tool.
+
+    :return:
+    """
 
-app.add_typer(containers_app, name="containers")
 
 if __name__ == "__main__":
     app()
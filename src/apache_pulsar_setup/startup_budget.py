@@ -0,0 +1,93 @@
+"""
+Import-time budget of the CLI startup.
+
+Runs `python -X importtime -m apache_pulsar_setup.main <args>` (`--help` by default) and fails when the cumulative
+import time exceeds the budget, or when a module that only commands need is imported (see lazy_group). Standard
+library only, so the check itself does not skew what it measures.
+
+    python -m apache_pulsar_setup.startup_budget [--budget-ms 300] [--runs 5] [-- <cli args>]
+"""
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# Loaded by commands only; importing any of these for --help means a lazy group was bypassed
+FORBIDDEN = ("sh", "pydantic", "yaml", "apache_pulsar_setup.core", "apache_pulsar_setup.containers.core",
+             "apache_pulsar_setup.containers.runtime", "apache_pulsar_setup.containers.all",
+             "apache_pulsar_setup.containers.cache", "apache_pulsar_setup.containers.connectors.postgres_sink",
+             "apache_pulsar_setup.containers.connectors.catalog", "apache_pulsar_setup.containers.build_bench")
+
+DEFAULT_BUDGET_MS = 300
+
+
+def parse_importtime(stderr: str) -> Dict[str, int]:
+    """
+    Cumulative import time of the top-level imports in `-X importtime` output.
+    :param stderr:
+    :return: Module -> microseconds
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue  # header
+        name = parts[2]
+        # Nested imports are indented by two spaces per level below the leading one
+        if len(name) - len(name.lstrip()) == 1:
+            modules[name.strip()] = int(parts[1])
+    return modules
+
+
+def imported_modules(stderr: str) -> List[str]:
+    return [line.split("|")[2].strip() for line in stderr.splitlines()
+            if line.startswith("import time:") and line.count("|") == 2]
+
+
+def measure(args: List[str]) -> Tuple[int, List[str]]:
+    """
+    One startup of the CLI.
+    :param args: CLI arguments.
+    :return: Total import time in microseconds and the imported modules.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-m", "apache_pulsar_setup.main", *args],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"CLI exited with {result.returncode}:\n{result.stderr[-2000:]}")
+    return sum(parse_importtime(result.stderr).values()), imported_modules(result.stderr)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budget-ms", type=float,
+                        default=float(os.environ.get("APACHE_PULSAR_SETUP_STARTUP_BUDGET_MS", DEFAULT_BUDGET_MS)),
+                        help="Allowed cumulative import time (env APACHE_PULSAR_SETUP_STARTUP_BUDGET_MS).")
+    parser.add_argument("--runs", type=int, default=5, help="Startups to measure, the fastest one counts.")
+    parser.add_argument("cli_args", nargs="*", default=["--help"], help="CLI arguments, default --help.")
+    options = parser.parse_args()
+
+    # The first run also compiles bytecode; only warm startups count
+    measure(options.cli_args)
+    runs = [measure(options.cli_args) for _ in range(max(options.runs, 1))]
+    best = min(total for total, _ in runs) / 1000
+    modules = runs[0][1]
+
+    failures = []
+    forbidden = sorted(m for m in modules if any(m == f or m.startswith(f"{f}.") for f in FORBIDDEN))
+    if forbidden:
+        failures.append(f"imported by `{' '.join(options.cli_args)}`: {', '.join(forbidden)}")
+    if best > options.budget_ms:
+        failures.append(f"import time {best:.0f} ms exceeds the budget of {options.budget_ms:.0f} ms")
+
+    print(f"Startup of `{' '.join(options.cli_args)}`: {best:.0f} ms import time, {len(modules)} modules "
+          f"(budget {options.budget_ms:.0f} ms)")
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())